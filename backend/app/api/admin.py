@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Header, HTTPException
+from datetime import date
+from typing import Optional
+import asyncio
+import hmac
+import os
+from app.database.rollups import rebuild_rollups
+from app.utils.calorie_calculator import nutrition_store
+
+router = APIRouter()
+
+def _check_admin_token(token: Optional[str]) -> None:
+    # Admin routes don't exist (404) until ADMIN_TOKEN is configured, then need it in X-Admin-Token
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/nutrition")
+async def get_nutrition_info(x_admin_token: Optional[str] = Header(None)):
+    """
+    Current nutrition table snapshot
+    """
+    _check_admin_token(x_admin_token)
+    return nutrition_store.current().info()
+
+@router.post("/nutrition/reload")
+async def reload_nutrition_database(x_admin_token: Optional[str] = Header(None)):
+    """
+    Re-read nutrition_db.csv and atomically publish a new snapshot
+    In-flight requests finish on the snapshot they started with
+    """
+    _check_admin_token(x_admin_token)
+    try:
+        # Parsing and compiling runs in a worker thread so requests keep flowing
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, nutrition_store.reload)
+        return {"success": True, **snapshot.info()}
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Reload failed, keeping version {nutrition_store.current().version}: {str(e)}"
+        )
+
+
+@router.post("/rollups/rebuild")
+async def rebuild_daily_rollups(user_id: Optional[str] = None, since: Optional[date] = None,
+                                x_admin_token: Optional[str] = Header(None)):
+    """
+    Recompute daily rollups from stored predictions (all users, or one user / from a date)
+    """
+    _check_admin_token(x_admin_token)
+    try:
+        await rebuild_rollups(user_id, since)
+        return {"success": True}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Rollup rebuild failed: {str(e)}")
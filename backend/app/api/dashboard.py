@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from datetime import date
+from app.database.rollups import get_daily_rollups, weekly_rollups
+from app.models.schemas import DailyRollupRange, WeeklyRollupRange
+
+router = APIRouter()
+
+async def _daily(user_id: str, start: date, end: date):
+    try:
+        return await get_daily_rollups(user_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/daily", response_model=DailyRollupRange)
+async def get_daily_totals(start: date, end: date, user_id: str = "anonymous"):
+    """
+    Calorie and macro totals per day from start to end (inclusive)
+    Like /api/history, user_id is trusted as given: the API has no authentication
+    """
+    days = await _daily(user_id, start, end)
+    return {"user_id": user_id, "start": start, "end": end, "days": days}
+
+@router.get("/weekly", response_model=WeeklyRollupRange)
+async def get_weekly_totals(start: date, end: date, user_id: str = "anonymous"):
+    """
+    Calorie and macro totals per week (Monday to Sunday) from start to end
+    Like /api/history, user_id is trusted as given: the API has no authentication
+    """
+    days = await _daily(user_id, start, end)
+    return {"user_id": user_id, "start": start, "end": end, "weeks": weekly_rollups(days)}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, WebSocket
+from app.utils.live_stream import serve_live_stream
+
+router = APIRouter()
+
+@router.websocket("/live")
+async def live_camera(websocket: WebSocket):
+    """
+    Live camera overlay: send encoded frames as binary messages, get detections back
+    Only the newest unprocessed frame is kept (see app/utils/live_stream.py)
+    """
+    await serve_live_stream(websocket)
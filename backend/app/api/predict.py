@@ -1,65 +1,214 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-from PIL import Image
-import io
-import numpy as np
-from typing import List, Dict, Any
-from app.utils.food_detection import detect_food
-from app.utils.calorie_calculator import calculate_calories, get_nutrition_for_food
-from app.utils.image_processor import process_image
-from app.database.storage import save_prediction_result
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import os
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.executor import inference_executor
+from app.utils.image_processor import extract_images_from_zip
+from app.utils.upload import UPLOAD_MAX_BATCH_BYTES, UPLOAD_MAX_VIDEO_BYTES, UploadRejected, read_upload
+from app.utils.clip_analysis import analyze_clip, sample_burst, sample_video_bytes
+from app.utils.pipeline import run_prediction_pipeline
+from app.database.storage import (
+    save_prediction_result,
+    build_prediction_document,
+    save_prediction_documents,
+    get_user_history,
+    get_prediction_details,
+)
+from app.models.schemas import ClipResponse, HistoryPage, PredictionResponse
+from app.utils.responses import MSGPACK_RESPONSES, dumps_json, negotiated_response
+from app.utils.timing import request_timing, timed_stage
 
 router = APIRouter()
 
-@router.post("/predict")
-async def predict_food(file: UploadFile = File(...)):
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 200))
+HISTORY_MAX_LIMIT = 100
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+@router.post("/predict", response_model=PredictionResponse, responses=MSGPACK_RESPONSES)
+async def predict_food(request: Request, file: UploadFile = File(...)):
     """
     Main prediction endpoint that processes uploaded image and returns food detection results
+    JSON by default, MessagePack with Accept: application/msgpack
     """
     try:
         # Validate file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Read and process image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        processed_image = process_image(image)
+        with request_timing() as timing:
+            # Read the upload on the event loop; decode, detection and calories run on the executor
+            # Read in bounded chunks; the header is checked before the rest is buffered
+            with timed_stage("upload"):
+                image_data = await read_upload(file)
+            response_data = await run_prediction_pipeline(image_data)
+            
+            # Save to database
+            with timed_stage("save"):
+                await save_prediction_result(response_data)
         
-        # Detect food items using YOLO
-        detections = detect_food(processed_image)
+        return negotiated_response(
+            request, response_data, PredictionResponse, headers={"Server-Timing": timing.header()}
+        )
         
-        # Calculate calories and macros
-        results = calculate_calories(detections)
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+@router.post("/predict/batch")
+async def predict_food_batch(files: List[UploadFile] = File(...)):
+    """
+    Batch prediction endpoint for many images (multipart files and/or zip archives)
+    Streams one NDJSON line per image as soon as its result is ready
+    """
+    items: List[Tuple[str, Any]] = []
+    for upload in files:
+        filename = upload.filename or f"file-{len(items)}"
         
-        # Prepare response
-        response_data = {
-            "success": True,
-            "total_calories": results["total_calories"],
-            "total_macros": results["total_macros"],
-            "detected_foods": results["food_items"],
-            "image_info": {
-                "width": image.width,
-                "height": image.height,
-                "format": image.format
-            }
-        }
+        if upload.content_type in ZIP_CONTENT_TYPES or filename.lower().endswith('.zip'):
+            try:
+                # Archives are only bounded by the request limit; members are checked on extraction
+                data = await read_upload(upload, max_bytes=UPLOAD_MAX_BATCH_BYTES, sniff=False)
+                remaining = BATCH_MAX_ITEMS - len(items)
+                items.extend(await inference_executor.run(extract_images_from_zip, data, remaining))
+            except UploadRejected as e:
+                # Same status as /predict gives for the same problem (413 for an oversized archive),
+                # and 413 like a multipart batch when the archive goes past BATCH_MAX_ITEMS
+                raise HTTPException(status_code=e.status_code, detail=f"Zip archive {filename}: {str(e)}")
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid zip archive {filename}: {str(e)}")
+        elif upload.content_type and upload.content_type.startswith('image/'):
+            try:
+                items.append((filename, await read_upload(upload)))
+            except UploadRejected as e:
+                items.append((filename, e))
+        else:
+            # Reported as a per-item error instead of failing the whole batch
+            items.append((filename, ValueError("File must be an image")))
         
-        # Save to database
-        await save_prediction_result(response_data)
+        if len(items) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch is limited to {BATCH_MAX_ITEMS} images")
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in request")
+    
+    return StreamingResponse(_stream_batch_results(items), media_type="application/x-ndjson")
+
+@router.post("/predict/clip", response_model=ClipResponse, responses=MSGPACK_RESPONSES)
+async def predict_clip(request: Request, files: List[UploadFile] = File(...)):
+    """
+    Meal analysis for a short video (one video/* file) or a burst of photos (several images, in order)
+    Only frames that show something new are detected, and a dish seen in many frames is counted once
+    """
+    try:
+        with request_timing() as timing:
+            with timed_stage("upload"):
+                if any((upload.content_type or "").startswith('video/') for upload in files):
+                    if len(files) != 1:
+                        raise HTTPException(status_code=400, detail="Send either one video or a burst of images")
+                    video = await read_upload(files[0], max_bytes=UPLOAD_MAX_VIDEO_BYTES, sniff=False)
+                    suffix = os.path.splitext(files[0].filename or "")[1] or ".mp4"
+                else:
+                    if not all((upload.content_type or "").startswith('image/') for upload in files):
+                        raise HTTPException(status_code=400, detail="Files must be a video or images")
+                    if len(files) > BATCH_MAX_ITEMS:
+                        raise HTTPException(status_code=413, detail=f"Bursts are limited to {BATCH_MAX_ITEMS} images")
+                    video = None
+                    images = [await read_upload(upload) for upload in files]
+            
+            # Decoding and frame sampling run on the executor
+            with timed_stage("decode"):
+                if video is not None:
+                    clip = await inference_executor.run(sample_video_bytes, video, suffix)
+                else:
+                    clip = await inference_executor.run(sample_burst, images)
+            response_data = await analyze_clip(clip)
+            
+            with timed_stage("save"):
+                await save_prediction_result(response_data)
         
-        return JSONResponse(content=response_data)
+        return negotiated_response(
+            request, response_data, ClipResponse, headers={"Server-Timing": timing.header()}
+        )
         
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Clip analysis failed: {str(e)}")
 
-@router.get("/history")
-async def get_prediction_history():
+async def _predict_batch_item(index: int, filename: str, image_data: Any) -> Dict[str, Any]:
+    item = {"index": index, "filename": filename}
+    try:
+        if isinstance(image_data, Exception):
+            raise image_data
+        item["success"] = True
+        # Batch items feed the same stage histograms (no per-item header)
+        with request_timing():
+            item["result"] = await run_prediction_pipeline(image_data)
+    except Exception as e:
+        item["success"] = False
+        item["error"] = f"Prediction failed: {str(e)}"
+    return item
+
+async def _stream_batch_results(items: List[Tuple[str, Any]]):
+    # All items are submitted at once so the scheduler can batch their forward passes
+    tasks = [
+        asyncio.create_task(_predict_batch_item(index, filename, data))
+        for index, (filename, data) in enumerate(items)
+    ]
+    documents = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if item["success"]:
+                document = build_prediction_document(item["result"])
+                item["prediction_id"] = document["prediction_id"]
+                documents.append(document)
+            yield dumps_json(item) + b"\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    # One bulk insert for the whole batch
+    saved = await save_prediction_documents(documents)
+    yield dumps_json({
+        "done": True,
+        "total": len(items),
+        "succeeded": len(documents),
+        "failed": len(items) - len(documents),
+        "saved": saved
+    }) + b"\n"
+
+@router.get("/history", response_model=HistoryPage)
+async def get_prediction_history(
+    user_id: str = "anonymous",
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = None
+):
     """
-    Get user's prediction history
+    Get user's prediction history, newest first
+    Pass the returned next_cursor to fetch the following page
+    The API has no authentication: user_id is trusted as given, so any caller can page
+    through any user's history (see README, GET /api/history)
     """
     try:
-        # This would fetch from database
-        return {"message": "History endpoint - to be implemented with user authentication"}
+        return await get_user_history(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch history: {str(e)}")
+
+@router.get("/history/{prediction_id}", response_model=PredictionResponse, responses=MSGPACK_RESPONSES)
+async def get_prediction_history_details(request: Request, prediction_id: str):
+    """
+    Full stored prediction for one history entry
+    """
+    details = await get_prediction_details(prediction_id)
+    if details is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return negotiated_response(request, details)
@@ -0,0 +1,197 @@
+"""
+Compact storage format for prediction documents (schema_version 2)
+
+Instead of the full /api/predict response under `prediction_data`, a v2 document keeps
+the response in `p` as short-keyed columnar arrays:
+
+    cls   model class id per item (-1 = not a model class, name kept in `xn`)
+    g     portion grams x10         k     calories, protein, carbs, fat x10, flattened
+    cf    confidence x100           bb    bbox x1, y1, x2, y2, flattened
+    tc    total calories x10        tm    total protein, carbs, fat x10
+    img   [width, height, format]   nv    nutrition table version
+
+Anything else is kept as is: item fields beyond FoodItem (the track_id / frames / best_frame
+of /api/predict/clip results) in `xi`, one dict per item, and other response fields
+(clip_info) in `x`. Responses are already rounded to 0.1 (confidence to 0.01), so the integer
+scaling is lossless and expand_prediction() rebuilds exactly the stored response body.
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+from app.database.connection import close_db, get_database, init_db
+from app.utils.nutrition_engine import load_class_names
+
+SCHEMA_VERSION = 2
+NUTRIENT_FIELDS = ("calories", "protein", "carbs", "fat")
+MACRO_FIELDS = ("protein", "carbs", "fat")
+UNKNOWN_CLASS = -1
+ITEM_FIELDS = {"food_name", "portion_grams", "confidence", "bbox", *NUTRIENT_FIELDS}
+RESPONSE_FIELDS = {"success", "total_calories", "total_macros", "detected_foods", "image_info", "nutrition_version"}
+
+# Model class ids are fixed by classes (1).txt, unlike the nutrition table order
+CLASS_NAMES = load_class_names()
+CLASS_IDS = {name: class_id for class_id, name in enumerate(CLASS_NAMES)}
+
+def _scaled(value: float, scale: int) -> int:
+    return int(round(value * scale))
+
+def compact_prediction(response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    /api/predict response -> compact `p` payload
+    """
+    items = response.get("detected_foods", [])
+    class_ids = []
+    extra_names = []
+    nutrients = []
+    boxes = []
+    for item in items:
+        class_id = CLASS_IDS.get(item["food_name"], UNKNOWN_CLASS)
+        class_ids.append(class_id)
+        if class_id == UNKNOWN_CLASS:
+            extra_names.append(item["food_name"])
+        nutrients.extend(_scaled(item[field], 10) for field in NUTRIENT_FIELDS)
+        boxes.extend(int(value) for value in item["bbox"])
+
+    macros = response.get("total_macros", {})
+    image_info = response.get("image_info", {})
+    compact = {
+        "tc": _scaled(response.get("total_calories", 0), 10),
+        "tm": [_scaled(macros.get(field, 0), 10) for field in MACRO_FIELDS],
+        "cls": class_ids,
+        "g": [_scaled(item["portion_grams"], 10) for item in items],
+        "k": nutrients,
+        "cf": [_scaled(item["confidence"], 100) for item in items],
+        "bb": boxes,
+        "img": [image_info.get("width"), image_info.get("height"), image_info.get("format")],
+    }
+    if extra_names:
+        compact["xn"] = extra_names
+    if "nutrition_version" in response:
+        compact["nv"] = response["nutrition_version"]
+    if not response.get("success", True):
+        compact["ok"] = False
+
+    item_extras = [{key: value for key, value in item.items() if key not in ITEM_FIELDS} for item in items]
+    if any(item_extras):
+        compact["xi"] = item_extras
+    extras = {key: value for key, value in response.items() if key not in RESPONSE_FIELDS}
+    if extras:
+        compact["x"] = extras
+    return compact
+
+def expand_prediction(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact `p` payload -> /api/predict response (PredictionResponse, or ClipResponse, shape)
+    """
+    extra_names = iter(compact.get("xn", []))
+    item_extras = compact.get("xi") or [{}] * len(compact["cls"])
+    nutrients = compact["k"]
+    boxes = compact["bb"]
+    items = []
+    for i, class_id in enumerate(compact["cls"]):
+        name = next(extra_names) if class_id == UNKNOWN_CLASS else CLASS_NAMES[class_id]
+        calories, protein, carbs, fat = nutrients[4 * i:4 * i + 4]
+        items.append({
+            "food_name": name,
+            "portion_grams": compact["g"][i] / 10,
+            "calories": calories / 10,
+            "protein": protein / 10,
+            "carbs": carbs / 10,
+            "fat": fat / 10,
+            "confidence": compact["cf"][i] / 100,
+            "bbox": boxes[4 * i:4 * i + 4],
+            **item_extras[i],
+        })
+
+    width, height, image_format = compact["img"]
+    response = {
+        "success": compact.get("ok", True),
+        "total_calories": compact["tc"] / 10,
+        "total_macros": {field: value / 10 for field, value in zip(MACRO_FIELDS, compact["tm"])},
+        "detected_foods": items,
+        "image_info": {"width": width, "height": height, "format": image_format},
+    }
+    if "nv" in compact:
+        response["nutrition_version"] = compact["nv"]
+    response.update(compact.get("x", {}))
+    return response
+
+def stored_prediction(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Prediction response from a stored document of either schema version"""
+    if document.get("schema_version", 1) >= SCHEMA_VERSION:
+        return expand_prediction(document["p"])
+    return document.get("prediction_data")
+
+def stored_macros(document: Dict[str, Any]) -> Dict[str, float]:
+    """Total protein/carbs/fat of a stored document without expanding the items"""
+    if document.get("schema_version", 1) >= SCHEMA_VERSION:
+        return {field: value / 10 for field, value in zip(MACRO_FIELDS, document["p"]["tm"])}
+    return document.get("prediction_data", {}).get("total_macros", {})
+
+def compact_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a v1 document (full response in prediction_data) to v2"""
+    converted = {key: value for key, value in document.items() if key != "prediction_data"}
+    prediction_data = document.get("prediction_data", {})
+    converted["schema_version"] = SCHEMA_VERSION
+    converted["p"] = compact_prediction(prediction_data)
+    converted.setdefault("total_calories", prediction_data.get("total_calories", 0))
+    converted.setdefault("food_count", len(prediction_data.get("detected_foods", [])))
+    return converted
+
+async def migrate_predictions(batch_size: int = 500, dry_run: bool = False) -> int:
+    """
+    Rewrite v1 prediction documents in place as v2, in _id order and batches
+    Documents that can't be converted are left as they are; re-running picks up where it stopped.
+    """
+    db = await get_database()
+    if db is None:
+        raise RuntimeError("Database not available")
+
+    migrated = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"schema_version": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        documents = await db.predictions.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations = []
+        for document in documents:
+            try:
+                converted = compact_document(document)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping prediction {document.get('prediction_id')}: {e}")
+                continue
+            update = {key: value for key, value in converted.items() if key != "_id"}
+            operations.append(UpdateOne(
+                {"_id": document["_id"], "schema_version": {"$exists": False}},
+                {"$set": update, "$unset": {"prediction_data": ""}},
+            ))
+
+        if operations and not dry_run:
+            await db.predictions.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        print(f"{'Would migrate' if dry_run else 'Migrated'} {migrated} predictions")
+
+    return migrated
+
+async def _migrate(batch_size: int, dry_run: bool) -> None:
+    await init_db()
+    try:
+        await migrate_predictions(batch_size, dry_run)
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    # python -m app.database.compact [--batch-size N] [--dry-run]
+    parser = argparse.ArgumentParser(description="Convert stored predictions to the compact schema")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count convertible documents without writing")
+    args = parser.parse_args()
+    asyncio.run(_migrate(args.batch_size, args.dry_run))
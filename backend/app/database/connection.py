@@ -1,34 +1,254 @@
+import asyncio
 import os
+import threading
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import monitoring, uri_parser
+from pymongo.errors import ConnectionFailure
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.utils.metrics import metrics
+
+POOL_CONNECTIONS = metrics.gauge(
+    "mongo_pool_connections", "Open connections in the MongoDB pool"
+)
+POOL_IN_USE = metrics.gauge(
+    "mongo_pool_in_use", "MongoDB connections checked out by operations"
+)
+BREAKER_STATE = metrics.gauge(
+    "mongo_breaker_open", "1 while the MongoDB circuit breaker is open or half-open"
+)
+DB_SKIPPED = metrics.counter(
+    "db_skipped_total", "Storage calls skipped because MongoDB is unavailable", labelnames=("reason",)
+)
+
+class CircuitBreaker:
+    """
+    Fails storage calls fast while MongoDB is unhealthy
+    closed: calls go through. After failure_threshold consecutive failures the breaker
+    opens and calls are rejected; after reset_timeout seconds it goes half-open and lets
+    calls through again until the next success (closed) or failure (open).
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold or int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", 3))
+        self.reset_timeout = reset_timeout or float(os.getenv("DB_BREAKER_RESET_TIMEOUT", 10))
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        # Heartbeat events arrive on pymongo's monitor threads
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            return self.state != "open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.last_error = None
+        BREAKER_STATE.set(0)
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self.failures += 1
+            if error is not None:
+                # Server selection errors append the whole topology description
+                self.last_error = str(error).split(", Timeout:")[0]
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"MongoDB circuit breaker open: {self.last_error}")
+                self.state = "open"
+                self.opened_at = self.clock()
+        BREAKER_STATE.set(1)
+
+    def trip(self, error: Any = None) -> None:
+        """Open immediately, e.g. after a ping that waited out the server selection timeout"""
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold)
+        self.record_failure(error)
+
+    def info(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "last_error": self.last_error}
+
+class PoolMonitor(monitoring.ConnectionPoolListener, monitoring.ServerHeartbeatListener):
+    """
+    pymongo event listener: tracks pool usage and feeds server heartbeats to the breaker
+    The driver keeps heartbeating a down server, so the breaker closes again on its own.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.connections = 0
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def _update(self, connections: int = 0, in_use: int = 0) -> None:
+        with self._lock:
+            self.connections += connections
+            self.in_use += in_use
+            POOL_CONNECTIONS.set(self.connections)
+            POOL_IN_USE.set(self.in_use)
+
+    def connection_created(self, event):
+        self._update(connections=1)
+
+    def connection_closed(self, event):
+        self._update(connections=-1)
+
+    def connection_checked_out(self, event):
+        self._update(in_use=1)
+
+    def connection_checked_in(self, event):
+        self._update(in_use=-1)
+
+    def pool_cleared(self, event):
+        # Connections checked out at the time are closed as they are returned
+        pass
+
+    # ServerHeartbeatListener hooks
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if self.breaker.state != "closed":
+            self.breaker.record_success()
+
+    def failed(self, event):
+        self.breaker.record_failure(event.reply)
+
+    # Remaining listener hooks are not needed
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database = None
+    breaker = CircuitBreaker()
+    pool: Optional[PoolMonitor] = None
+    connected = False
 
 db = Database()
 
+# Run whenever MongoDB becomes reachable (startup or after an outage)
+on_connect: List[Callable[[], Awaitable[None]]] = []
+
+def client_options() -> Dict[str, Any]:
+    """
+    Pool and timeout settings for the Mongo client
+    Server selection times out in seconds instead of the driver's 30 s default so a
+    request never hangs on a dead database.
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", 60000)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 2000)),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 2000)),
+        "socketTimeoutMS": int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", 10000)),
+        "heartbeatFrequencyMS": int(os.getenv("MONGODB_HEARTBEAT_MS", 5000)),
+    }
+
+def url_client_options(url: str) -> Dict[str, Any]:
+    """client_options() minus the ones MONGODB_URL already sets, which take precedence"""
+    url_options = uri_parser.parse_uri(url)["options"]
+    return {key: value for key, value in client_options().items() if key not in url_options}
+
 async def get_database():
+    # None while not configured or while the circuit breaker is open: callers skip the call
+    if db.database is None:
+        DB_SKIPPED.inc(reason="not_configured")
+        return None
+    if not db.breaker.allow_request():
+        DB_SKIPPED.inc(reason="breaker_open")
+        return None
     return db.database
 
-async def init_db():
-    #Initialization 
+def report_db_error(error: Exception) -> None:
+    # Storage calls report failures so the breaker opens without waiting for a heartbeat;
+    # only connectivity errors count (a duplicate key says nothing about the server)
+    if isinstance(error, ConnectionFailure):
+        db.breaker.record_failure(error)
+
+async def init_db(check: bool = True):
+    #Initialization
+    # check=False leaves the first ping to the caller (the app runs it in the background)
     MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "smart_diet_db")
-    
+
     try:
-        db.client = AsyncIOMotorClient(MONGODB_URL)
+        db.pool = PoolMonitor(db.breaker)
+        db.client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[db.pool], **url_client_options(MONGODB_URL))
         db.database = db.client[DATABASE_NAME]
-        
-        # Test connection
-        await db.client.admin.command('ping')
-        print("Successfully connected to MongoDB")
-        
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
+        print(f"Failed to create MongoDB client: {e}")
+        db.client = None
         db.database = None
+        return
+
+    # Test connection; on failure the client stays around and watch_connection keeps trying
+    if check:
+        await check_connection()
+
+async def check_connection() -> bool:
+    """Ping MongoDB, update the breaker, and run on_connect hooks on (re)connection"""
+    if db.client is None:
+        return False
+    try:
+        await db.client.admin.command('ping')
+    except Exception as e:
+        if db.connected:
+            print(f"Lost connection to MongoDB: {e}")
+        else:
+            print(f"Failed to connect to MongoDB: {e}")
+        db.connected = False
+        db.breaker.trip(e)
+        return False
+
+    db.breaker.record_success()
+    if not db.connected:
+        db.connected = True
+        print("Successfully connected to MongoDB")
+        for hook in on_connect:
+            try:
+                await hook()
+            except Exception as e:
+                print(f"MongoDB on-connect hook failed: {e}")
+    return True
+
+async def watch_connection(interval: float) -> None:
+    """Background reconnection: ping every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        await check_connection()
+
+def connection_info() -> Dict[str, Any]:
+    info = {"connected": db.connected, "breaker": db.breaker.info()}
+    if db.client is not None:
+        options = db.client.options.pool_options
+        info["pool"] = {
+            "max_size": options.max_pool_size,
+            "min_size": options.min_pool_size,
+            "connections": db.pool.connections if db.pool else 0,
+            "in_use": db.pool.in_use if db.pool else 0,
+        }
+    return info
 
 async def close_db():
     #Close database connection
     if db.client:
         db.client.close()
+        db.client = None
+        db.database = None
+        db.connected = False
@@ -0,0 +1,201 @@
+"""
+Per-user daily nutrition rollups for dashboards
+
+One document per (user_id, day) in the `daily_rollups` collection holds the day's
+calorie and macro totals. Totals are bumped with $inc whenever predictions are
+written, so a dashboard reads one small document per day instead of every meal.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.database.compact import MACRO_FIELDS, stored_macros
+from app.database.connection import close_db, get_database, init_db, report_db_error
+
+ROLLUP_FIELDS = ("calories", "protein", "carbs", "fat", "meals", "foods")
+MAX_RANGE_DAYS = 366
+
+def day_start(value: date) -> datetime:
+    """Midnight (UTC) of a day, or of the day a prediction timestamp falls on"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, time.min)
+
+def document_totals(document: Dict[str, Any]) -> Dict[str, float]:
+    macros = stored_macros(document)
+    return {
+        "calories": document["total_calories"],
+        "protein": macros.get("protein", 0),
+        "carbs": macros.get("carbs", 0),
+        "fat": macros.get("fat", 0),
+        "meals": 1,
+        "foods": document["food_count"],
+    }
+
+def rollup_increments(documents: List[Dict[str, Any]]) -> Dict[Tuple[str, datetime], Dict[str, Any]]:
+    """
+    Sum prediction documents per (user_id, day) so each flush sends one update per day
+    """
+    increments: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    for document in documents:
+        key = (document["user_id"], day_start(document["timestamp"]))
+        totals = increments.get(key)
+        if totals is None:
+            totals = increments[key] = {field: 0 for field in ROLLUP_FIELDS}
+            totals["last_prediction_at"] = document["timestamp"]
+        for field, value in document_totals(document).items():
+            totals[field] += value
+        totals["last_prediction_at"] = max(totals["last_prediction_at"], document["timestamp"])
+    return increments
+
+async def apply_rollups(documents: List[Dict[str, Any]]) -> None:
+    """
+    Add newly stored predictions to their daily rollups (atomic upsert + $inc)
+    Call only with documents that were actually inserted, or totals are double counted.
+    """
+    if not documents:
+        return
+    try:
+        db = await get_database()
+        if db is None:
+            return
+
+        operations = []
+        for (user_id, day), totals in rollup_increments(documents).items():
+            last_prediction_at = totals.pop("last_prediction_at")
+            operations.append(UpdateOne(
+                {"user_id": user_id, "day": day},
+                {"$inc": totals, "$max": {"last_prediction_at": last_prediction_at}},
+                upsert=True,
+            ))
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+
+    except Exception as e:
+        # The predictions are stored; rebuild_rollups can repair the totals
+        print(f"Failed to update daily rollups: {e}")
+        report_db_error(e)
+
+async def init_rollup_indexes() -> None:
+    try:
+        db = await get_database()
+        if db is None:
+            return
+        await db.daily_rollups.create_index([("user_id", 1), ("day", 1)], name="user_day", unique=True)
+    except Exception as e:
+        print(f"Failed to create rollup indexes: {e}")
+
+def check_range(start: date, end: date) -> None:
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"Range is limited to {MAX_RANGE_DAYS} days")
+
+def empty_day(day: date) -> Dict[str, Any]:
+    return {"day": day, **{field: 0 for field in ROLLUP_FIELDS}}
+
+async def get_daily_rollups(user_id: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """
+    One entry per day from start to end (inclusive); days without meals are zero
+    """
+    check_range(start, end)
+    days = {start + timedelta(days=i): empty_day(start + timedelta(days=i)) for i in range((end - start).days + 1)}
+
+    try:
+        db = await get_database()
+        if db is None:
+            return list(days.values())
+
+        projection = {"_id": 0, "day": 1, **{field: 1 for field in ROLLUP_FIELDS}}
+        cursor = db.daily_rollups.find(
+            {"user_id": user_id, "day": {"$gte": day_start(start), "$lte": day_start(end)}},
+            projection,
+        ).sort("day", 1)
+        async for document in cursor:
+            day = document["day"].date()
+            days[day] = {"day": day, **{field: round(document.get(field, 0), 1) for field in ROLLUP_FIELDS}}
+
+    except Exception as e:
+        print(f"Failed to fetch daily rollups: {e}")
+        report_db_error(e)
+
+    return list(days.values())
+
+def weekly_rollups(daily: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fold daily rollups into weeks starting on Monday"""
+    weeks: Dict[date, Dict[str, Any]] = {}
+    for entry in daily:
+        week_start = entry["day"] - timedelta(days=entry["day"].weekday())
+        week = weeks.get(week_start)
+        if week is None:
+            week = weeks[week_start] = {"week_start": week_start, **{field: 0 for field in ROLLUP_FIELDS}}
+        for field in ROLLUP_FIELDS:
+            week[field] += entry[field]
+    for week in weeks.values():
+        for field in ROLLUP_FIELDS:
+            week[field] = round(week[field], 1)
+    return list(weeks.values())
+
+async def rebuild_rollups(user_id: Optional[str] = None, since: Optional[date] = None) -> None:
+    """
+    Backfill: recompute daily rollups from the predictions collection
+    Matching days are replaced, so it is safe to re-run.
+    """
+    match: Dict[str, Any] = {}
+    if user_id:
+        match["user_id"] = user_id
+    if since:
+        match["timestamp"] = {"$gte": day_start(since)}
+
+    db = await get_database()
+    if db is None:
+        raise RuntimeError("Database not available")
+
+    await init_rollup_indexes()
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateFromString": {"dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}}},
+            },
+            "calories": {"$sum": {"$ifNull": ["$total_calories", "$prediction_data.total_calories"]}},
+            # Compact documents keep the macros x10 in p.tm, full ones in prediction_data
+            **{field: {"$sum": {"$ifNull": [
+                {"$divide": [{"$arrayElemAt": ["$p.tm", index]}, 10]},
+                f"$prediction_data.total_macros.{field}",
+            ]}} for index, field in enumerate(MACRO_FIELDS)},
+            "meals": {"$sum": 1},
+            "foods": {"$sum": {"$ifNull": [
+                "$food_count", {"$size": {"$ifNull": ["$prediction_data.detected_foods", []]}}
+            ]}},
+            "last_prediction_at": {"$max": "$timestamp"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "day": "$_id.day",
+            **{field: 1 for field in ROLLUP_FIELDS},
+            "last_prediction_at": 1,
+        }},
+        {"$merge": {"into": "daily_rollups", "on": ["user_id", "day"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    await db.predictions.aggregate(pipeline).to_list(length=None)
+
+async def _backfill(user_id: Optional[str], since: Optional[date]) -> None:
+    await init_db()
+    try:
+        await rebuild_rollups(user_id, since)
+        print("Daily rollups rebuilt")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    # python -m app.database.rollups [--user-id ID] [--since YYYY-MM-DD]
+    parser = argparse.ArgumentParser(description="Rebuild daily nutrition rollups from stored predictions")
+    parser.add_argument("--user-id", help="only this user")
+    parser.add_argument("--since", type=date.fromisoformat, help="only days from this date on")
+    args = parser.parse_args()
+    asyncio.run(_backfill(args.user_id, args.since))
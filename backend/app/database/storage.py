@@ -1,61 +1,403 @@
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-from app.database.connection import get_database
+from typing import Dict, Any, List, Optional, Tuple
+from app.database.connection import get_database, report_db_error
+from app.database.compact import SCHEMA_VERSION, compact_prediction, stored_prediction
+from app.database.rollups import apply_rollups
+from app.utils.metrics import metrics
+import asyncio
+import base64
+import json
+import os
+import time
 import uuid
 
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+BUFFER_DEPTH = metrics.gauge(
+    "write_buffer_depth", "Prediction documents waiting in the write-behind buffer"
+)
+BUFFER_FLUSH_SECONDS = metrics.histogram(
+    "write_buffer_flush_seconds", "Latency of one insert_many flush"
+)
+BUFFER_FLUSHED = metrics.counter(
+    "write_buffer_flushed_total", "Prediction documents written by the write-behind buffer"
+)
+BUFFER_OVERFLOW = metrics.counter(
+    "write_buffer_overflow_total", "Documents that did not fit in the buffer", labelnames=("policy",)
+)
+BUFFER_FAILED = metrics.counter(
+    "write_buffer_failed_total", "Documents that could not be written", labelnames=("reason",)
+)
+
+# "compact" (schema_version 2) or "full" (the whole response under prediction_data)
+STORAGE_FORMAT = os.getenv("PREDICTION_STORAGE_FORMAT", "compact").lower()
+
+SPILL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'spill', 'predictions.jsonl')
+
+class WriteBehindBuffer:
+    """
+    Bounded in-memory queue of prediction documents flushed with insert_many
+    A flush happens when batch_size documents are queued or flush_interval seconds pass.
+    When the queue is full the overflow policy decides: block the caller, drop the
+    document, or spill it to a local JSONL file. Under the spill policy, batches that
+    cannot be written (database down or circuit breaker open) are spilled as well.
+    The file is replayed on the next start, or as soon as a flush succeeds again.
+    """
+
+    POLICIES = ("block", "drop", "spill")
+
+    def __init__(self, max_size: Optional[int] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, overflow_policy: Optional[str] = None,
+                 spill_path: Optional[str] = None):
+        self.max_size = max_size or int(os.getenv("WRITE_BUFFER_MAX_SIZE", 10000))
+        self.batch_size = batch_size or int(os.getenv("WRITE_BUFFER_BATCH_SIZE", 100))
+        self.flush_interval = flush_interval or float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", 1.0))
+        self.overflow_policy = (overflow_policy or os.getenv("WRITE_BUFFER_OVERFLOW", "spill")).lower()
+        if self.overflow_policy not in self.POLICIES:
+            raise ValueError(f"Unknown WRITE_BUFFER_OVERFLOW policy: {self.overflow_policy}")
+        self.spill_path = spill_path or os.getenv("WRITE_BUFFER_SPILL_PATH", SPILL_PATH)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Set when this run spilled documents that still need replaying
+        self._spilled = False
+        self._replaying = False
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self._run())
+        await self.replay_spill()
+
+    async def stop(self) -> None:
+        """Write out everything still queued, then stop the flush loop"""
+        if not self.running:
+            return
+        # Sentinel: the worker flushes its current batch and the rest of the queue, then exits
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+
+    async def enqueue(self, document: Dict[str, Any]) -> None:
+        if self.overflow_policy == "block":
+            await self._queue.put(document)
+        else:
+            try:
+                self._queue.put_nowait(document)
+            except asyncio.QueueFull:
+                BUFFER_OVERFLOW.inc(policy=self.overflow_policy)
+                if self.overflow_policy == "spill":
+                    await self._spill([document])
+                else:
+                    print("Write buffer full, dropping prediction document")
+        BUFFER_DEPTH.set(self._queue.qsize())
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        documents = []
+        while len(documents) < limit and not self._queue.empty():
+            document = self._queue.get_nowait()
+            if document is not None:
+                documents.append(document)
+        return documents
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            # Wait for the first document, then give the batch up to flush_interval to fill
+            documents = []
+            document = await self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while document is not None:
+                documents.append(document)
+                if len(documents) >= self.batch_size:
+                    break
+                try:
+                    document = self._queue.get_nowait()
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    document = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            
+            stopping = document is None
+            await self._flush(documents)
+        
+        # Anything enqueued after the stop sentinel
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+
+    async def _flush(self, documents: List[Dict[str, Any]]) -> None:
+        BUFFER_DEPTH.set(self._queue.qsize())
+        if not documents:
+            return
+        try:
+            db = await get_database()
+            if db is None:
+                BUFFER_FAILED.inc(len(documents), reason="no_db")
+                if self.overflow_policy == "spill":
+                    await self._spill(documents)
+                else:
+                    print(f"Database not available, skipping save of {len(documents)} predictions")
+                return
+            
+            started = time.perf_counter()
+            # Unordered so one bad document doesn't stop the rest
+            inserted = await insert_predictions(db, documents)
+            BUFFER_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            BUFFER_FLUSHED.inc(len(inserted))
+            if len(inserted) < len(documents):
+                # Per-document errors (e.g. a replayed duplicate) would fail again; don't spill them
+                BUFFER_FAILED.inc(len(documents) - len(inserted), reason="rejected")
+            await apply_rollups(inserted)
+            
+            if self._spilled:
+                # The database is back (e.g. the breaker closed): write out what was spilled meanwhile
+                self._spilled = False
+                await self.replay_spill()
+            
+        except Exception as e:
+            print(f"Failed to flush {len(documents)} predictions: {e}")
+            report_db_error(e)
+            BUFFER_FAILED.inc(len(documents), reason="error")
+            if self.overflow_policy == "spill":
+                await self._spill(documents)
+
+    async def _spill(self, documents: List[Dict[str, Any]]) -> None:
+        lines = "".join(json_util.dumps(document) + "\n" for document in documents)
+        
+        def append():
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as file:
+                file.write(lines)
+        
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, append)
+            self._spilled = True
+        except Exception as e:
+            print(f"Failed to spill predictions to {self.spill_path}: {e}")
+
+    async def replay_spill(self) -> None:
+        """Queue documents spilled by a previous run, if the database is reachable"""
+        replay_path = self.spill_path + ".replay"
+        if self._replaying or not (os.path.exists(self.spill_path) or os.path.exists(replay_path)):
+            return
+        if await get_database() is None:
+            return
+        
+        self._replaying = True
+        try:
+            # A .replay file is what a run that stopped mid-replay left behind; it goes first
+            # (documents it already inserted come back as duplicates, which are not retried)
+            if os.path.exists(replay_path):
+                await self._replay_file(replay_path)
+            if os.path.exists(self.spill_path):
+                os.replace(self.spill_path, replay_path)
+                await self._replay_file(replay_path)
+        except Exception as e:
+            print(f"Failed to replay spilled predictions: {e}")
+        finally:
+            self._replaying = False
+
+    async def _replay_file(self, path: str) -> None:
+        with open(path, 'r', encoding='utf-8') as file:
+            documents = [json_util.loads(line) for line in file if line.strip()]
+        for start in range(0, len(documents), self.batch_size):
+            await self._flush(documents[start:start + self.batch_size])
+        os.remove(path)
+        print(f"Replayed {len(documents)} spilled predictions")
+
+write_buffer = WriteBehindBuffer()
+
 async def save_prediction_result(prediction_data: Dict[str, Any]) -> str:
     
    # Save prediction result to database
+   # Queued on the write-behind buffer when it is running, so the caller
+   # doesn't wait for MongoDB; returns the new prediction_id
 
     try:
+        # Add metadata
+        document = build_prediction_document(prediction_data)
+        
+        if write_buffer.running:
+            await write_buffer.enqueue(document)
+            return document["prediction_id"]
+        
         db = await get_database()
         if db is None:
             print("Database not available, skipping save")
             return "no-db"
         
-        # Add metadata
-        document = {
-            "prediction_id": str(uuid.uuid4()),
-            "timestamp": datetime.utcnow(),
-            "prediction_data": prediction_data,
-            "user_id": "anonymous"  # TODO: Add user authentication
-        }
-        
         # Insert into predictions collection
-        result = await db.predictions.insert_one(document)
-        return str(result.inserted_id)
+        await db.predictions.insert_one(document)
+        await apply_rollups([document])
+        return document["prediction_id"]
         
     except Exception as e:
         print(f"Failed to save prediction: {e}")
+        report_db_error(e)
         return "error"
 
-async def get_user_history(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+async def insert_predictions(db, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    
+    # Unordered insert_many so one bad document doesn't stop the rest;
+    # returns the documents that were actually stored
+
+    try:
+        await db.predictions.insert_many(documents, ordered=False)
+        return documents
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if not write_errors:
+            raise
+        failed = {error["index"] for error in write_errors}
+        print(f"{len(failed)} of {len(documents)} predictions rejected: {write_errors[0].get('errmsg')}")
+        return [document for index, document in enumerate(documents) if index not in failed]
+
+def build_prediction_document(prediction_data: Dict[str, Any], prediction_id: Optional[str] = None) -> Dict[str, Any]:
+    
+    # Wrap a prediction response with the metadata stored alongside it
+
+    # food_count / total_calories are denormalized so history reads never touch the items
+    document = {
+        "prediction_id": prediction_id or str(uuid.uuid4()),
+        "timestamp": datetime.utcnow(),
+        "user_id": "anonymous",  # TODO: Add user authentication
+        "total_calories": prediction_data.get("total_calories", 0),
+        "food_count": len(prediction_data.get("detected_foods", []))
+    }
+    
+    # Compact columnar payload (app/database/compact.py) unless the full response is requested
+    if STORAGE_FORMAT == "full":
+        document["prediction_data"] = prediction_data
+    else:
+        document["schema_version"] = SCHEMA_VERSION
+        document["p"] = compact_prediction(prediction_data)
+    return document
+
+SUMMARY_BACKFILL = "history_summary_fields"
+
+async def init_prediction_indexes() -> None:
+    
+    # Indexes for history reads, plus a one-off backfill of the summary fields
+
+    try:
+        db = await get_database()
+        if db is None:
+            return
+        
+        await db.predictions.create_index(
+            [("user_id", 1), ("timestamp", -1), ("prediction_id", -1)],
+            name="user_history"
+        )
+        await db.predictions.create_index("prediction_id", name="prediction_id", unique=True)
+        
+        # Documents written before food_count/total_calories existed. New documents always
+        # carry them, so the scan runs once and is recorded in the migrations collection
+        if await db.migrations.find_one({"_id": SUMMARY_BACKFILL}) is None:
+            result = await db.predictions.update_many(
+                {"food_count": {"$exists": False}},
+                [{"$set": {
+                    "food_count": {"$size": {"$ifNull": ["$prediction_data.detected_foods", []]}},
+                    "total_calories": {"$ifNull": ["$prediction_data.total_calories", 0]}
+                }}]
+            )
+            if result.modified_count:
+                print(f"Backfilled history summary fields on {result.modified_count} predictions")
+            await db.migrations.replace_one(
+                {"_id": SUMMARY_BACKFILL},
+                {"_id": SUMMARY_BACKFILL, "completed_at": datetime.utcnow(), "modified": result.modified_count},
+                upsert=True
+            )
+        
+    except Exception as e:
+        print(f"Failed to create prediction indexes: {e}")
+        report_db_error(e)
+
+def encode_history_cursor(timestamp: datetime, prediction_id: str) -> str:
+    
+    # Opaque keyset cursor: position of the last item returned
+
+    payload = json.dumps({"t": timestamp.isoformat(), "id": prediction_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(payload["t"]), str(payload["id"])
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+async def save_prediction_documents(documents: List[Dict[str, Any]]) -> int:
+    
+    # Save many prediction documents with a single bulk insert
+
+    if not documents:
+        return 0
+
+    try:
+        db = await get_database()
+        if db is None:
+            print("Database not available, skipping bulk save")
+            return 0
+        
+        inserted = await insert_predictions(db, documents)
+        await apply_rollups(inserted)
+        return len(inserted)
+        
+    except Exception as e:
+        print(f"Failed to bulk save predictions: {e}")
+        report_db_error(e)
+        return 0
+
+HISTORY_PROJECTION = {"_id": 0, "prediction_id": 1, "timestamp": 1, "total_calories": 1, "food_count": 1}
+
+async def get_user_history(user_id: str, limit: int = 10, cursor: Optional[str] = None) -> Dict[str, Any]:
+
+   # Get user's prediction history, newest first
+   # Keyset pagination on (timestamp, prediction_id): pass next_cursor back to get the next page.
+   # Served from the user_history index with only the summary fields projected.
 
-   # Get user's prediction history
+    query: Dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        # Raises ValueError for a malformed cursor
+        before_timestamp, before_id = decode_history_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": before_timestamp}},
+            {"timestamp": before_timestamp, "prediction_id": {"$lt": before_id}}
+        ]
 
     try:
         db = await get_database()
         if db is None:
-            return []
+            return {"items": [], "next_cursor": None}
         
-        cursor = db.predictions.find(
-            {"user_id": user_id}
-        ).sort("timestamp", -1).limit(limit)
+        # One extra row tells us whether there is another page
+        documents = await db.predictions.find(query, HISTORY_PROJECTION).sort(
+            [("timestamp", -1), ("prediction_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
         
-        history = []
-        async for document in cursor:
-            history.append({
-                "prediction_id": document["prediction_id"],
-                "timestamp": document["timestamp"],
-                "total_calories": document["prediction_data"]["total_calories"],
-                "food_count": len(document["prediction_data"]["detected_foods"])
-            })
+        items = documents[:limit]
+        next_cursor = None
+        if len(documents) > limit:
+            last = items[-1]
+            next_cursor = encode_history_cursor(last["timestamp"], last["prediction_id"])
         
-        return history
+        return {"items": items, "next_cursor": next_cursor}
         
     except Exception as e:
         print(f"Failed to fetch history: {e}")
-        return []
+        report_db_error(e)
+        return {"items": [], "next_cursor": None}
 
 async def get_prediction_details(prediction_id: str) -> Optional[Dict[str, Any]]:
     
@@ -66,9 +408,12 @@ async def get_prediction_details(prediction_id: str) -> Optional[Dict[str, Any]]
         if db is None:
             return None
         
-        document = await db.predictions.find_one({"prediction_id": prediction_id})
-        return document["prediction_data"] if document else None
+        document = await db.predictions.find_one(
+            {"prediction_id": prediction_id}, {"_id": 0, "prediction_data": 1, "p": 1, "schema_version": 1}
+        )
+        return stored_prediction(document) if document else None
         
     except Exception as e:
         print(f"Failed to fetch prediction details: {e}")
+        report_db_error(e)
         return None
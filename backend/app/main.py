@@ -1,14 +1,48 @@
+# First import, so the startup report's "interpreter" phase ends before the app imports
+from app.utils.startup import startup_report
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
+import os
 import uvicorn
 from app.api.predict import router as predict_router
-from app.database.connection import init_db
+from app.api.admin import router as admin_router
+from app.api.dashboard import router as dashboard_router
+from app.api.live import router as live_router
+from app.database.connection import init_db, close_db, on_connect, check_connection, watch_connection, connection_info
+from app.database.storage import write_buffer, init_prediction_indexes
+from app.database.rollups import init_rollup_indexes
+from app.utils.model_registry import model_registry
+from app.utils.cascade import cascade
+from app.server import worker_info
+from app.utils.batch_scheduler import batch_scheduler
+from app.utils.executor import inference_executor
+from app.utils.metrics import metrics
+from app.utils.prediction_cache import prediction_cache
+from app.utils.responses import FastJSONResponse
+from app.utils.calorie_calculator import nutrition_store
+from app.utils.upload import (
+    MULTIPART_OVERHEAD, UPLOAD_MAX_BATCH_BYTES, UPLOAD_MAX_BYTES, UPLOAD_MAX_VIDEO_BYTES, UploadLimitMiddleware,
+)
 
 app = FastAPI(
     title="Smart Diet Recommender API",
     description="Backend API for food detection and calorie calculation",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson-rendered JSON for every route (see app.utils.responses)
+    default_response_class=FastJSONResponse
+)
+
+# Oversized uploads are cut off while still arriving, before the form is parsed;
+# added first so CORS headers still wrap the 413
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/api/predict": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD,
+        "/api/predict/batch": UPLOAD_MAX_BATCH_BYTES,
+        "/api/predict/clip": max(UPLOAD_MAX_VIDEO_BYTES + MULTIPART_OVERHEAD, UPLOAD_MAX_BATCH_BYTES),
+    },
 )
 
 app.add_middleware(
@@ -20,10 +54,51 @@ app.add_middleware(
 )
 
 app.include_router(predict_router, prefix="/api", tags=["prediction"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
+app.include_router(dashboard_router, prefix="/api/rollups", tags=["dashboard"])
+app.include_router(live_router, prefix="/api", tags=["live"])
+
+background_tasks = []
+startup_report.mark("app_imported")
 
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
+    inference_executor.start()
+    # Load and warm up the model in the background; /health reports ready once done
+    asyncio.get_running_loop().run_in_executor(None, inference_executor.prepare_model)
+    await batch_scheduler.start()
+    
+    # Hot-reload nutrition_db.csv when it changes on disk (0 disables the watcher)
+    watch_interval = float(os.getenv("NUTRITION_WATCH_INTERVAL", 5))
+    if watch_interval > 0:
+        background_tasks.append(asyncio.create_task(nutrition_store.watch(watch_interval)))
+    
+    await write_buffer.start()
+    # Run on the first successful connection, and again after every reconnection
+    on_connect.extend([
+        init_prediction_indexes,
+        init_rollup_indexes,
+        write_buffer.replay_spill,
+        prediction_cache.init_storage,
+    ])
+    # Predictions work without MongoDB, so serving does not wait for the first ping
+    await init_db(check=False)
+    background_tasks.append(asyncio.create_task(check_connection()))
+    reconnect_interval = float(os.getenv("MONGODB_RECONNECT_INTERVAL", 5))
+    if reconnect_interval > 0:
+        background_tasks.append(asyncio.create_task(watch_connection(reconnect_interval)))
+    startup_report.mark("serving")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await batch_scheduler.stop()
+    # Flush queued predictions before the process exits
+    await write_buffer.stop()
+    await close_db()
+    inference_executor.shutdown()
 
 @app.get("/")
 async def root():
@@ -31,7 +106,27 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    if not model_registry.is_ready():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "model": model_registry.info(), "database": connection_info(),
+                     "startup": startup_report.info()}
+        )
+    # Predictions still work without MongoDB, so a database outage only degrades the status
+    database = connection_info()
+    status = "healthy" if database["breaker"]["state"] == "closed" else "degraded"
+    response = {"status": status, "model": model_registry.info(), "database": database,
+                "startup": startup_report.info()}
+    worker = worker_info()
+    if worker is not None:
+        response["worker"] = worker
+    if cascade.enabled:
+        response["cascade"] = cascade.info()
+    return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
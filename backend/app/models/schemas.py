@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 class FoodItem(BaseModel):
     food_name: str
@@ -23,6 +23,25 @@ class PredictionResponse(BaseModel):
     total_macros: MacroNutrients
     detected_foods: List[FoodItem]
     image_info: Dict[str, Any]
+    nutrition_version: Optional[str] = None
+
+class TrackedFoodItem(FoodItem):
+    track_id: int
+    frames: List[int]
+    best_frame: int
+
+class ClipInfo(BaseModel):
+    source: str
+    frames_received: int
+    frames_analyzed: int
+    analyzed_frames: List[int]
+    truncated: bool
+    input_frame_limit: Optional[int] = None
+    unique_dishes: int
+
+class ClipResponse(PredictionResponse):
+    detected_foods: List[TrackedFoodItem]
+    clip_info: ClipInfo
 
 class PredictionHistory(BaseModel):
     prediction_id: str
@@ -30,6 +49,36 @@ class PredictionHistory(BaseModel):
     total_calories: float
     food_count: int
 
+class HistoryPage(BaseModel):
+    items: List[PredictionHistory]
+    next_cursor: Optional[str] = None
+
+class RollupTotals(BaseModel):
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    meals: int
+    foods: int
+
+class DailyRollup(RollupTotals):
+    day: date
+
+class WeeklyRollup(RollupTotals):
+    week_start: date
+
+class DailyRollupRange(BaseModel):
+    user_id: str
+    start: date
+    end: date
+    days: List[DailyRollup]
+
+class WeeklyRollupRange(BaseModel):
+    user_id: str
+    start: date
+    end: date
+    weeks: List[WeeklyRollup]
+
 class ErrorResponse(BaseModel):
     success: bool = False
     error: str
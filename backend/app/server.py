@@ -0,0 +1,234 @@
+"""
+Production server: pre-forked uvicorn workers sharing one preloaded model
+
+    SERVER_MODE=production python run.py
+    python -m app.server
+
+The parent process imports the app, loads the model weights and binds the socket, then
+forks SERVER_WORKERS workers. Weights loaded before the fork are shared copy-on-write.
+Each worker gets its share of the CPU threads (and optionally its own cores), warms the
+model up itself, and exits after about SERVER_MAX_REQUESTS requests to cap memory
+creep; the parent replaces it. Peak RSS and PSS per worker are logged every
+SERVER_REPORT_INTERVAL seconds and when a worker exits.
+
+Linux only (fork, sched_setaffinity, /proc).
+"""
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+
+from app.utils.model_registry import model_registry, set_torch_threads
+from app.utils.startup import preload, startup_report
+
+def memory_info(pid: Any = "self") -> Dict[str, Optional[float]]:
+    """Current and peak RSS (VmRSS / VmHWM) and proportional set size, in MB"""
+    info: Dict[str, Optional[float]] = {"rss_mb": None, "peak_rss_mb": None, "pss_mb": None}
+    fields = {"VmRSS:": "rss_mb", "VmHWM:": "peak_rss_mb", "Pss:": "pss_mb"}
+    for path in (f"/proc/{pid}/status", f"/proc/{pid}/smaps_rollup"):
+        try:
+            with open(path, 'r') as file:
+                for line in file:
+                    parts = line.split()
+                    if parts and parts[0] in fields:
+                        # Values are in kB; PSS counts shared pages divided among their users
+                        info[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+        except OSError:
+            pass
+    return info
+
+def worker_info() -> Optional[Dict[str, Any]]:
+    """This worker's index and memory, or None when not running under the production server"""
+    index = os.getenv("SERVER_WORKER_INDEX")
+    if index is None:
+        return None
+    return {"index": int(index), "pid": os.getpid(), **memory_info()}
+
+def worker_cpus(index: int, threads: int) -> List[int]:
+    """The index-th block of `threads` cores among the ones this process may use"""
+    cpus = sorted(os.sched_getaffinity(0))
+    start = (index * threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(min(threads, len(cpus)))]
+
+class PreforkServer:
+    def __init__(self, host: str, port: int, workers: Optional[int] = None,
+                 threads_per_worker: Optional[int] = None, max_requests: Optional[int] = None,
+                 max_requests_jitter: Optional[int] = None, cpu_affinity: Optional[bool] = None,
+                 report_interval: Optional[float] = None):
+        cpu_count = len(os.sched_getaffinity(0))
+        self.host = host
+        self.port = port
+        self.workers = workers or int(os.getenv("SERVER_WORKERS", max(1, cpu_count // 2)))
+        # Split the cores instead of letting every worker start cpu_count threads
+        self.threads_per_worker = threads_per_worker or int(
+            os.getenv("SERVER_THREADS_PER_WORKER", max(1, cpu_count // self.workers))
+        )
+        self.max_requests = max_requests if max_requests is not None else int(os.getenv("SERVER_MAX_REQUESTS", 10000))
+        self.max_requests_jitter = (max_requests_jitter if max_requests_jitter is not None
+                                    else int(os.getenv("SERVER_MAX_REQUESTS_JITTER", self.max_requests // 10)))
+        self.cpu_affinity = (cpu_affinity if cpu_affinity is not None
+                             else os.getenv("SERVER_CPU_AFFINITY", "False").lower() == "true")
+        self.report_interval = report_interval or float(os.getenv("SERVER_REPORT_INTERVAL", 60))
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.peak_rss_mb: Dict[int, float] = {}  # worker index -> highest peak RSS seen
+        self.stopping = False
+        self.socket: Optional[socket.socket] = None
+
+    def preload_model(self) -> None:
+        """
+        Load what the workers share before forking
+        Only the PyTorch weights are loaded here, without warm-up: OpenMP and ONNX Runtime
+        thread pools do not survive fork, so inference first happens inside the workers.
+        """
+        import app.main  # the whole app is imported once, here, not in every worker
+        preload()
+        if model_registry.backend_name == "ultralytics":
+            started = time.perf_counter()
+            model = model_registry.get_model()
+            if model is not None:
+                print(f"Preloaded model in the parent in {time.perf_counter() - started:.2f}s")
+        # Objects that exist now are never collected; keeps GC from touching (and copying) shared pages
+        gc.collect()
+        gc.freeze()
+
+    def bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            return
+        try:
+            self.run_worker(index)
+            code = 0
+        except BaseException as e:
+            print(f"Worker {index} failed: {e}")
+            code = 1
+        # Never return into the parent's loop (and _exit skips the flush)
+        sys.stdout.flush()
+        os._exit(code)
+
+    def run_worker(self, index: int) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        random.seed()
+        startup_report.restart()
+
+        threads = self.threads_per_worker
+        os.environ["SERVER_WORKER_INDEX"] = str(index)
+        os.environ["TORCH_NUM_THREADS"] = str(threads)
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        if self.cpu_affinity:
+            cpus = worker_cpus(index, threads)
+            os.sched_setaffinity(0, cpus)
+            print(f"Worker {index} (pid {os.getpid()}) pinned to CPUs {cpus}")
+        set_torch_threads(threads)
+        try:
+            import cv2
+            cv2.setNumThreads(threads)
+        except ImportError:
+            pass
+
+        from app.main import app
+        from app.utils.executor import inference_executor
+        if inference_executor.mode == "process":
+            print("INFERENCE_EXECUTOR=process is ignored by the production server (workers are processes already)")
+            inference_executor.mode = "thread"
+        if "INFERENCE_THREADS" not in os.environ:
+            inference_executor.threads = threads
+
+        limit = None
+        if self.max_requests > 0:
+            # Jitter keeps the workers from all restarting at the same moment
+            limit = self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+        config = uvicorn.Config(
+            app, log_level=os.getenv("SERVER_LOG_LEVEL", "warning"), limit_max_requests=limit,
+            timeout_keep_alive=int(os.getenv("SERVER_KEEPALIVE", 5)),
+        )
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+    def handle_exit(self, pid: int, status: int, rusage) -> None:
+        index = self.children.pop(pid, None)
+        if index is None:
+            return
+        # ru_maxrss is the child's peak resident set, in kB on Linux
+        peak = round(rusage.ru_maxrss / 1024, 1)
+        self.peak_rss_mb[index] = max(peak, self.peak_rss_mb.get(index, 0))
+        code = os.waitstatus_to_exitcode(status)
+        print(f"Worker {index} (pid {pid}) exited with code {code}, peak RSS {peak} MB")
+        if not self.stopping:
+            if code != 0:
+                # Don't spin if workers crash straight away
+                time.sleep(1)
+            self.spawn(index)
+
+    def report(self) -> None:
+        lines = []
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            info = memory_info(pid)
+            if info["peak_rss_mb"] is not None:
+                self.peak_rss_mb[index] = max(info["peak_rss_mb"], self.peak_rss_mb.get(index, 0))
+            lines.append(f"  worker {index} pid {pid}: rss {info['rss_mb']} MB, "
+                         f"peak rss {info['peak_rss_mb']} MB, pss {info['pss_mb']} MB")
+        parent = memory_info()
+        print(f"Memory report (parent rss {parent['rss_mb']} MB, pss {parent['pss_mb']} MB, "
+              f"highest worker peak {max(self.peak_rss_mb.values(), default=0)} MB):")
+        print("\n".join(lines))
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve(self) -> None:
+        self.preload_model()
+        self.socket = self.bind()
+        print(f"Serving on {self.host}:{self.port} with {self.workers} workers x "
+              f"{self.threads_per_worker} threads (max requests {self.max_requests or 'unlimited'})")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for index in range(self.workers):
+            self.spawn(index)
+
+        next_report = time.monotonic() + self.report_interval
+        while self.children:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            if pid:
+                self.handle_exit(pid, status, rusage)
+                continue
+            if time.monotonic() >= next_report and not self.stopping:
+                self.report()
+                next_report = time.monotonic() + self.report_interval
+            time.sleep(0.2)
+
+        self.socket.close()
+        print(f"All workers stopped; peak RSS per worker: "
+              + ", ".join(f"{index}: {mb} MB" for index, mb in sorted(self.peak_rss_mb.items())))
+
+def serve(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    PreforkServer(
+        host or os.getenv("API_HOST", "0.0.0.0"),
+        port or int(os.getenv("API_PORT", 8000)),
+    ).serve()
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    serve()
+    sys.exit(0)
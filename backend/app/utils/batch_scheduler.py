@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.executor import inference_executor
+from app.utils.metrics import metrics
+
+QUEUE_WAIT = metrics.histogram(
+    "inference_queue_wait_seconds",
+    "Time a frame waited in the batching queue before its forward pass",
+)
+BATCH_SIZE = metrics.histogram(
+    "inference_batch_size",
+    "Number of frames per batched forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+BATCH_LATENCY = metrics.histogram(
+    "inference_batch_seconds",
+    "Wall time of one batched forward pass",
+)
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching in front of detect_food
+    Frames submitted by concurrent requests are collected for up to max_wait_ms
+    (or until max_batch_size frames are queued) and run in one forward pass
+
+    Batches run through the shared inference executor; infer_fn replaces the
+    detection call with a blocking callable run on the executor's thread pool
+
+    Up to max_in_flight batches run at once (BATCH_MAX_IN_FLIGHT, by default one per
+    detection worker), so every worker process stays busy. While all slots are taken,
+    new frames keep queueing and go out together in the next batch
+    """
+
+    def __init__(self, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 infer_fn: Optional[Callable[[List[np.ndarray]], List[List[Dict[str, Any]]]]] = None,
+                 max_in_flight: Optional[int] = None):
+        self.max_batch_size = max_batch_size or int(os.getenv("BATCH_MAX_SIZE", 8))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+        self.infer_fn = infer_fn
+        self.max_in_flight = max_in_flight or int(os.getenv("BATCH_MAX_IN_FLIGHT") or 0) or None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Batches currently running, so stop() can fail their callers
+        self._in_flight: Dict[asyncio.Task, List[tuple]] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.running and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight or inference_executor.detect_slots)
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        # Fail anything still in flight or queued so callers don't hang
+        pending = [item for batch in self._in_flight.values() for item in batch]
+        tasks = list(self._in_flight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Batch scheduler stopped"))
+
+    async def submit(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Queue one preprocessed frame and wait for its detections
+        """
+        if not self.running or self._loop is not asyncio.get_running_loop():
+            await self.start()
+
+        future = self._loop.create_future()
+        self._queue.put_nowait((frame, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[tuple]:
+        # Block for the first frame, then keep collecting until the batch is full or the window closes
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Wait for a free slot before collecting, so frames arriving while every
+            # worker is busy are batched together instead of queueing one batch each
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            # Callers that gave up (client disconnect) don't need a forward pass
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = self._loop.create_task(self._dispatch(batch))
+            self._in_flight[task] = batch
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._in_flight.pop(task, None)
+        self._slots.release()
+
+    async def _dispatch(self, batch: List[tuple]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            QUEUE_WAIT.observe(started - enqueued)
+        BATCH_SIZE.observe(len(batch))
+
+        frames = [frame for frame, _, _ in batch]
+        try:
+            if self.infer_fn is None:
+                results = await inference_executor.detect(frames)
+            else:
+                results = await inference_executor.run(self.infer_fn, frames)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            BATCH_LATENCY.observe(time.perf_counter() - started)
+
+        for (_, future, _), detections in zip(batch, results):
+            if not future.done():
+                future.set_result(detections)
+
+batch_scheduler = BatchScheduler()
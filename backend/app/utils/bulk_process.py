@@ -0,0 +1,386 @@
+"""
+Offline bulk processing of meal photo archives
+
+    python -m app.utils.bulk_process photos/ --output results.jsonl
+    python -m app.utils.bulk_process manifest.txt --output results/ --format parquet --workers 8
+    python -m app.utils.bulk_process photos/ --output results.jsonl --resume
+
+The input is a directory (walked recursively, in sorted order) or a manifest: a text file
+with one image path per line, or JSONL with a "path" field; relative paths are resolved
+against the manifest's folder. Images are decoded and letterboxed in a pool of --workers
+processes while the main process runs batched detection through the shared model
+(DETECTION_BACKEND, cascade and all) and the vectorized calorie engine.
+
+Results are written as they are produced: JSONL (one /api/predict-style object per image)
+or Parquet (a directory of part files, one per checkpoint; needs pyarrow). Every
+--checkpoint-every images the output is flushed and <output>.checkpoint.json records how far
+the run got (only rows whose write completed); --resume continues from there after a crash
+or Ctrl-C. Without a checkpoint, --resume refuses to touch an existing output unless
+--overwrite is given. Progress (images/s and ETA) is printed every --report-interval seconds.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.image_processor import IMAGE_EXTENSIONS, IngestedImage, ingest_image, scale_detections_to_original
+from app.utils.upload import UPLOAD_MAX_BYTES
+
+Decoded = Tuple[str, Optional[IngestedImage], Optional[str]]  # path, frame or None, error
+
+def list_inputs(source: str) -> List[str]:
+    """Image paths of a directory (recursive, sorted) or a manifest file, in processing order"""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            paths.extend(
+                os.path.join(root, name) for name in sorted(files)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        return paths
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            path = json.loads(line)["path"] if line.startswith('{') else line
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+def _init_decode_worker() -> None:
+    # Parallelism comes from the pool; one OpenCV thread per worker avoids oversubscription
+    import cv2
+    cv2.setNumThreads(1)
+
+def decode_image(path: str) -> Decoded:
+    try:
+        if os.path.getsize(path) > UPLOAD_MAX_BYTES:
+            return path, None, f"File is larger than {UPLOAD_MAX_BYTES} bytes"
+        with open(path, 'rb') as file:
+            return path, ingest_image(file.read()), None
+    except Exception as e:
+        return path, None, str(e)
+
+def decode_chunk(paths: List[str]) -> List[Decoded]:
+    return [decode_image(path) for path in paths]
+
+def decode_in_order(paths: List[str], workers: int, chunk_size: int) -> Iterator[List[Decoded]]:
+    """
+    Decoded chunks in input order, decoding ahead in a process pool
+    Only a few chunks per worker are in flight, so memory stays flat however fast
+    decoding is compared to inference.
+    """
+    chunks = (paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size))
+    if workers <= 0:
+        for chunk in chunks:
+            yield decode_chunk(chunk)
+        return
+
+    # spawn: the parent has already loaded the model, and forking its thread pools is unsafe
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_decode_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(decode_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def process_batch(decoded: List[Decoded], model_version: str, snapshot) -> List[Dict[str, Any]]:
+    """Batched detection and calorie calculation; one result row per input, in order"""
+    from app.utils.calorie_calculator import calculate_calories_many
+    from app.utils.food_detection import detect_food_batch
+
+    ok = [ingested for _, ingested, _ in decoded if ingested is not None]
+    detections = detect_food_batch([ingested.frame for ingested in ok]) if ok else []
+    meals = [
+        (scale_detections_to_original(frame_detections, ingested), ingested.width, ingested.height)
+        for ingested, frame_detections in zip(ok, detections)
+    ]
+    results = iter(calculate_calories_many(meals, snapshot))
+
+    rows = []
+    for path, ingested, error in decoded:
+        if ingested is None:
+            rows.append({"path": path, "success": False, "error": error})
+            continue
+        result = next(results)
+        rows.append({
+            "path": path,
+            "success": True,
+            "total_calories": result["total_calories"],
+            "total_macros": result["total_macros"],
+            "detected_foods": result["food_items"],
+            "image_info": {"width": ingested.width, "height": ingested.height, "format": ingested.format},
+            "model_version": model_version,
+            "nutrition_version": snapshot.version,
+        })
+    return rows
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        # (rows, bytes) of complete writes; one attribute, so an interrupt can't update half of it
+        self.written = (0, 0)
+
+    def restore(self, state: Optional[Dict[str, Any]], done: int) -> None:
+        # Anything written after the last checkpoint is cut off and produced again
+        if state is None:
+            open(self.path, 'wb').close()
+        else:
+            os.truncate(self.path, state["bytes"])
+        self.written = (done, state["bytes"] if state else 0)
+        self._file = open(self.path, 'ab')
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        data = b"".join(json.dumps(row).encode() + b"\n" for row in rows)
+        self._file.write(data)
+        self._file.flush()
+        self.written = (self.written[0] + len(rows), self.written[1] + len(data))
+
+    def commit(self) -> Tuple[int, Dict[str, Any]]:
+        """Rows done and writer state for the checkpoint; a torn write after them is cut off"""
+        done, size = self.written
+        self._file.flush()
+        os.ftruncate(self._file.fileno(), size)
+        os.fsync(self._file.fileno())
+        return done, {"bytes": size}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+class ParquetWriter:
+    """A directory of part files; each checkpoint writes the rows since the previous one as a part"""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.parts = 0
+        # (rows done, rows not yet in a part), replaced as a whole like JsonlWriter.written
+        self.written: Tuple[int, List[Dict[str, Any]]] = (0, [])
+
+    def _part_path(self, index: int) -> str:
+        return os.path.join(self.path, f"part-{index:05d}.parquet")
+
+    def restore(self, state: Optional[Dict[str, Any]], done: int) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = state["parts"] if state else 0
+        self.written = (done, [])
+        for name in os.listdir(self.path):
+            if name.startswith("part-") and name.endswith(".parquet") and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(self.path, name))
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        records = []
+        for row in rows:
+            info = row.get("image_info", {})
+            macros = row.get("total_macros", {})
+            foods = row.get("detected_foods")
+            records.append({
+                "path": row["path"], "success": row["success"], "error": row.get("error"),
+                "width": info.get("width"), "height": info.get("height"), "format": info.get("format"),
+                "total_calories": row.get("total_calories"),
+                "protein": macros.get("protein"), "carbs": macros.get("carbs"), "fat": macros.get("fat"),
+                "food_count": len(foods) if foods is not None else None,
+                # Nested items stay JSON so the schema does not depend on the food list
+                "detected_foods": json.dumps(foods) if foods is not None else None,
+                "model_version": row.get("model_version"), "nutrition_version": row.get("nutrition_version"),
+            })
+        done, pending = self.written
+        self.written = (done + len(rows), pending + records)
+
+    def commit(self) -> Tuple[int, Dict[str, Any]]:
+        done, pending = self.written
+        if pending:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Explicit types, so a part where a column is all null still matches the others
+            schema = pa.schema([
+                ("path", pa.string()), ("success", pa.bool_()), ("error", pa.string()),
+                ("width", pa.int32()), ("height", pa.int32()), ("format", pa.string()),
+                ("total_calories", pa.float64()), ("protein", pa.float64()), ("carbs", pa.float64()),
+                ("fat", pa.float64()), ("food_count", pa.int32()), ("detected_foods", pa.string()),
+                ("model_version", pa.string()), ("nutrition_version", pa.string()),
+            ])
+            table = pa.Table.from_pylist(pending, schema=schema)
+            # Written under a temporary name so a crash never leaves a half-written part
+            temporary = self._part_path(self.parts) + ".tmp"
+            pq.write_table(table, temporary)
+            os.replace(temporary, self._part_path(self.parts))
+            self.parts += 1
+            self.written = (done, [])
+        return done, {"parts": self.parts}
+
+    def close(self) -> None:
+        pass
+
+class Checkpoint:
+    def __init__(self, output: str):
+        self.path = output.rstrip("/\\") + ".checkpoint.json"
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def save(self, state: Dict[str, Any]) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.path)
+
+class Progress:
+    def __init__(self, total: int, done: int, interval: float):
+        self.total = total
+        self.start_done = done
+        self.done = done
+        self.errors = 0
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._next_report = self.started + interval
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (self.done - self.start_done) / elapsed if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        rate = self.rate()
+        eta = timedelta(seconds=round((self.total - self.done) / rate)) if rate > 0 else "?"
+        percent = 100 * self.done / self.total if self.total else 100.0
+        return (f"{self.done:,}/{self.total:,} images ({percent:.1f}%), {rate:.1f} images/s, "
+                f"ETA {eta}, {self.errors:,} errors")
+
+    def update(self, rows: List[Dict[str, Any]]) -> None:
+        self.done += len(rows)
+        self.errors += sum(1 for row in rows if not row["success"])
+        if self.interval > 0 and time.perf_counter() >= self._next_report:
+            print(self.line(), flush=True)
+            self._next_report = time.perf_counter() + self.interval
+
+def bulk_process(source: str, output: str, output_format: str = "jsonl", workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, checkpoint_every: int = 1000, resume: bool = False,
+                 overwrite: bool = False, report_interval: float = 10.0) -> Dict[str, Any]:
+    from app.utils.calorie_calculator import get_nutrition_snapshot
+    from app.utils.model_registry import model_registry
+
+    workers = workers if workers is not None else max(1, (os.cpu_count() or 1) - 1)
+    batch_size = batch_size or int(os.getenv("BATCH_MAX_SIZE", 8))
+    paths = list_inputs(source)
+
+    checkpoint = Checkpoint(output)
+    state = checkpoint.load() if resume else None
+    if resume and state is None and os.path.exists(output) and not overwrite:
+        # Starting over would throw the existing results away
+        raise SystemExit(f"No checkpoint at {checkpoint.path} to resume {output}; pass --overwrite to start over")
+    if resume and state is None:
+        print(f"No checkpoint at {checkpoint.path}, starting from the beginning")
+    elif not resume and not overwrite and os.path.exists(output):
+        raise SystemExit(f"{output} exists; pass --resume to continue it or --overwrite to start over")
+    done = 0
+    if state is not None:
+        done = state["done"]
+        if state["total"] != len(paths) or (done and paths[done - 1] != state["last_path"]):
+            raise SystemExit(f"Input changed since {checkpoint.path} was written; rerun without --resume")
+        print(f"Resuming after {done:,} of {len(paths):,} images")
+
+    writer = ParquetWriter(output) if output_format == "parquet" else JsonlWriter(output)
+    writer.restore(state["writer"] if state else None, done)
+
+    # Same model the server uses, loaded and warmed up once
+    model_registry.startup()
+    snapshot = get_nutrition_snapshot()
+    print(f"Processing {len(paths) - done:,} images with {workers} decode workers, batches of {batch_size}, "
+          f"model {model_registry.model_version}")
+
+    progress = Progress(len(paths), done, report_interval)
+    since_checkpoint = 0
+    waited = inference = 0.0
+
+    def save_checkpoint() -> None:
+        # Only rows whose write completed count, whatever the progress counter says
+        written, writer_state = writer.commit()
+        checkpoint.save({
+            "source": os.path.abspath(source), "total": len(paths), "done": written,
+            "last_path": paths[written - 1] if written else None, "writer": writer_state,
+        })
+
+    try:
+        chunks = decode_in_order(paths[done:], workers, batch_size)
+        while True:
+            started = time.perf_counter()
+            decoded = next(chunks, None)
+            waited += time.perf_counter() - started
+            if decoded is None:
+                break
+            started = time.perf_counter()
+            rows = process_batch(decoded, model_registry.model_version, snapshot)
+            inference += time.perf_counter() - started
+            writer.write(rows)
+            progress.update(rows)
+            since_checkpoint += len(rows)
+            if since_checkpoint >= checkpoint_every:
+                save_checkpoint()
+                since_checkpoint = 0
+    finally:
+        # Also on Ctrl-C: everything written so far is kept for --resume
+        save_checkpoint()
+        writer.close()
+
+    summary = {
+        "images": progress.done - progress.start_done,
+        "errors": progress.errors,
+        "images_per_second": round(progress.rate(), 2),
+        # Time spent waiting for decoded frames vs in detection + calories; if the wait
+        # dominates, more --workers help, otherwise the model is the bottleneck
+        "decode_wait_seconds": round(waited, 2),
+        "inference_seconds": round(inference, 2),
+    }
+    print(progress.line())
+    print(f"Done: {json.dumps(summary)}")
+    return summary
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run food detection and calorie estimation over an image archive")
+    parser.add_argument("source", help="image directory or manifest (.txt paths or .jsonl with \"path\")")
+    parser.add_argument("--output", required=True, help="results file (jsonl) or directory (parquet)")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--workers", type=int, help="decode processes (default: CPU count - 1; 0 decodes inline)")
+    parser.add_argument("--batch-size", type=int, help="images per forward pass (default: BATCH_MAX_SIZE)")
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.checkpoint.json")
+    parser.add_argument("--overwrite", action="store_true", help="start over even if the output exists")
+    args = parser.parse_args(argv)
+
+    try:
+        bulk_process(
+            args.source, args.output, args.format, workers=args.workers, batch_size=args.batch_size,
+            checkpoint_every=args.checkpoint_every, resume=args.resume, overwrite=args.overwrite,
+            report_interval=args.report_interval,
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; run again with --resume to continue")
+        return 130
+    return 0
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main())
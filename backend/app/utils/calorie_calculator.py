@@ -1,10 +1,19 @@
+import asyncio
 import csv
+import hashlib
+import json
 import os
-from typing import List, Dict, Any
+import threading
+import time
+import numpy as np
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple
+from app.utils.nutrition_engine import NutritionEngine
 
-def load_nutrition_database(csv_path: str) -> Dict[str, Dict[str, float]]:
+def load_nutrition_database(csv_path: str, strict: bool = False) -> Dict[str, Dict[str, float]]:
     """
     Load nutrition database from CSV file
+    With strict=True errors are raised instead of falling back to the built-in table
     """
     nutrition_db = {}
     try:
@@ -21,6 +30,8 @@ def load_nutrition_database(csv_path: str) -> Dict[str, Dict[str, float]]:
         print(f"Loaded {len(nutrition_db)} foods from nutrition database")
         return nutrition_db
     except (FileNotFoundError, KeyError, ValueError) as e:
+        if strict:
+            raise
         print(f"Error loading nutrition database: {e}")
         return get_default_nutrition_db()
 
@@ -72,162 +83,184 @@ def get_default_nutrition_db() -> Dict[str, Dict[str, float]]:
         "uthapam": {"calories": 120, "protein": 4, "carbs": 16, "fat": 4}
     }
 
-# Load nutrition database
 CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'nutrition_db.csv')
-NUTRITION_DB = load_nutrition_database(CSV_PATH)
 
-def estimate_portion_from_bbox(bbox: List[int], food_class: str, img_width: int = 640, img_height: int = 640) -> float:
+def compute_nutrition_version(nutrition_db: Dict[str, Dict[str, float]]) -> str:
     """
-    Estimate portion size using Team Member 2's portion estimation logic
-    Integrates with their FOOD_DATABASE and calculation methods
+    Short content hash of the nutrition table, used to key cached predictions
     """
-    try:
-        # Try to use Team Member 2's portion estimator
-        from app.utils.portion_estimator import calculate_grams_from_detection
-        
-        x1, y1, x2, y2 = bbox
-        bbox_area = (x2 - x1) * (y2 - y1)
-        
-        # Use Team Member 2's calculation method
-        result = calculate_grams_from_detection(
-            food_name=food_class,
-            confidence=0.8,  # Default confidence
-            bbox_area=bbox_area,
-            img_width=img_width,
-            img_height=img_height
-        )
-        
-        return result["estimated_grams"]
-        
-    except Exception as e:
-        print(f"Team Member 2's portion estimator not available, using fallback: {e}")
-        
-        # Fallback portion estimation
-        x1, y1, x2, y2 = bbox
-        area_pixels = (x2 - x1) * (y2 - y1)
+    payload = json.dumps(nutrition_db, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+class NutritionSnapshot:
+    """
+    Immutable view of the nutrition table plus its compiled engine
+    A request keeps the snapshot it started with even if a reload happens meanwhile
+    """
+    __slots__ = ("version", "sequence", "foods", "engine", "source", "loaded_at")
+
+    def __init__(self, foods: Dict[str, Dict[str, float]], sequence: int, source: str):
+        from app.utils.portion_estimator import FOOD_DATABASE
         
-        # Team Member 2's portion multipliers for all 43 foods
-        portion_multipliers = {
-            "appalam": 0.010,
-            "appam": 0.015,
-            "banana": 0.008,
-            "boiled egg": 0.012,
-            "butter milk": 0.025,
-            "channa masala": 0.020,
-            "chicken 65": 0.018,
-            "dosa": 0.025,
-            "gravy": 0.020,
-            "idiyappam": 0.016,
-            "idly": 0.008,
-            "kaara chutney": 0.015,
-            "kesari": 0.018,
-            "koozh": 0.020,
-            "kuruma": 0.020,
-            "masiyal": 0.018,
-            "medu vadai": 0.012,
-            "moor kolambu": 0.020,
-            "mushroom briyani": 0.030,
-            "paal kolukattai": 0.012,
-            "paneer briyani": 0.030,
-            "paniyaram": 0.015,
-            "parupu vadai": 0.012,
-            "payasam": 0.018,
-            "pickle": 0.008,
-            "pidi kolukattai": 0.012,
-            "podi": 0.005,
-            "pongal": 0.020,
-            "poori": 0.015,
-            "poorna kolukattai": 0.012,
-            "pulisatham": 0.020,
-            "puthina chutney": 0.015,
-            "raita": 0.018,
-            "rasam": 0.022,
-            "salad": 0.020,
-            "sambar": 0.020,
-            "satham": 0.020,
-            "soup": 0.025,
-            "tea": 0.030,
-            "thayir": 0.018,
-            "thengai chutney": 0.015,
-            "thovaiyal": 0.015,
-            "uthapam": 0.020
+        frozen = {name: MappingProxyType(dict(values)) for name, values in foods.items()}
+        self.foods = MappingProxyType(frozen)
+        self.version = compute_nutrition_version(foods)
+        self.sequence = sequence
+        self.engine = NutritionEngine(foods, FOOD_DATABASE, version=self.version)
+        self.source = source
+        self.loaded_at = time.time()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "sequence": self.sequence,
+            "foods": len(self.foods),
+            "source": self.source,
+            "loaded_at": self.loaded_at,
         }
-        
-        multiplier = portion_multipliers.get(food_class.lower(), 0.015)
-        estimated_grams = area_pixels * multiplier
-        
-        # Reasonable bounds
-        return max(10, min(estimated_grams, 500))
 
-def calculate_calories(detections: List[Dict[str, Any]]) -> Dict[str, Any]:
+class NutritionStore:
+    """
+    Holds the current NutritionSnapshot and swaps it atomically on reload
+    Readers never lock: they read one attribute. Writers build the new snapshot
+    first and serialize only the swap.
+    """
+
+    def __init__(self, csv_path: str = CSV_PATH):
+        self.csv_path = csv_path
+        self._current: Optional[NutritionSnapshot] = None
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._mtime: Optional[int] = None
+
+    def current(self) -> NutritionSnapshot:
+        snapshot = self._current
+        if snapshot is None:
+            with self._lock:
+                if self._current is None:
+                    self._mtime = self._stat_mtime()
+                    self._swap(load_nutrition_database(self.csv_path), "csv")
+                snapshot = self._current
+        return snapshot
+
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.csv_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _swap(self, foods: Dict[str, Dict[str, float]], source: str) -> NutritionSnapshot:
+        self._sequence += 1
+        snapshot = NutritionSnapshot(foods, self._sequence, source)
+        self._current = snapshot
+        return snapshot
+
+    def reload(self) -> NutritionSnapshot:
+        """
+        Re-read the CSV into a new snapshot; on a bad file the current snapshot is kept
+        """
+        mtime = self._stat_mtime()
+        foods = load_nutrition_database(self.csv_path, strict=True)
+        with self._lock:
+            self._mtime = mtime
+            snapshot = self._swap(foods, "csv")
+        print(f"Nutrition database reloaded: version {snapshot.version} ({len(foods)} foods)")
+        return snapshot
+
+    def update(self, new_data: Dict[str, Dict[str, float]]) -> NutritionSnapshot:
+        """Copy-on-write merge of new food items into a new snapshot"""
+        with self._lock:
+            base = self._current.foods if self._current is not None else load_nutrition_database(self.csv_path)
+            foods = {name: dict(values) for name, values in base.items()}
+            foods.update(new_data)
+            return self._swap(foods, "update")
+
+    def file_changed(self) -> bool:
+        return self._stat_mtime() != self._mtime
+
+    async def watch(self, interval: float) -> None:
+        """Poll the CSV's mtime and reload in a worker thread when it changes"""
+        loop = asyncio.get_running_loop()
+        # Make sure there is a baseline snapshot (and mtime) to compare against
+        await loop.run_in_executor(None, self.current)
+        while True:
+            await asyncio.sleep(interval)
+            if not self.file_changed():
+                continue
+            try:
+                await loop.run_in_executor(None, self.reload)
+            except Exception as e:
+                # Keep serving the current snapshot; retry only after the next edit
+                self._mtime = self._stat_mtime()
+                print(f"Nutrition database reload failed, keeping version {self.current().version}: {e}")
+
+nutrition_store = NutritionStore()
+
+def get_nutrition_snapshot() -> NutritionSnapshot:
+    """
+    Snapshot to use for one prediction
+    """
+    return nutrition_store.current()
+
+def get_nutrition_engine(snapshot: Optional[NutritionSnapshot] = None) -> NutritionEngine:
+    """
+    Compiled nutrition/portion tables for the given (default: current) snapshot
+    """
+    return (snapshot or nutrition_store.current()).engine
+
+def __getattr__(name: str):
+    # NUTRITION_DB / NUTRITION_VERSION always reflect the current snapshot
+    if name == "NUTRITION_DB":
+        return nutrition_store.current().foods
+    if name == "NUTRITION_VERSION":
+        return nutrition_store.current().version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def estimate_portion_from_bbox(bbox: List[int], food_class: str, img_width: int = 640, img_height: int = 640,
+                               confidence: float = 0.8) -> float:
+    """
+    Estimate portion size using Team Member 2's portion estimation logic
+    (FOOD_DATABASE base weight x size category x confidence), via the shared engine
+    """
+    engine = get_nutrition_engine()
+    class_ids = np.array([engine.lookup_id(food_class)])
+    boxes = np.array([bbox], dtype=np.float64)
+    grams, _ = engine.compute(class_ids, np.array([confidence]), boxes, np.array([img_width * img_height]))
+    return float(grams[0])
+
+def calculate_calories(detections: List[Dict[str, Any]], img_width: int = 640, img_height: int = 640,
+                       snapshot: Optional[NutritionSnapshot] = None) -> Dict[str, Any]:
 
    # Calculating total calories and macros from detected foods
+   # All detections go through the vectorized engine in one pass
     
-    total_calories = 0
-    total_protein = 0
-    total_carbs = 0
-    total_fat = 0
-    food_items = []
-    
-    for detection in detections:
-        food_class = detection["class_name"]
-        bbox = detection["bbox"]
-        confidence = detection["confidence"]
-        
-        # This line is now handled above
-        # portion_grams already calculated
-        
-        # Estimate portion size with image dimensions
-        portion_grams = estimate_portion_from_bbox(bbox, food_class, 640, 640)
-        
-        # Get nutrition info
-        nutrition = get_nutrition_for_food(food_class)
-        
-        # Calculate calories and macros for this portion
-        calories = (nutrition["calories"] * portion_grams) / 100
-        protein = (nutrition["protein"] * portion_grams) / 100
-        carbs = (nutrition["carbs"] * portion_grams) / 100
-        fat = (nutrition["fat"] * portion_grams) / 100
-        
-        # Add to totals
-        total_calories += calories
-        total_protein += protein
-        total_carbs += carbs
-        total_fat += fat
-        
-        # Store individual food item data
-        food_items.append({
-            "food_name": food_class,
-            "portion_grams": round(portion_grams, 1),
-            "calories": round(calories, 1),
-            "protein": round(protein, 1),
-            "carbs": round(carbs, 1),
-            "fat": round(fat, 1),
-            "confidence": round(confidence, 2),
-            "bbox": bbox
-        })
+    return get_nutrition_engine(snapshot).calculate_meals([(detections, img_width, img_height)])[0]
+
+def calculate_calories_many(meals: List[Tuple[List[Dict[str, Any]], int, int]],
+                            snapshot: Optional[NutritionSnapshot] = None) -> List[Dict[str, Any]]:
+
+   # calculate_calories for many (detections, img_width, img_height) meals at once
     
-    return {
-        "total_calories": round(total_calories, 1),
-        "total_macros": {
-            "protein": round(total_protein, 1),
-            "carbs": round(total_carbs, 1),
-            "fat": round(total_fat, 1)
-        },
-        "food_items": food_items
-    }
+    return get_nutrition_engine(snapshot).calculate_meals(meals)
+
+def get_nutrition_version() -> str:
+    """
+    Version of the nutrition table currently in use
+    """
+    return nutrition_store.current().version
 
-def get_nutrition_for_food(food_name: str) -> Dict[str, float]:
+def get_nutrition_for_food(food_name: str, snapshot: Optional[NutritionSnapshot] = None) -> Dict[str, float]:
     """
     Get nutrition information for a specific food item
     """
+    foods = (snapshot or nutrition_store.current()).foods
     food_key = food_name.lower().strip()
-    return NUTRITION_DB.get(food_key, NUTRITION_DB.get("rice", {"calories": 130, "protein": 2.7, "carbs": 28, "fat": 0.3}))
+    return dict(foods.get(food_key, foods.get("rice", {"calories": 130, "protein": 2.7, "carbs": 28, "fat": 0.3})))
 
 def update_nutrition_database(new_data: Dict[str, Dict[str, float]]) -> None:
     """
     Update nutrition database with new food items
+    Publishes a new snapshot; requests already running keep the previous one
     """
-    global NUTRITION_DB
-    NUTRITION_DB.update(new_data)
-    print(f"Updated nutrition database with {len(new_data)} new items")
+    snapshot = nutrition_store.update(new_data)
+    print(f"Updated nutrition database with {len(new_data)} new items (version {snapshot.version})")
@@ -0,0 +1,186 @@
+"""
+Confidence-driven detection cascade
+
+With CASCADE_ENABLED every frame first goes through a cheap pass: the same model at a
+smaller CASCADE_IMGSZ, or a smaller model from CASCADE_MODEL_PATH. Frames whose first-pass
+result looks unreliable are escalated to the full model:
+
+    empty            nothing detected (CASCADE_ESCALATE_EMPTY)
+    low_confidence   a detection below CASCADE_MIN_CONFIDENCE
+    overlap          two boxes overlapping by more than CASCADE_MAX_OVERLAP IoU
+    crowded          more than CASCADE_MAX_ITEMS detections (a full thali)
+
+A static ONNX/OpenVINO graph only runs at its export size, so without CASCADE_MODEL_PATH
+its first pass would cost as much as the full one; the cascade then turns itself off.
+
+Escalation counts and the time spent in each pass are exported on /metrics; info()
+turns them into the escalation rate and the estimated inference time saved.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.detection_backends import DetectionBackend, UltralyticsBackend, load_backend
+from app.utils.metrics import metrics
+from app.utils.model_registry import detection_threads, model_registry
+
+ESCALATION_REASONS = ("empty", "low_confidence", "overlap", "crowded")
+
+CASCADE_FRAMES = metrics.counter(
+    "cascade_frames_total", "Frames that went through the cascade's first pass"
+)
+CASCADE_ESCALATIONS = metrics.counter(
+    "cascade_escalations_total", "Frames escalated from the first pass to the full model",
+    labelnames=("reason",),
+)
+CASCADE_SECONDS = metrics.counter(
+    "cascade_pass_seconds_total", "Inference time spent in each cascade pass",
+    labelnames=("stage",),
+)
+
+def max_pairwise_iou(boxes: List[List[int]]) -> float:
+    if len(boxes) < 2:
+        return 0.0
+    boxes = np.array(boxes, dtype=np.float32)
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    iou = intersection / (areas[:, None] + areas[None, :] - intersection + 1e-9)
+    np.fill_diagonal(iou, 0)
+    return float(iou.max())
+
+class Cascade:
+    def __init__(self, enabled: Optional[bool] = None, imgsz: Optional[int] = None,
+                 model_path: Optional[str] = None, min_confidence: Optional[float] = None,
+                 max_overlap: Optional[float] = None, max_items: Optional[int] = None,
+                 escalate_empty: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("CASCADE_ENABLED", "False").lower() == "true"
+        self.imgsz = imgsz or int(os.getenv("CASCADE_IMGSZ", 320))
+        self.model_path = model_path if model_path is not None else os.getenv("CASCADE_MODEL_PATH", "")
+        self.min_confidence = min_confidence if min_confidence is not None else float(os.getenv("CASCADE_MIN_CONFIDENCE", 0.5))
+        self.max_overlap = max_overlap if max_overlap is not None else float(os.getenv("CASCADE_MAX_OVERLAP", 0.5))
+        self.max_items = max_items or int(os.getenv("CASCADE_MAX_ITEMS", 3))
+        self.escalate_empty = (escalate_empty if escalate_empty is not None
+                               else os.getenv("CASCADE_ESCALATE_EMPTY", "True").lower() == "true")
+        self._first_pass: Optional[DetectionBackend] = None
+        self._first_pass_loaded = False
+        self._lock = threading.Lock()
+
+    def escalation_reason(self, detections: List[Dict[str, Any]]) -> Optional[str]:
+        """Why a first-pass result should go to the full model, or None to accept it"""
+        if not detections:
+            return "empty" if self.escalate_empty else None
+        if min(detection["confidence"] for detection in detections) < self.min_confidence:
+            return "low_confidence"
+        if len(detections) > self.max_items:
+            return "crowded"
+        if max_pairwise_iou([detection["bbox"] for detection in detections]) > self.max_overlap:
+            return "overlap"
+        return None
+
+    def first_pass_backend(self, full: DetectionBackend) -> Optional[DetectionBackend]:
+        """
+        The small model from CASCADE_MODEL_PATH, or the full model (run at CASCADE_IMGSZ)
+        None when the only candidate is a full model that cannot run smaller
+        """
+        first = full
+        if self.model_path:
+            if not self._first_pass_loaded:
+                with self._lock:
+                    if not self._first_pass_loaded:
+                        self._first_pass = self._load_first_pass()
+                        self._first_pass_loaded = True
+            first = self._first_pass or full
+        if first is full and not full.dynamic_size:
+            self._disable_for_static_graph(full)
+            return None
+        return first
+
+    def _disable_for_static_graph(self, full: DetectionBackend) -> None:
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+        size = getattr(full, "input_size", None)
+        print(f"Warning: the {full.name} model has a static {size}px input, so a first pass at "
+              f"CASCADE_IMGSZ={self.imgsz} would cost a full pass; cascade disabled. "
+              f"Set CASCADE_MODEL_PATH to a smaller model to use the cascade")
+
+    def _load_first_pass(self) -> Optional[DetectionBackend]:
+        path = os.path.abspath(self.model_path)
+        if not os.path.exists(path):
+            print(f"Cascade model not found at {path}, first pass uses the full model")
+            return None
+        try:
+            if model_registry.backend_name == "ultralytics":
+                model = model_registry.get_model(path)
+                return UltralyticsBackend(model) if model is not None else None
+            backend = load_backend(model_registry.backend_name, path, detection_threads())
+            print(f"Loaded cascade {model_registry.backend_name} model from {path}")
+            return backend
+        except Exception as e:
+            print(f"Error loading cascade model, first pass uses the full model: {e}")
+            return None
+
+    def detect(self, frames: List[np.ndarray], full: DetectionBackend, conf: float = 0.25) -> List[List[Dict[str, Any]]]:
+        first = self.first_pass_backend(full)
+        if first is None:
+            return full.detect(frames, conf=conf)
+
+        started = time.perf_counter()
+        results = first.detect(frames, conf=conf, imgsz=self.imgsz)
+        CASCADE_SECONDS.inc(time.perf_counter() - started, stage="first")
+        CASCADE_FRAMES.inc(len(frames))
+
+        escalate = []
+        for index, detections in enumerate(results):
+            reason = self.escalation_reason(detections)
+            if reason is not None:
+                CASCADE_ESCALATIONS.inc(reason=reason)
+                escalate.append(index)
+
+        if escalate:
+            # Escalated frames of a micro-batch still go through the full model together
+            started = time.perf_counter()
+            escalated = full.detect([frames[index] for index in escalate], conf=conf)
+            CASCADE_SECONDS.inc(time.perf_counter() - started, stage="full")
+            for index, detections in zip(escalate, escalated):
+                results[index] = detections
+        return results
+
+    def warmup(self, full: DetectionBackend, runs: int) -> None:
+        first = self.first_pass_backend(full)
+        if first is not None:
+            first.warmup(runs, self.imgsz)
+
+    def info(self) -> Dict[str, Any]:
+        frames = CASCADE_FRAMES.value()
+        escalations = {reason: CASCADE_ESCALATIONS.value(reason=reason) for reason in ESCALATION_REASONS}
+        escalated = sum(escalations.values())
+        first_seconds = CASCADE_SECONDS.value(stage="first")
+        full_seconds = CASCADE_SECONDS.value(stage="full")
+
+        # Without the cascade every frame would have cost what an escalated frame cost
+        # in the full pass; only an estimate, since batch sizes differ between the passes
+        saved = None
+        if escalated:
+            saved = round(frames * full_seconds / escalated - (first_seconds + full_seconds), 3)
+        return {
+            "enabled": self.enabled,
+            "imgsz": self.imgsz,
+            "model_path": self.model_path or None,
+            "frames": int(frames),
+            "escalation_rate": round(escalated / frames, 4) if frames else None,
+            "escalations": {reason: int(count) for reason, count in escalations.items()},
+            "first_pass_seconds": round(first_seconds, 3),
+            "full_pass_seconds": round(full_seconds, 3),
+            "estimated_saved_seconds": saved,
+        }
+
+cascade = Cascade()
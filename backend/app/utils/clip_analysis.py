@@ -0,0 +1,328 @@
+"""
+Meal analysis for short videos and photo bursts
+
+A pan across the table shows the same dishes in many frames. Frames are kept by how much
+the scene changed rather than by frame count, detected together, and linked into tracks,
+so each dish is counted once:
+
+1. Sampling: every frame is reduced to a small grey thumbnail and compared with the last
+   kept frame. The camera shift between them is estimated by phase correlation; the frame
+   is kept when the new part of the scene is at least CLIP_MIN_NEW_AREA of the frame, or
+   when the difference left after aligning for the shift is above CLIP_CHANGE_THRESHOLD.
+   Videos are scanned at up to CLIP_SCAN_FPS; at most CLIP_MAX_FRAMES frames are kept.
+2. Detection: the kept frames go through the batch scheduler at once.
+3. Tracking: detections are matched to tracks by IoU (CLIP_TRACK_IOU) after moving the
+   tracks by the camera shift; a track ends after CLIP_TRACK_MAX_MISSES kept frames
+   without a match.
+4. Each track's most confident detection is one portion, and all portions go through
+   calculate_calories together.
+"""
+import asyncio
+import os
+import tempfile
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.utils.batch_scheduler import batch_scheduler
+from app.utils.calorie_calculator import calculate_calories, get_nutrition_snapshot
+from app.utils.executor import inference_executor
+from app.utils.image_processor import IngestedImage, ingest_image, ingest_rgb, scale_detections_to_original
+from app.utils.metrics import metrics
+from app.utils.model_registry import model_registry
+from app.utils.timing import set_timing_labels, timed_stage
+from app.utils.upload import reject
+
+CLIP_MIN_NEW_AREA = float(os.getenv("CLIP_MIN_NEW_AREA", 0.25))
+CLIP_CHANGE_THRESHOLD = float(os.getenv("CLIP_CHANGE_THRESHOLD", 0.08))
+CLIP_MAX_FRAMES = int(os.getenv("CLIP_MAX_FRAMES", 32))
+CLIP_MAX_INPUT_FRAMES = int(os.getenv("CLIP_MAX_INPUT_FRAMES", 1800))
+CLIP_SCAN_FPS = float(os.getenv("CLIP_SCAN_FPS", 10))
+CLIP_TRACK_IOU = float(os.getenv("CLIP_TRACK_IOU", 0.3))
+CLIP_TRACK_MAX_MISSES = int(os.getenv("CLIP_TRACK_MAX_MISSES", 2))
+CLIP_MIN_TRACK_HITS = int(os.getenv("CLIP_MIN_TRACK_HITS", 1))
+
+THUMBNAIL_SIZE = (128, 96)
+# Below this phase-correlation response the shift estimate is noise (e.g. a cut)
+MIN_SHIFT_RESPONSE = 0.1
+
+CLIP_FRAMES = metrics.counter(
+    "clip_frames_total", "Frames of uploaded clips, by whether they were analyzed or skipped",
+    labelnames=("outcome",),
+)
+
+def thumbnail(bgr: np.ndarray) -> np.ndarray:
+    """Small blurred grey float32 copy of a BGR frame, for change detection"""
+    import cv2
+    small = cv2.resize(bgr, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    grey = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    return cv2.GaussianBlur(grey, (3, 3), 0)
+
+def camera_shift(previous: np.ndarray, current: np.ndarray) -> Tuple[float, float]:
+    """
+    Where content of `previous` moved to in `current`, as a fraction of the frame
+    (positive dx: content moved right, i.e. the camera panned left)
+    """
+    import cv2
+    window = cv2.createHanningWindow(THUMBNAIL_SIZE, cv2.CV_32F)
+    # phaseCorrelate applies the window to its inputs in place, so it gets copies
+    (dx, dy), response = cv2.phaseCorrelate(previous.copy(), current.copy(), window)
+    if response < MIN_SHIFT_RESPONSE:
+        return 0.0, 0.0
+    return dx / THUMBNAIL_SIZE[0], dy / THUMBNAIL_SIZE[1]
+
+def aligned_difference(previous: np.ndarray, current: np.ndarray, shift: Tuple[float, float]) -> float:
+    """Mean absolute difference (0..1) of the overlapping parts once the shift is undone"""
+    height, width = previous.shape
+    dx = int(round(shift[0] * width))
+    dy = int(round(shift[1] * height))
+    if abs(dx) >= width or abs(dy) >= height:
+        return 1.0
+    before = previous[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    after = current[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return float(np.abs(before - after).mean()) / 255.0
+
+class FrameSampler:
+    """Decides which frames of a clip are worth running detection on"""
+
+    def __init__(self, min_new_area: Optional[float] = None, change_threshold: Optional[float] = None,
+                 max_frames: Optional[int] = None):
+        self.min_new_area = min_new_area if min_new_area is not None else CLIP_MIN_NEW_AREA
+        self.change_threshold = change_threshold if change_threshold is not None else CLIP_CHANGE_THRESHOLD
+        self.max_frames = max_frames or CLIP_MAX_FRAMES
+        self.seen = 0
+        self.kept = 0
+        self.truncated = False
+        self._last: Optional[np.ndarray] = None
+
+    def consider(self, thumb: np.ndarray) -> Optional[Tuple[float, float]]:
+        """Camera shift since the last kept frame when this frame should be kept, else None"""
+        self.seen += 1
+        if self._last is None:
+            shift = (0.0, 0.0)
+        else:
+            shift = camera_shift(self._last, thumb)
+            new_area = 1 - (1 - min(abs(shift[0]), 1)) * (1 - min(abs(shift[1]), 1))
+            if (new_area < self.min_new_area
+                    and aligned_difference(self._last, thumb, shift) < self.change_threshold):
+                return None
+            if self.kept >= self.max_frames:
+                self.truncated = True
+                return None
+        self._last = thumb
+        self.kept += 1
+        return shift
+
+class SampledFrame(NamedTuple):
+    index: int                   # position in the clip
+    ingested: IngestedImage
+    shift: Tuple[float, float]   # camera shift since the previous sampled frame
+
+class SampledClip(NamedTuple):
+    frames: List[SampledFrame]
+    frames_received: int
+    truncated: bool
+    source: str
+    input_frame_limit: Optional[int] = None   # CLIP_MAX_INPUT_FRAMES, when the video went past it
+
+def sample_video(path: str, sampler: Optional[FrameSampler] = None) -> SampledClip:
+    """Decode a video file, keeping only the frames the sampler asks for"""
+    import cv2
+    sampler = sampler or FrameSampler()
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise reject("malformed", "Could not open video")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0
+        # Frames skipped by the scan rate are only grabbed, never converted
+        stride = max(1, int(round(fps / CLIP_SCAN_FPS))) if fps > 0 and CLIP_SCAN_FPS > 0 else 1
+        frames = []
+        index = 0
+        while index < CLIP_MAX_INPUT_FRAMES and capture.grab():
+            if index % stride == 0:
+                ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+                shift = sampler.consider(thumbnail(bgr))
+                if shift is not None:
+                    ingested = ingest_rgb(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), "VIDEO")
+                    frames.append(SampledFrame(index, ingested, shift))
+            index += 1
+        # Frames past the cap are never read; one more grab tells whether there were any
+        capped = index >= CLIP_MAX_INPUT_FRAMES and capture.grab()
+    finally:
+        capture.release()
+    if not frames:
+        raise reject("malformed", "Video has no readable frames")
+    if capped:
+        return SampledClip(frames, index, True, "video", CLIP_MAX_INPUT_FRAMES)
+    return SampledClip(frames, index, sampler.truncated, "video")
+
+def sample_video_bytes(data: bytes, suffix: str = ".mp4") -> SampledClip:
+    # OpenCV only reads videos from a path
+    with tempfile.NamedTemporaryFile(suffix=suffix) as file:
+        file.write(data)
+        file.flush()
+        return sample_video(file.name)
+
+def sample_burst(images: List[bytes], sampler: Optional[FrameSampler] = None) -> SampledClip:
+    """Decode a burst of photos (in shooting order), keeping only the ones that add something"""
+    sampler = sampler or FrameSampler()
+    frames = []
+    for index, data in enumerate(images):
+        ingested = ingest_image(data)
+        # Thumbnail of the picture itself, without the letterbox padding
+        content = ingested.frame[ingested.pad_y:ingested.frame.shape[0] - ingested.pad_y,
+                                 ingested.pad_x:ingested.frame.shape[1] - ingested.pad_x]
+        shift = sampler.consider(thumbnail(content))
+        if shift is not None:
+            frames.append(SampledFrame(index, ingested, shift))
+    return SampledClip(frames, len(images), sampler.truncated, "burst")
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return float(intersection / union) if union > 0 else 0.0
+
+class Track:
+    def __init__(self, track_id: int, box: np.ndarray, detection: Dict[str, Any], frame: int):
+        self.track_id = track_id
+        self.box = box                 # normalized to the frame size, moved with the camera
+        self.best = detection
+        self.best_frame = frame
+        self.frames = [frame]
+        self.misses = 0
+        self.class_votes: Dict[str, float] = defaultdict(float)
+        self.class_votes[detection["class_name"]] += detection["confidence"]
+
+    def add(self, box: np.ndarray, detection: Dict[str, Any], frame: int) -> None:
+        self.box = box
+        self.frames.append(frame)
+        self.misses = 0
+        self.class_votes[detection["class_name"]] += detection["confidence"]
+        if detection["confidence"] > self.best["confidence"]:
+            self.best = detection
+            self.best_frame = frame
+
+    @property
+    def class_name(self) -> str:
+        # The detector may flip between similar dishes; the confidence-weighted vote wins
+        return max(self.class_votes.items(), key=lambda item: item[1])[0]
+
+class IoUTracker:
+    """
+    Greedy IoU tracker across sampled frames
+    Class-agnostic matching, so a dish the detector labels differently in two frames
+    still stays one track.
+    """
+
+    def __init__(self, iou_threshold: Optional[float] = None, max_misses: Optional[int] = None):
+        self.iou_threshold = iou_threshold if iou_threshold is not None else CLIP_TRACK_IOU
+        self.max_misses = max_misses if max_misses is not None else CLIP_TRACK_MAX_MISSES
+        self.active: List[Track] = []
+        self.finished: List[Track] = []
+        self._next_id = 0
+
+    def update(self, frame: int, detections: List[Dict[str, Any]], size: Tuple[int, int],
+               shift: Tuple[float, float] = (0.0, 0.0)) -> None:
+        width, height = size
+        offset = np.array([shift[0], shift[1], shift[0], shift[1]])
+        for track in self.active:
+            track.box = track.box + offset
+
+        boxes = [np.array(d["bbox"], dtype=np.float64) / (width, height, width, height) for d in detections]
+        pairs = sorted(
+            ((box_iou(track.box, box), t, d) for t, track in enumerate(self.active) for d, box in enumerate(boxes)),
+            key=lambda pair: -pair[0],
+        )
+        matched_tracks, matched_detections = set(), set()
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            self.active[t].add(boxes[d], detections[d], frame)
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+        still_active = []
+        for t, track in enumerate(self.active):
+            if t not in matched_tracks:
+                track.misses += 1
+            if track.misses > self.max_misses:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        for d, box in enumerate(boxes):
+            if d not in matched_detections:
+                still_active.append(Track(self._next_id, box, detections[d], frame))
+                self._next_id += 1
+        self.active = still_active
+
+    def tracks(self, min_hits: Optional[int] = None) -> List[Track]:
+        min_hits = min_hits if min_hits is not None else CLIP_MIN_TRACK_HITS
+        tracks = self.finished + self.active
+        return sorted((track for track in tracks if len(track.frames) >= min_hits), key=lambda track: track.track_id)
+
+def summarize_tracks(tracks: List[Track], clip: SampledClip, snapshot) -> Dict[str, Any]:
+    """One portion per track, in the coordinates of the first sampled frame"""
+    reference = clip.frames[0].ingested
+    by_index = {frame.index: frame.ingested for frame in clip.frames}
+    portions = []
+    for track in tracks:
+        frame = by_index[track.best_frame]
+        # Photos of a burst may differ in size; boxes are rescaled to the reference frame
+        sx, sy = reference.width / frame.width, reference.height / frame.height
+        x1, y1, x2, y2 = track.best["bbox"]
+        portions.append({
+            **track.best,
+            "class_name": track.class_name,
+            "bbox": [int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)],
+        })
+    results = calculate_calories(portions, reference.width, reference.height, snapshot)
+
+    foods = []
+    for item, track in zip(results["food_items"], tracks):
+        foods.append({**item, "track_id": track.track_id, "frames": track.frames, "best_frame": track.best_frame})
+    return {
+        "success": True,
+        "total_calories": results["total_calories"],
+        "total_macros": results["total_macros"],
+        "detected_foods": foods,
+        "image_info": {"width": reference.width, "height": reference.height, "format": reference.format},
+        "clip_info": {
+            "source": clip.source,
+            "frames_received": clip.frames_received,
+            "frames_analyzed": len(clip.frames),
+            "analyzed_frames": [frame.index for frame in clip.frames],
+            "truncated": clip.truncated,
+            "input_frame_limit": clip.input_frame_limit,
+            "unique_dishes": len(tracks),
+        },
+        "nutrition_version": snapshot.version,
+    }
+
+async def analyze_clip(clip: SampledClip) -> Dict[str, Any]:
+    """Batched detection on the sampled frames, tracking, and one calorie calculation"""
+    snapshot = get_nutrition_snapshot()
+    CLIP_FRAMES.inc(len(clip.frames), outcome="analyzed")
+    CLIP_FRAMES.inc(clip.frames_received - len(clip.frames), outcome="skipped")
+    reference = clip.frames[0].ingested
+    set_timing_labels(model_registry.model_version, reference.width, reference.height)
+
+    # Submitted together so the scheduler runs them in as few forward passes as possible
+    with timed_stage("inference"):
+        detections = await asyncio.gather(*(batch_scheduler.submit(frame.ingested.frame) for frame in clip.frames))
+
+    with timed_stage("tracking"):
+        tracker = IoUTracker()
+        for frame, frame_detections in zip(clip.frames, detections):
+            frame_detections = scale_detections_to_original(frame_detections, frame.ingested)
+            tracker.update(frame.index, frame_detections, (frame.ingested.width, frame.ingested.height), frame.shift)
+        tracks = tracker.tracks()
+
+    with timed_stage("nutrition"):
+        return await inference_executor.run(summarize_tracks, tracks, clip, snapshot)
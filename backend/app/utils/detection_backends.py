@@ -0,0 +1,329 @@
+"""
+Detection backends: the runtimes that can run the food detection model
+
+    ultralytics   food_detection.pt through ultralytics/PyTorch (default)
+    onnx          food_detection.onnx through ONNX Runtime (CPU)
+    openvino      food_detection_openvino_model/ through OpenVINO (CPU)
+
+Chosen with DETECTION_BACKEND. The ONNX and OpenVINO files are produced from the .pt
+weights by `python -m app.utils.export_model`. Those runtimes return the raw YOLO output
+tensor, so they share the NMS and box decoding in postprocess_yolo().
+"""
+import ast
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.nutrition_engine import load_class_names
+
+BACKENDS = ("ultralytics", "onnx", "openvino")
+LETTERBOX_COLOR = 114
+# Boxes of different classes are shifted this far apart so one NMS pass is class-aware
+# (same trick and value as ultralytics)
+MAX_WH = 7680
+
+def parse_yolo_result(result) -> List[Dict[str, Any]]:
+    """
+    Convert one ultralytics result into detection dicts
+    """
+    detections = []
+    for i in range(len(result.boxes)):
+        detection_box = result.boxes[i]
+        class_id = int(detection_box.cls.item())
+        food_name = result.names[class_id]
+        confidence = detection_box.conf.item()
+
+        # Get bounding box coordinates
+        x1, y1, x2, y2 = detection_box.xyxy[0]
+        bbox = [int(x1), int(y1), int(x2), int(y2)]
+
+        detections.append({
+            "class_id": class_id,
+            "class_name": food_name,
+            "confidence": confidence,
+            "bbox": bbox,
+            "area_pixels": float((x2 - x1) * (y2 - y1))
+        })
+
+    return detections
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Greedy non-maximum suppression on xyxy boxes; returns kept indices, best score first
+    """
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        x1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def postprocess_yolo(output: np.ndarray, names: Sequence[str], conf: float = 0.25, iou: float = 0.7,
+                     max_det: int = 300, image_size: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Raw YOLOv8 head output (batch, 4 + classes, anchors) -> detection dicts per image
+    Boxes are cx, cy, w, h in input pixels; scores are per-class probabilities.
+    Kept boxes are clipped to image_size like ultralytics does after NMS.
+    """
+    results = []
+    for prediction in output:
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        mask = confidences > conf
+        if not mask.any():
+            results.append([])
+            continue
+
+        cx, cy, w, h = prediction[mask, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        class_ids, confidences = class_ids[mask], confidences[mask]
+        keep = nms(boxes + (class_ids * MAX_WH)[:, None], confidences, iou)[:max_det]
+        if image_size is not None:
+            boxes = np.clip(boxes, 0, image_size)
+
+        detections = []
+        for index in keep:
+            x1, y1, x2, y2 = (float(value) for value in boxes[index])
+            class_id = int(class_ids[index])
+            detections.append({
+                "class_id": class_id,
+                "class_name": names[class_id] if class_id < len(names) else str(class_id),
+                "confidence": float(confidences[index]),
+                "bbox": [int(x1), int(y1), int(x2), int(y2)],
+                "area_pixels": float((x2 - x1) * (y2 - y1)),
+            })
+        results.append(detections)
+    return results
+
+def fit_frame(frame: np.ndarray, size: int) -> Tuple[np.ndarray, float, int, int]:
+    """
+    Letterbox a BGR frame to size x size unless it already is (frames from ingest_image are)
+    Returns the frame, the scale and the padding needed to map boxes back.
+    """
+    height, width = frame.shape[:2]
+    if (height, width) == (size, size):
+        return frame, 1.0, 0, 0
+    import cv2
+    scale = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    fitted = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    fitted[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = resized
+    return fitted, scale, pad_x, pad_y
+
+def unfit_detections(detections: List[Dict[str, Any]], frame_shape: Tuple[int, ...],
+                     scale: float, pad_x: int, pad_y: int) -> List[Dict[str, Any]]:
+    if scale == 1.0 and pad_x == 0 and pad_y == 0:
+        return detections
+    height, width = frame_shape[:2]
+    mapped = []
+    for detection in detections:
+        x1, y1, x2, y2 = detection["bbox"]
+        x1, x2 = (min(max((x - pad_x) / scale, 0), width) for x in (x1, x2))
+        y1, y2 = (min(max((y - pad_y) / scale, 0), height) for y in (y1, y2))
+        mapped.append({
+            **detection,
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "area_pixels": float((x2 - x1) * (y2 - y1)),
+        })
+    return mapped
+
+class DetectionBackend:
+    """
+    A loaded detection model: detect() takes BGR frames and returns detection dicts per frame
+    imgsz asks for a smaller (cheaper) inference size where the model allows it (dynamic_size);
+    boxes are always in frame pixels.
+    """
+
+    name = "base"
+    dynamic_size = True
+
+    def detect(self, frames: List[np.ndarray], conf: float = 0.25,
+               imgsz: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def warmup(self, runs: int, imgsz: int) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(runs):
+            self.detect([rng.integers(0, 256, size=(imgsz, imgsz, 3), dtype=np.uint8)], imgsz=imgsz)
+
+class UltralyticsBackend(DetectionBackend):
+    """Any model with the ultralytics predict() API (YOLO, or a stand-in for benchmarks)"""
+
+    name = "ultralytics"
+
+    def __init__(self, model):
+        self.model = model
+
+    def detect(self, frames: List[np.ndarray], conf: float = 0.25,
+               imgsz: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        # Frames are passed as-is: numpy input is already letterboxed BGR
+        # (ultralytics' convention for arrays), PIL images are treated as RGB
+        options = {"imgsz": imgsz} if imgsz else {}
+        results = self.model.predict(source=list(frames), conf=conf, verbose=False, **options)
+        return [parse_yolo_result(result) for result in results]
+
+    def warmup(self, runs: int, imgsz: int) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(runs):
+            frame = rng.integers(0, 256, size=(imgsz, imgsz, 3), dtype=np.uint8)
+            self.model.predict(source=frame, imgsz=imgsz, conf=0.25, verbose=False)
+
+class RawOutputBackend(DetectionBackend):
+    """
+    Shared pre/post-processing for runtimes that return the raw YOLO head output
+    Subclasses set input_size, batch_size (None when the batch axis is dynamic), dynamic_size
+    (spatial axes accept any size) and names, and implement infer(batch) on a float32 NCHW
+    RGB array.
+    """
+
+    input_size = 640
+    batch_size: Optional[int] = None
+    dynamic_size = False
+    names: List[str] = []
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def detect(self, frames: List[np.ndarray], conf: float = 0.25,
+               imgsz: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        if not frames:
+            return []
+        # A static graph only runs at its export size
+        size = imgsz if imgsz and self.dynamic_size else self.input_size
+        fitted = [fit_frame(frame, size) for frame in frames]
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1], what the exported graph expects
+        batch = np.stack([frame for frame, _, _, _ in fitted])[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        if self.batch_size is None:
+            output = self.infer(batch)
+        else:
+            # Static batch axis (exported without dynamic=True): one call per chunk
+            chunks = []
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                missing = self.batch_size - len(chunk)
+                if missing:
+                    chunk = np.concatenate([chunk, np.zeros((missing, *chunk.shape[1:]), dtype=chunk.dtype)])
+                chunks.append(self.infer(chunk)[:self.batch_size - missing])
+            output = np.concatenate(chunks)
+
+        results = postprocess_yolo(output, self.names, conf=conf, image_size=size)
+        return [
+            unfit_detections(detections, frame.shape, scale, pad_x, pad_y)
+            for detections, frame, (_, scale, pad_x, pad_y) in zip(results, frames, fitted)
+        ]
+
+def _static_dim(value) -> Optional[int]:
+    return value if isinstance(value, int) and value > 0 else None
+
+class OnnxRuntimeBackend(RawOutputBackend):
+    name = "onnx"
+
+    def __init__(self, path: str, threads: int):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, threads)
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.batch_size = _static_dim(model_input.shape[0])
+        self.dynamic_size = _static_dim(model_input.shape[2]) is None
+        self.input_size = _static_dim(model_input.shape[2]) or int(os.getenv("MODEL_IMGSZ", 640))
+        # ultralytics stores the class names in the model metadata as a dict literal
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _names_from_metadata(metadata.get("names"))
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+class OpenVinoBackend(RawOutputBackend):
+    name = "openvino"
+
+    def __init__(self, path: str, threads: int):
+        import openvino
+
+        core = openvino.Core()
+        model = core.read_model(path)
+        model_input = model.input(0).get_partial_shape()
+        self.batch_size = model_input[0].get_length() if model_input[0].is_static else None
+        self.dynamic_size = not model_input[2].is_static
+        self.input_size = (model_input[2].get_length() if model_input[2].is_static
+                           else int(os.getenv("MODEL_IMGSZ", 640)))
+        self.compiled = core.compile_model(model, "CPU", {
+            "INFERENCE_NUM_THREADS": max(1, threads),
+            "PERFORMANCE_HINT": os.getenv("OPENVINO_PERFORMANCE_HINT", "LATENCY"),
+        })
+        self.output = self.compiled.output(0)
+        self.names = _names_from_metadata(_read_openvino_names(path))
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled([batch])[self.output]
+
+def _names_from_metadata(value: Optional[str]) -> List[str]:
+    if value:
+        try:
+            names = ast.literal_eval(value)
+            return [str(names[i]).strip().lower() for i in sorted(names)]
+        except (ValueError, SyntaxError, TypeError) as e:
+            print(f"Could not read class names from model metadata: {e}")
+    return load_class_names()
+
+def _read_openvino_names(path: str) -> Optional[str]:
+    # ultralytics writes metadata.yaml next to the .xml; the names are one "  id: name" per line
+    metadata_path = os.path.join(os.path.dirname(path), "metadata.yaml")
+    try:
+        with open(metadata_path, 'r', encoding='utf-8') as file:
+            lines = file.read().split("names:", 1)[1].splitlines()
+    except (OSError, IndexError):
+        return None
+    names = {}
+    for line in lines[1:]:
+        if not line.startswith("  ") or ":" not in line:
+            break
+        class_id, name = line.split(":", 1)
+        names[int(class_id)] = name.strip().strip("'\"")
+    return repr(names) if names else None
+
+def exported_weights_path(backend: str, pt_path: str) -> str:
+    """Where export_model writes a backend's weights: next to the .pt file"""
+    stem = os.path.splitext(pt_path)[0]
+    if backend == "onnx":
+        return stem + ".onnx"
+    if backend == "openvino":
+        return os.path.join(stem + "_openvino_model", os.path.basename(stem) + ".xml")
+    return pt_path
+
+def backend_weights_path(backend: str, pt_path: str) -> str:
+    """
+    Weights file a backend loads: the exported file next to the .pt weights
+    DETECTION_MODEL_PATH overrides it.
+    """
+    override = os.getenv("DETECTION_MODEL_PATH")
+    if override:
+        return os.path.abspath(override)
+    return exported_weights_path(backend, pt_path)
+
+def load_backend(backend: str, path: str, threads: int) -> DetectionBackend:
+    """Load the ONNX Runtime or OpenVINO backend (ultralytics models come from the registry)"""
+    if backend == "onnx":
+        return OnnxRuntimeBackend(path, threads)
+    if backend == "openvino":
+        return OpenVinoBackend(path, threads)
+    raise ValueError(f"Unknown DETECTION_BACKEND: {backend}")
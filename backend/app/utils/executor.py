@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.cascade import CASCADE_ESCALATIONS, CASCADE_FRAMES, CASCADE_SECONDS, ESCALATION_REASONS
+from app.utils.food_detection import MOCK_DETECTIONS, detect_food_batch
+from app.utils.model_registry import model_registry
+from app.utils.startup import preload
+
+# (offset, shape, dtype) of each frame inside a shared memory block
+FrameLayout = List[Tuple[int, Tuple[int, ...], str]]
+
+def _init_process_worker(torch_threads: int) -> None:
+    # Each worker process owns one model instance, loaded and warmed up once
+    os.environ["TORCH_NUM_THREADS"] = str(torch_threads)
+    model_registry.startup()
+
+def _process_worker_status() -> str:
+    return model_registry.status
+
+MOCK_REASONS = ("no_model", "error")
+
+# Counters bumped inside detect_food_batch; worker processes report their increments back
+WORKER_COUNTERS = (
+    [(MOCK_DETECTIONS, {"reason": reason}) for reason in MOCK_REASONS]
+    + [(CASCADE_FRAMES, {})]
+    + [(CASCADE_ESCALATIONS, {"reason": reason}) for reason in ESCALATION_REASONS]
+    + [(CASCADE_SECONDS, {"stage": stage}) for stage in ("first", "full")]
+)
+
+def _worker_counter_values() -> List[float]:
+    return [counter.value(**labels) for counter, labels in WORKER_COUNTERS]
+
+def _detect_from_shared_memory(shm_name: str, layout: FrameLayout) -> Tuple[List[List[Dict[str, Any]]], List[float]]:
+    """
+    Runs inside a worker process: map the frames from shared memory and detect on them
+    Also returns the worker's WORKER_COUNTERS increments for this call, since the
+    worker's metrics are not visible from the server process
+    """
+    before = _worker_counter_values()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = [
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for offset, shape, dtype in layout
+        ]
+        results = detect_food_batch(frames)
+        # Views must be released before the block can be closed
+        del frames
+        increments = [after - start for after, start in zip(_worker_counter_values(), before)]
+        return results, increments
+    finally:
+        shm.close()
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound pipeline stages (decode, preprocessing, inference, calorie math)
+    off the asyncio event loop
+
+    INFERENCE_EXECUTOR=thread runs every stage on a thread pool.
+    INFERENCE_EXECUTOR=process additionally runs detection in a process pool where each
+    worker keeps its own model; frames are handed over through shared memory instead of
+    being pickled.
+    """
+
+    def __init__(self, mode: Optional[str] = None, threads: Optional[int] = None,
+                 processes: Optional[int] = None):
+        cpu_count = os.cpu_count() or 1
+        self.mode = (mode or os.getenv("INFERENCE_EXECUTOR", "thread")).lower()
+        if self.mode not in ("thread", "process"):
+            raise ValueError(f"Unknown INFERENCE_EXECUTOR: {self.mode}")
+        self.threads = threads or int(os.getenv("INFERENCE_THREADS", min(4, cpu_count)))
+        self.processes = processes or int(os.getenv("INFERENCE_PROCESSES", max(1, cpu_count // 2)))
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def detect_slots(self) -> int:
+        """
+        How many detection batches can usefully run at once: one per worker process,
+        or one in thread mode, where the single model already uses every core per pass
+        """
+        return self.processes if self.mode == "process" else 1
+
+    def start(self) -> None:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.threads, thread_name_prefix="inference"
+            )
+        if self.mode == "process" and self._process_pool is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.processes)
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(torch_threads,),
+            )
+
+    def shutdown(self) -> None:
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True, cancel_futures=True)
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=True, cancel_futures=True)
+            self._thread_pool = None
+
+    def prepare_model(self) -> None:
+        """
+        Load and warm up the model where inference will run, then mark the registry ready
+        Blocking; called from a background thread at startup
+        """
+        if self.mode != "process":
+            model_registry.startup()
+            return
+
+        # Decoding stays in this process, so it needs the preloaded modules as well
+        preload()
+        self.start()
+        try:
+            # One status call per worker forces every worker to spawn and run its initializer
+            futures = [self._process_pool.submit(_process_worker_status) for _ in range(self.processes)]
+            statuses = [future.result() for future in futures]
+            model_registry.mark_ready(statuses[0] if statuses else "mock")
+        except Exception as e:
+            print(f"Inference worker startup failed: {e}")
+            model_registry.mark_ready("mock", error=str(e))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function on the inference thread pool"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool, functools.partial(fn, *args, **kwargs))
+
+    async def detect(self, frames: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Run batched food detection in the configured pool"""
+        if self.mode != "process":
+            return await self.run(detect_food_batch, frames)
+
+        self.start()
+        frames = [np.ascontiguousarray(frame) for frame in frames]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(f.nbytes for f in frames)))
+        try:
+            layout: FrameLayout = []
+            offset = 0
+            for frame in frames:
+                view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf, offset=offset)
+                view[...] = frame
+                del view
+                layout.append((offset, frame.shape, frame.dtype.str))
+                offset += frame.nbytes
+
+            loop = asyncio.get_running_loop()
+            results, increments = await loop.run_in_executor(
+                self._process_pool, _detect_from_shared_memory, shm.name, layout
+            )
+            for (counter, labels), increment in zip(WORKER_COUNTERS, increments):
+                if increment:
+                    counter.inc(increment, **labels)
+            return results
+        finally:
+            shm.close()
+            shm.unlink()
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,53 @@
+"""
+Export food_detection.pt for the ONNX Runtime and OpenVINO detection backends
+
+    python -m app.utils.export_model --format onnx [--imgsz 640] [--static]
+    python -m app.utils.export_model --format openvino
+
+Needs ultralytics (and onnx / openvino for the export itself); the files are written next
+to the .pt weights, where DETECTION_BACKEND=onnx / openvino looks for them.
+"""
+import argparse
+import os
+import shutil
+
+from app.utils.detection_backends import exported_weights_path
+from app.utils.model_registry import DEFAULT_MODEL_PATH
+
+def export_model(backend: str, weights: str = DEFAULT_MODEL_PATH, imgsz: int = 640, dynamic: bool = True) -> str:
+    """
+    Export the weights for a backend and return the path the backend will load
+    dynamic keeps the batch axis variable so a micro-batch runs as one call (ONNX only;
+    OpenVINO models are reshaped at compile time).
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    if backend == "onnx":
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=dynamic, simplify=True)
+    elif backend == "openvino":
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=dynamic)
+    else:
+        raise ValueError(f"Unsupported export format: {backend}")
+
+    # ultralytics writes next to the weights already; move it there if it didn't.
+    # The target depends on the weights alone: DETECTION_MODEL_PATH is where a backend
+    # loads from, not where an export of other weights should land
+    target = exported_weights_path(backend, os.path.abspath(weights))
+    source = exported if backend == "onnx" else os.path.join(exported, os.path.basename(target))
+    if os.path.abspath(source) != target:
+        if backend == "onnx":
+            shutil.move(source, target)
+        else:
+            shutil.copytree(exported, os.path.dirname(target), dirs_exist_ok=True)
+    print(f"Exported {weights} -> {target}")
+    return target
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the detection model for a CPU inference backend")
+    parser.add_argument("--format", choices=("onnx", "openvino"), required=True)
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--imgsz", type=int, default=int(os.getenv("MODEL_IMGSZ", 640)))
+    parser.add_argument("--static", action="store_true", help="fixed batch size 1 instead of a dynamic batch axis")
+    args = parser.parse_args()
+    export_model(args.format, args.weights, args.imgsz, dynamic=not args.static)
@@ -1,56 +1,52 @@
 import numpy as np
 from typing import List, Dict, Any
-from PIL import Image
-import os
+# parse_yolo_result now lives with the backends; still importable from here
+from app.utils.detection_backends import parse_yolo_result
+from app.utils.cascade import cascade
+from app.utils.metrics import metrics
+from app.utils.model_registry import model_registry
+
+MOCK_DETECTIONS = metrics.counter(
+    "mock_detections_total", "Images answered with mock detections instead of the model",
+    labelnames=("reason",),
+)
 
 def detect_food(image: np.ndarray) -> List[Dict[str, Any]]:
     """
     Interface function for YOLO food detection
     Integrates with Team Member 1's YOLO model
     """
+    return detect_food_batch([image])[0]
+
+def detect_food_batch(images: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+    """
+    Run YOLO detection on several images in one forward pass
+    Returns one detection list per input image, in the same order
+    """
+    reason = "no_model"
     try:
-        # Try to load actual YOLO model
-        model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'food_detection.pt')
+        # Shared model from the registry (loaded and warmed up once per process),
+        # running on the configured DETECTION_BACKEND
+        backend = model_registry.get_backend()
         
-        if os.path.exists(model_path):
-            from ultralytics import YOLO
-            model = YOLO(model_path)
-            
-            # Convert numpy array to PIL Image if needed
-            if isinstance(image, np.ndarray):
-                image_pil = Image.fromarray(image)
-            else:
-                image_pil = image
-                
-            # Run YOLO detection
-            results = model.predict(source=image_pil, conf=0.25, verbose=False)
-            result = results[0]
-            
-            detections = []
-            for i in range(len(result.boxes)):
-                detection_box = result.boxes[i]
-                class_id = int(detection_box.cls.item())
-                food_name = result.names[class_id]
-                confidence = detection_box.conf.item()
-                
-                # Get bounding box coordinates
-                x1, y1, x2, y2 = detection_box.xyxy[0]
-                bbox = [int(x1), int(y1), int(x2), int(y2)]
-                
-                detections.append({
-                    "class_name": food_name,
-                    "confidence": confidence,
-                    "bbox": bbox,
-                    "area_pixels": (x2 - x1) * (y2 - y1)
-                })
-            
-            return detections
+        if backend is not None:
+            if cascade.enabled:
+                return cascade.detect(list(images), backend, conf=0.25)
+            return backend.detect(list(images), conf=0.25)
             
     except Exception as e:
         print(f"YOLO model not available, using mock data: {e}")
+        reason = "error"
     
     # Fallback to mock detection for development
-    mock_detections = [
+    MOCK_DETECTIONS.inc(len(images), reason=reason)
+    return [get_mock_detections() for _ in images]
+
+def get_mock_detections() -> List[Dict[str, Any]]:
+    """
+    Mock detections used for development when the YOLO model is unavailable
+    """
+    return [
         {
             "class_name": "dosa",
             "confidence": 0.85,
@@ -70,20 +66,12 @@ def detect_food(image: np.ndarray) -> List[Dict[str, Any]]:
             "area_pixels": 8000
         }
     ]
-    
-    return mock_detections
 
 def load_yolo_model(model_path: str):
     """
     Load the trained YOLO model from Team Member 1
     """
-    try:
-        from ultralytics import YOLO
-        model = YOLO(model_path)
-        return model
-    except Exception as e:
-        print(f"Error loading YOLO model: {e}")
-        return None
+    return model_registry.get_model(model_path)
 
 def preprocess_for_yolo(image: np.ndarray) -> np.ndarray:
     """
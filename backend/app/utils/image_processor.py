@@ -1,22 +1,155 @@
+import io
+import os
+import time
+import zipfile
 import numpy as np
-from PIL import Image
-import cv2
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
-def process_image(image: Image.Image) -> np.ndarray:
+from app.utils.upload import UPLOAD_MAX_BYTES, check_image, limit_violation, reject
+
+# cv2 and PIL are imported on first use (and preloaded in the background at startup)
+if TYPE_CHECKING:
+    from PIL import Image
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+MODEL_INPUT_SIZE = 640  # Common YOLO input size
+LETTERBOX_COLOR = 114   # Same grey padding ultralytics uses
+
+class IngestedImage(NamedTuple):
+    """Model-ready frame plus what is needed to map boxes back to the original photo"""
+    frame: np.ndarray   # contiguous HxWx3 uint8, BGR (what ultralytics expects from numpy input)
+    width: int          # original width
+    height: int         # original height
+    format: Optional[str]
+    gain_x: float       # model-frame pixels per original pixel
+    gain_y: float
+    pad_x: int          # letterbox padding in the model frame
+    pad_y: int
+    decode_seconds: float = 0.0  # time spent in PIL decode, for stage timing
+
+def letterbox(rgb: np.ndarray, target_size: int = MODEL_INPUT_SIZE) -> Tuple[np.ndarray, int, int, int, int]:
+    
+    # Fit an RGB array into a target_size square with one resize, keeping aspect ratio
+    # Returns the BGR frame, the resized content size and the padding offsets
+    import cv2
+    
+    height, width = rgb.shape[:2]
+    scale = min(target_size / width, target_size / height)
+    new_width = max(1, round(width * scale))
+    new_height = max(1, round(height * scale))
+    
+    if (new_width, new_height) != (width, height):
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        rgb = cv2.resize(rgb, (new_width, new_height), interpolation=interpolation)
+    
+    pad_x = (target_size - new_width) // 2
+    pad_y = (target_size - new_height) // 2
+    frame = np.full((target_size, target_size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    # The copy into the canvas also reverses RGB -> BGR, so no separate cvtColor pass
+    frame[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = rgb[..., ::-1]
+    
+    return frame, new_width, new_height, pad_x, pad_y
+
+def ingest_image(image_data: bytes, target_size: int = MODEL_INPUT_SIZE) -> IngestedImage:
+    
+    # Decode an upload straight from its buffer into a model-ready frame
+    from PIL import Image
+    
+    started = time.perf_counter()
+    try:
+        # open only parses the header, so the limits are checked before any pixel is decoded
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+        image_format = image.format
+        check_image(image_format, width, height)
+        
+        # Very large JPEGs are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself;
+        # draft never goes below the requested size, so the letterbox still downsamples
+        if image_format == 'JPEG' and max(width, height) > 2 * target_size:
+            image.draft('RGB', (target_size, target_size))
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        rgb = np.asarray(image)
+    except OSError as e:
+        raise reject("malformed", f"Could not decode image: {e}")
+    decode_seconds = time.perf_counter() - started
+    
+    return ingest_rgb(rgb, image_format, target_size, width, height, decode_seconds)
+
+def ingest_rgb(rgb: np.ndarray, image_format: Optional[str], target_size: int = MODEL_INPUT_SIZE,
+               width: Optional[int] = None, height: Optional[int] = None,
+               decode_seconds: float = 0.0) -> IngestedImage:
+    
+    # Letterbox an already decoded RGB array (an upload or a video frame)
+    # width/height are the original size when rgb was decoded at reduced scale
+    height = height or rgb.shape[0]
+    width = width or rgb.shape[1]
+    frame, new_width, new_height, pad_x, pad_y = letterbox(rgb, target_size)
+    
+    return IngestedImage(
+        frame=frame,
+        width=width,
+        height=height,
+        format=image_format,
+        gain_x=new_width / width,
+        gain_y=new_height / height,
+        pad_x=pad_x,
+        pad_y=pad_y,
+        decode_seconds=decode_seconds,
+    )
+
+def scale_detections_to_original(detections: List[Dict[str, Any]], ingested: IngestedImage) -> List[Dict[str, Any]]:
+    
+    # Map detection boxes from the letterboxed model frame back to original image pixels
+    scaled = []
+    for detection in detections:
+        x1, y1, x2, y2 = detection["bbox"]
+        x1 = min(max((x1 - ingested.pad_x) / ingested.gain_x, 0), ingested.width)
+        x2 = min(max((x2 - ingested.pad_x) / ingested.gain_x, 0), ingested.width)
+        y1 = min(max((y1 - ingested.pad_y) / ingested.gain_y, 0), ingested.height)
+        y2 = min(max((y2 - ingested.pad_y) / ingested.gain_y, 0), ingested.height)
+        
+        scaled.append({
+            **detection,
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "area_pixels": float((x2 - x1) * (y2 - y1))
+        })
+    
+    return scaled
+
+def process_image(image: "Image.Image") -> np.ndarray:
     
     #Process uploaded image for model inference
-    # Convert PIL image to numpy array
-    image_array = np.array(image)
+    # Letterboxed BGR frame at the model input size
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    frame, _, _, _, _ = letterbox(np.asarray(image))
     
-    # Convert RGB to BGR if needed (for OpenCV compatibility)
-    if len(image_array.shape) == 3 and image_array.shape[2] == 3:
-        image_array = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+    return frame
+
+def extract_images_from_zip(archive_data: bytes, max_images: int) -> List[Tuple[str, Union[bytes, Exception]]]:
     
-    # Resize image to standard size 
-    target_size = (640, 640)  # Common YOLO input size
-    processed_image = cv2.resize(image_array, target_size)
+    # Pull image files out of an uploaded zip archive, in archive order
+    # Members over UPLOAD_MAX_BYTES are not decompressed and come back as their rejection
+    images = []
+    with zipfile.ZipFile(io.BytesIO(archive_data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            # Skip folders and macOS resource forks
+            if info.is_dir() or name.startswith('__MACOSX/'):
+                continue
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            if len(images) >= max_images:
+                raise reject("too_many_items", f"Archive contains more than {max_images} images")
+            if info.file_size > UPLOAD_MAX_BYTES:
+                images.append((name, reject("too_large", f"Image is larger than {UPLOAD_MAX_BYTES} bytes")))
+                continue
+            images.append((name, archive.read(info)))
     
-    return processed_image
+    return images
 
 def normalize_image(image: np.ndarray) -> np.ndarray:
 
@@ -26,20 +159,8 @@ def normalize_image(image: np.ndarray) -> np.ndarray:
     normalized = image.astype(np.float32) / 255.0
     return normalized
 
-def validate_image(image: Image.Image) -> bool:
-    
-    # Validate uploaded image
+def validate_image(image: "Image.Image") -> bool:
     
-    # Check image format
-    if image.format not in ['JPEG', 'PNG', 'JPG']:
-        return False
-    
-    # Check image size (not too small or too large)
+    # Validate uploaded image against the upload limits (format, size, pixel count)
     width, height = image.size
-    if width < 100 or height < 100:
-        return False
-    
-    if width > 4000 or height > 4000:
-        return False
-    
-    return True
+    return limit_violation(image.format, width, height) is None
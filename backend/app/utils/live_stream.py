@@ -0,0 +1,187 @@
+"""
+Live camera streams over WebSocket (/api/live)
+
+Clients send encoded frames (JPEG, PNG or WebP), one binary message per frame, as fast as
+they like. Each connection keeps only the newest frame that has not been processed yet: a
+frame that arrives while another one is waiting replaces it, so results are never more
+than one inference behind the camera. Every result is pushed back as a JSON message:
+
+    {"frame_id": 42, "success": true, "total_calories": 512.3, "total_macros": {...},
+     "detected_foods": [...], "image_info": {...}, "dropped": 2,
+     "timings": {"queued_ms": 3.1, "decode_ms": 4.0, ..., "total_ms": 61.0}}
+
+frame_id numbers the binary messages of the connection from 0; dropped is the number of
+frames replaced since the previous result.
+
+    LIVE_MAX_STREAMS       concurrent streams per server process (default 4); others are closed with 1013
+    LIVE_MAX_FPS           results per second per stream (default 10)
+    LIVE_MAX_FRAME_BYTES   largest accepted frame (default 2 MB)
+    LIVE_IDLE_TIMEOUT      seconds without a frame before the stream is closed (default 30)
+
+A stream has at most one frame in inference, so LIVE_MAX_STREAMS also caps how many batch
+slots live traffic can take from /api/predict. Live results are neither cached nor saved.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from app.utils.metrics import metrics
+from app.utils.pipeline import run_prediction_pipeline
+from app.utils.timing import request_timing
+from app.utils.upload import UploadRejected
+
+LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", 4))
+LIVE_MAX_FPS = float(os.getenv("LIVE_MAX_FPS", 10))
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", 2 * 1024 * 1024))
+LIVE_IDLE_TIMEOUT = float(os.getenv("LIVE_IDLE_TIMEOUT", 30))
+
+# WebSocket close code for "try again later"
+CLOSE_OVERLOADED = 1013
+RESULT_FIELDS = ("success", "total_calories", "total_macros", "detected_foods", "image_info", "nutrition_version")
+
+LIVE_STREAMS = metrics.gauge("live_streams", "Open live camera streams")
+LIVE_FRAMES = metrics.counter(
+    "live_frames_total", "Live camera frames by outcome", labelnames=("outcome",)
+)
+LIVE_REFUSED = metrics.counter(
+    "live_streams_refused_total", "Live streams closed on connect because the process was at LIVE_MAX_STREAMS"
+)
+LIVE_LATENCY = metrics.histogram(
+    "live_frame_latency_seconds", "Time from a live frame's arrival until its result was sent"
+)
+
+class LiveFrame(NamedTuple):
+    frame_id: int
+    data: bytes
+    received_at: float
+
+class LiveSession:
+    """One WebSocket connection: a receive loop and a process loop sharing a one-frame slot"""
+
+    def __init__(self, websocket: WebSocket, max_fps: Optional[float] = None,
+                 max_frame_bytes: Optional[int] = None, idle_timeout: Optional[float] = None):
+        self.websocket = websocket
+        self.max_fps = max_fps if max_fps is not None else LIVE_MAX_FPS
+        self.max_frame_bytes = max_frame_bytes or LIVE_MAX_FRAME_BYTES
+        self.idle_timeout = idle_timeout or LIVE_IDLE_TIMEOUT
+        self.pending: Optional[LiveFrame] = None
+        self.ready = asyncio.Event()
+        self.next_id = 0
+        self.dropped = 0
+
+    def offer(self, data: bytes) -> LiveFrame:
+        """Make a frame the next one to process, replacing any frame still waiting"""
+        frame = LiveFrame(self.next_id, data, time.perf_counter())
+        self.next_id += 1
+        if self.pending is not None:
+            self.dropped += 1
+            LIVE_FRAMES.inc(outcome="dropped")
+        self.pending = frame
+        self.ready.set()
+        return frame
+
+    def take(self) -> Optional[LiveFrame]:
+        frame, self.pending = self.pending, None
+        self.ready.clear()
+        return frame
+
+    async def receive_frames(self) -> None:
+        while True:
+            message = await asyncio.wait_for(self.websocket.receive(), self.idle_timeout)
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                await self.websocket.send_json({"success": False, "error": "Frames must be sent as binary messages"})
+                continue
+            if len(data) > self.max_frame_bytes:
+                LIVE_FRAMES.inc(outcome="rejected")
+                await self.websocket.send_json({
+                    "frame_id": self.next_id, "success": False,
+                    "error": f"Frame is larger than {self.max_frame_bytes} bytes",
+                })
+                self.next_id += 1
+                continue
+            self.offer(data)
+
+    async def process_frames(self) -> None:
+        min_interval = 1 / self.max_fps if self.max_fps > 0 else 0
+        last_started = 0.0
+        while True:
+            await self.ready.wait()
+            # Over the frame rate cap, wait; newer frames keep replacing the pending one meanwhile
+            wait = last_started + min_interval - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            frame = self.take()
+            last_started = time.perf_counter()
+            await self.websocket.send_json(await self.process(frame))
+
+    async def process(self, frame: LiveFrame) -> Dict[str, Any]:
+        dropped, self.dropped = self.dropped, 0
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"frame_id": frame.frame_id}
+        with request_timing() as timing:
+            try:
+                response = await run_prediction_pipeline(frame.data, use_cache=False)
+                result.update((field, response[field]) for field in RESULT_FIELDS if field in response)
+                LIVE_FRAMES.inc(outcome="processed")
+            except UploadRejected as e:
+                LIVE_FRAMES.inc(outcome="rejected")
+                result.update(success=False, error=str(e))
+            except Exception as e:
+                LIVE_FRAMES.inc(outcome="failed")
+                result.update(success=False, error=f"Prediction failed: {str(e)}")
+
+        total = time.perf_counter() - frame.received_at
+        LIVE_LATENCY.observe(total)
+        result["dropped"] = dropped
+        result["timings"] = {
+            "queued_ms": round((started - frame.received_at) * 1000, 2),
+            **{f"{stage}_ms": round(seconds * 1000, 2) for stage, seconds in timing.stages},
+            "total_ms": round(total * 1000, 2),
+        }
+        return result
+
+    async def run(self) -> None:
+        processor = asyncio.create_task(self.process_frames())
+        try:
+            await self.receive_frames()
+        except asyncio.TimeoutError:
+            await self.websocket.close(code=1000, reason="Idle timeout")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            processor.cancel()
+            try:
+                await processor
+            except (asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                # RuntimeError: a result was being sent as the socket closed
+                pass
+
+_active_streams = 0
+
+async def serve_live_stream(websocket: WebSocket) -> None:
+    """Accept a stream unless this process already serves LIVE_MAX_STREAMS of them"""
+    global _active_streams
+    await websocket.accept()
+    if _active_streams >= LIVE_MAX_STREAMS:
+        LIVE_REFUSED.inc()
+        await websocket.close(code=CLOSE_OVERLOADED, reason=f"At most {LIVE_MAX_STREAMS} live streams per server")
+        return
+
+    _active_streams += 1
+    LIVE_STREAMS.set(_active_streams)
+    try:
+        await LiveSession(websocket).run()
+    finally:
+        _active_streams -= 1
+        LIVE_STREAMS.set(_active_streams)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
@@ -0,0 +1,242 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.utils.startup import preload, startup_report
+from app.utils.detection_backends import (
+    BACKENDS, DetectionBackend, UltralyticsBackend, backend_weights_path, load_backend
+)
+
+DEFAULT_MODEL_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'models', 'food_detection.pt')
+)
+
+class ModelRegistry:
+    """
+    Process-wide YOLO model cache
+    Each weights file is loaded once, the default model is warmed up at startup
+    and readiness is reported to /health only after warm-up has finished
+
+    Detection goes through get_backend(): the default weights run on the runtime chosen
+    with DETECTION_BACKEND (ultralytics, onnx or openvino)
+    """
+
+    def __init__(self, default_path: str = DEFAULT_MODEL_PATH, backend: Optional[str] = None):
+        self.default_path = default_path
+        self.backend_name = (backend or os.getenv("DETECTION_BACKEND", "ultralytics")).lower()
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown DETECTION_BACKEND: {self.backend_name}")
+        self._backend: Optional[DetectionBackend] = None
+        self._backend_loaded = False
+        self.status = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._version_key = None
+        self._version = "mock"
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def get_model(self, model_path: Optional[str] = None):
+        """
+        Return the cached model for model_path (default weights if None)
+        Loads it on first use; returns None if the weights are missing or fail to load
+        """
+        path = os.path.abspath(model_path or self.default_path)
+        if path in self._models:
+            return self._models[path]
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            if path in self._models:
+                return self._models[path]
+
+            if not os.path.exists(path):
+                return None
+
+            try:
+                from ultralytics import YOLO
+                start = time.perf_counter()
+                model = YOLO(path)
+                if path == self.default_path:
+                    self.load_seconds = time.perf_counter() - start
+                print(f"Loaded YOLO model from {path}")
+            except Exception as e:
+                print(f"Error loading YOLO model: {e}")
+                if path == self.default_path:
+                    self.error = str(e)
+                model = None
+
+            # Failed loads are cached too so requests don't retry the import every time
+            self._models[path] = model
+            return model
+
+    @property
+    def weights_path(self) -> str:
+        """Weights file the configured backend runs (the .pt file for ultralytics)"""
+        return backend_weights_path(self.backend_name, self.default_path)
+
+    def get_backend(self) -> Optional[DetectionBackend]:
+        """
+        Detection backend for the default weights, loaded on first use
+        Returns None if its weights or runtime are missing
+        """
+        if self._backend_loaded:
+            return self._backend
+
+        if self.backend_name == "ultralytics":
+            model = self.get_model()
+            backend = UltralyticsBackend(model) if model is not None else None
+        else:
+            with self._lock:
+                if self._backend_loaded:
+                    return self._backend
+                backend = None
+                path = self.weights_path
+                if os.path.exists(path):
+                    try:
+                        start = time.perf_counter()
+                        backend = load_backend(self.backend_name, path, detection_threads())
+                        self.load_seconds = time.perf_counter() - start
+                        print(f"Loaded {self.backend_name} model from {path}")
+                    except Exception as e:
+                        print(f"Error loading {self.backend_name} model: {e}")
+                        self.error = str(e)
+
+        self._backend = backend
+        # Missing weights are re-checked on the next call, failed loads are not retried
+        self._backend_loaded = backend is not None or os.path.exists(self.weights_path)
+        return backend
+
+    @property
+    def model_version(self) -> str:
+        """
+        Short content hash of the weights file in use, or "mock" when it is missing
+        Re-hashed only when the file's size or mtime changes
+        """
+        path = self.weights_path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "mock"
+
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        if key != self._version_key:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._version = digest.hexdigest()[:12]
+            self._version_key = key
+        return self._version
+
+    def warmup(self, backend: DetectionBackend, runs: int, imgsz: int) -> None:
+        """Run inference on synthetic frames so the first real request is not the slow one"""
+        start = time.perf_counter()
+        backend.warmup(runs, imgsz)
+        self.warmup_seconds = time.perf_counter() - start
+        print(f"Model warm-up finished: {runs} runs in {self.warmup_seconds:.2f}s")
+
+    def startup(self) -> None:
+        """
+        Load and warm up the default model, then mark the registry ready
+        Runs in a background thread so the server can accept connections meanwhile;
+        the lazily imported runtime modules are preloaded here too
+        """
+        if self._ready.is_set():
+            return
+
+        self.status = "loading"
+        try:
+            preload()
+
+            if not os.path.exists(self.weights_path):
+                print(f"Model not found at {self.weights_path}, using mock detection")
+                self.status = "mock"
+                return
+
+            if self.backend_name == "ultralytics":
+                set_torch_threads(detection_threads())
+
+            backend = self.get_backend()
+            if backend is None:
+                self.status = "mock"
+                return
+
+            self.status = "warming_up"
+            runs = int(os.getenv("MODEL_WARMUP_RUNS", 2))
+            self.warmup(backend, runs=runs, imgsz=int(os.getenv("MODEL_IMGSZ", 640)))
+
+            # The cascade's first pass runs at its own size (and maybe its own model)
+            from app.utils.cascade import cascade
+            if cascade.enabled:
+                cascade.warmup(backend, runs)
+            self.status = "ready"
+
+        except Exception as e:
+            print(f"Model startup failed, using mock detection: {e}")
+            self.error = str(e)
+            self.status = "mock"
+
+        finally:
+            self._ready.set()
+            startup_report.mark("model_ready")
+
+    def register_model(self, model, model_path: Optional[str] = None, status: str = "ready") -> None:
+        """
+        Install an already-built model (e.g. a stand-in for benchmarks) and mark ready
+        Accepts a DetectionBackend or a model with the ultralytics predict() API
+        """
+        path = os.path.abspath(model_path or self.default_path)
+        if isinstance(model, DetectionBackend):
+            backend = model
+        else:
+            backend = UltralyticsBackend(model)
+            with self._lock:
+                self._models[path] = model
+        if path == self.default_path:
+            self._backend = backend
+            self._backend_loaded = True
+            self.mark_ready(status)
+
+    def mark_ready(self, status: str, error: Optional[str] = None) -> None:
+        """Mark ready when the model lives elsewhere (e.g. in inference worker processes)"""
+        self.status = status
+        self.error = error
+        self._ready.set()
+        startup_report.mark("model_ready")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "backend": self.backend_name,
+            "path": self.weights_path,
+            "version": self.model_version,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+def detection_threads() -> int:
+    """Intra-op thread count for whichever runtime runs detection"""
+    return int(os.getenv("TORCH_NUM_THREADS", os.cpu_count() or 1))
+
+def set_torch_threads(num_threads: int) -> None:
+    """Set the torch intra-op thread count (no-op when torch is not installed)"""
+    try:
+        import torch
+        torch.set_num_threads(max(1, num_threads))
+        print(f"Torch intra-op threads set to {torch.get_num_threads()}")
+    except Exception as e:
+        print(f"Could not set torch threads: {e}")
+
+model_registry = ModelRegistry()
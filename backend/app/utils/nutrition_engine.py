@@ -0,0 +1,182 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CLASSES_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'classes (1).txt')
+
+# Portion size category by share of the image covered by the box
+SIZE_BOUNDS = np.array([0.10, 0.30])
+SIZE_MULTIPLIERS = np.array([0.6, 1.0, 1.4])
+SIZE_LABELS = ("small", "medium", "large")
+
+# Confidence scales the portion between 80% and 120%
+CONF_BASE = 0.8
+CONF_SCALE = 0.4
+# calculate_calories has always estimated portions at this fixed confidence, not the
+# detector's score, so the same boxes give the same grams whatever the model's certainty
+PORTION_CONFIDENCE = 0.8
+
+DEFAULT_BASE_WEIGHT = 100.0
+DEFAULT_NUTRITION = {"calories": 130, "protein": 2.7, "carbs": 28, "fat": 0.3}
+NUTRIENT_KEYS = ("calories", "protein", "carbs", "fat")
+
+Meal = Tuple[List[Dict[str, Any]], int, int]  # (detections, image width, image height)
+
+def load_class_names(path: str = CLASSES_PATH) -> List[str]:
+    """
+    Model class names indexed by class id ("0: appalam" per line)
+    """
+    names = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if ':' not in line:
+                    continue
+                class_id, name = line.split(':', 1)
+                names[int(class_id)] = name.strip().lower()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error loading class names: {e}")
+    return [names[i] for i in sorted(names)]
+
+class NutritionEngine:
+    """
+    Nutrition and portion tables compiled into NumPy arrays indexed by model class id
+
+    Row i holds class i from classes (1).txt; foods only present in the nutrition
+    table are appended after the model classes, and the last row is the fallback
+    used for unknown foods. Portions, calories and macros for any number of
+    detections (and meals) come from a handful of array operations.
+    """
+
+    def __init__(self, nutrition_db: Dict[str, Dict[str, float]], base_weights: Dict[str, float],
+                 class_names: Optional[Sequence[str]] = None, version: Optional[str] = None):
+        names = list(class_names if class_names is not None else load_class_names())
+        known = set(names)
+        for name in list(nutrition_db) + list(base_weights):
+            if name not in known:
+                names.append(name)
+                known.add(name)
+
+        self.version = version
+        self.class_names = names
+        self.class_index = {name: i for i, name in enumerate(names)}
+        self.unknown_id = len(names)
+
+        fallback = nutrition_db.get("rice", DEFAULT_NUTRITION)
+        rows = [nutrition_db.get(name, fallback) for name in names] + [fallback]
+        # Per-100g values, columns in NUTRIENT_KEYS order
+        self.nutrition = np.array([[row[key] for key in NUTRIENT_KEYS] for row in rows], dtype=np.float64)
+        self.base_weight = np.array(
+            [base_weights.get(name, DEFAULT_BASE_WEIGHT) for name in names] + [DEFAULT_BASE_WEIGHT],
+            dtype=np.float64,
+        )
+        self._name_cache: Dict[str, int] = {}
+
+    def lookup_id(self, name: str) -> int:
+        class_id = self._name_cache.get(name)
+        if class_id is None:
+            class_id = self.class_index.get(name.lower().strip(), self.unknown_id)
+            self._name_cache[name] = class_id
+        return class_id
+
+    def detection_ids(self, detections: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Class ids for detections; uses the model's class_id, falling back to the name
+        """
+        return np.fromiter(
+            (d["class_id"] if "class_id" in d else self.lookup_id(d["class_name"]) for d in detections),
+            dtype=np.intp,
+            count=len(detections),
+        )
+
+    def valid_ids(self, class_ids: np.ndarray) -> np.ndarray:
+        """Map out-of-range class ids to the fallback row"""
+        return np.where((class_ids >= 0) & (class_ids < self.unknown_id), class_ids, self.unknown_id)
+
+    def portions(self, class_ids: np.ndarray, confidences: np.ndarray,
+                 normalized_areas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estimated grams and size category index for each detection
+        """
+        class_ids = self.valid_ids(class_ids)
+        size_index = np.searchsorted(SIZE_BOUNDS, normalized_areas, side='right')
+        grams = (
+            self.base_weight[class_ids]
+            * SIZE_MULTIPLIERS[size_index]
+            * (CONF_BASE + CONF_SCALE * confidences)
+        )
+        return grams, size_index
+
+    def compute(self, class_ids: np.ndarray, confidences: np.ndarray, boxes: np.ndarray,
+                image_areas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Grams (n,) and nutrients (n, 4) for n detections
+        boxes are (n, 4) xyxy in the same pixel space as image_areas
+        """
+        class_ids = self.valid_ids(class_ids)
+        widths = np.clip(boxes[:, 2] - boxes[:, 0], 0, None)
+        heights = np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+        grams, _ = self.portions(class_ids, confidences, widths * heights / image_areas)
+        nutrients = self.nutrition[class_ids] * (grams[:, None] / 100)
+        return grams, nutrients
+
+    def calculate_meals(self, meals: Sequence[Meal]) -> List[Dict[str, Any]]:
+        """
+        calculate_calories for many meals at once: one flattened pass over all detections
+        Portions use PORTION_CONFIDENCE, as the scalar calculate_calories did; the detection's
+        own confidence is only reported
+        """
+        detections = [d for meal_detections, _, _ in meals for d in meal_detections]
+        counts = np.array([len(meal_detections) for meal_detections, _, _ in meals], dtype=np.intp)
+        meal_index = np.repeat(np.arange(len(meals)), counts)
+
+        if detections:
+            class_ids = self.detection_ids(detections)
+            confidences = np.full(len(detections), PORTION_CONFIDENCE)
+            boxes = np.array([d["bbox"] for d in detections], dtype=np.float64).reshape(-1, 4)
+            image_areas = np.array([w * h for _, w, h in meals], dtype=np.float64)[meal_index]
+            grams, nutrients = self.compute(class_ids, confidences, boxes, image_areas)
+        else:
+            grams = np.zeros(0)
+            nutrients = np.zeros((0, len(NUTRIENT_KEYS)))
+
+        totals = np.zeros((len(meals), len(NUTRIENT_KEYS)))
+        np.add.at(totals, meal_index, nutrients)
+
+        # Round once for all items, then build the response dicts
+        grams_out = np.round(grams, 1).tolist()
+        nutrients_out = np.round(nutrients, 1).tolist()
+        totals_out = np.round(totals, 1).tolist()
+
+        results = []
+        offset = 0
+        for meal_number, count in enumerate(counts.tolist()):
+            food_items = []
+            for i in range(offset, offset + count):
+                detection = detections[i]
+                calories, protein, carbs, fat = nutrients_out[i]
+                food_items.append({
+                    "food_name": detection["class_name"],
+                    "portion_grams": grams_out[i],
+                    "calories": calories,
+                    "protein": protein,
+                    "carbs": carbs,
+                    "fat": fat,
+                    "confidence": round(detection["confidence"], 2),
+                    "bbox": detection["bbox"]
+                })
+            offset += count
+
+            total_calories, total_protein, total_carbs, total_fat = totals_out[meal_number]
+            results.append({
+                "total_calories": total_calories,
+                "total_macros": {
+                    "protein": total_protein,
+                    "carbs": total_carbs,
+                    "fat": total_fat
+                },
+                "food_items": food_items
+            })
+
+        return results
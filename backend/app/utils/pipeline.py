@@ -0,0 +1,67 @@
+import time
+from typing import Dict, Any
+from app.utils.batch_scheduler import batch_scheduler
+from app.utils.calorie_calculator import calculate_calories, get_nutrition_snapshot
+from app.utils.executor import inference_executor
+from app.utils.image_processor import ingest_image, scale_detections_to_original
+from app.utils.model_registry import model_registry
+from app.utils.prediction_cache import prediction_cache
+from app.utils.timing import record_stage, set_timing_labels, timed_stage
+
+async def run_prediction_pipeline(image_data: bytes, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Decode -> detect -> calorie calculation for one uploaded image
+    Returns the /api/predict response body (without persisting it)
+    Repeated uploads of the same bytes are served from the prediction cache
+    (use_cache=False for frames that never repeat, like live camera frames)
+    """
+    # Pin the nutrition snapshot for the whole request; reloads don't affect it
+    snapshot = get_nutrition_snapshot()
+    # The result is cached under the versions pinned here, not whatever is current later
+    versions = (model_registry.model_version, snapshot.version)
+    
+    cache_key = None
+    if use_cache and prediction_cache.enabled:
+        with timed_stage("cache"):
+            cache_key = await inference_executor.run(prediction_cache.make_key, image_data, versions)
+            cached = await prediction_cache.get(cache_key)
+        if cached is not None:
+            image_info = cached.get("image_info", {})
+            set_timing_labels(model_registry.model_version, image_info.get("width"), image_info.get("height"))
+            return cached
+    
+    # Decode and letterbox on the executor, not the event loop
+    started = time.perf_counter()
+    ingested = await inference_executor.run(ingest_image, image_data)
+    record_stage("decode", ingested.decode_seconds)
+    record_stage("preprocess", time.perf_counter() - started - ingested.decode_seconds)
+    set_timing_labels(model_registry.model_version, ingested.width, ingested.height)
+    
+    # Detect food items using YOLO (batched with other in-flight requests)
+    with timed_stage("inference"):
+        detections = await batch_scheduler.submit(ingested.frame)
+    detections = scale_detections_to_original(detections, ingested)
+    
+    # Calculate calories and macros against the original image size
+    with timed_stage("nutrition"):
+        results = await inference_executor.run(
+            calculate_calories, detections, ingested.width, ingested.height, snapshot
+        )
+    
+    response_data = {
+        "success": True,
+        "total_calories": results["total_calories"],
+        "total_macros": results["total_macros"],
+        "detected_foods": results["food_items"],
+        "image_info": {
+            "width": ingested.width,
+            "height": ingested.height,
+            "format": ingested.format
+        },
+        "nutrition_version": snapshot.version
+    }
+    
+    if cache_key is not None:
+        await prediction_cache.set(cache_key, response_data, versions)
+    
+    return response_data
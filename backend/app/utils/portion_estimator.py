@@ -1,7 +1,8 @@
-from ultralytics import YOLO
-from PIL import Image
 import json
 import os
+import numpy as np
+from app.utils.model_registry import model_registry
+from app.utils.nutrition_engine import SIZE_LABELS
 
 # ============================================================================
 # FOOD DATABASE - Average Weight (grams)
@@ -99,35 +100,27 @@ def calculate_grams_from_detection(food_name, confidence, bbox_area, img_width,
         Dictionary with gram estimate
     """
     
+    from app.utils.calorie_calculator import get_nutrition_engine
+    
     # Normalize area
     total_area = img_width * img_height
     normalized_area = bbox_area / total_area
     
-    # Size multiplier based on normalized area
-    if normalized_area < 0.10:
-        multiplier = 0.6
-        size = "small"
-    elif normalized_area < 0.30:
-        multiplier = 1.0
-        size = "medium"
-    else:
-        multiplier = 1.4
-        size = "large"
-    
-    # Confidence multiplier (80% to 120% based on confidence)
-    conf_multiplier = 0.8 + (confidence * 0.4)
-    
-    # Get base weight from database
-    base_weight = FOOD_DATABASE.get(food_name.lower().strip(), 100)
-    
-    # Calculate estimated grams
-    estimated_grams = base_weight * multiplier * conf_multiplier
+    # Base weight x size multiplier (small/medium/large by normalized area)
+    # x confidence multiplier (80% to 120%), from the shared portion tables
+    engine = get_nutrition_engine()
+    grams, size_index = engine.portions(
+        np.array([engine.lookup_id(food_name)]),
+        np.array([confidence]),
+        np.array([normalized_area])
+    )
+    estimated_grams = float(grams[0])
     
     return {
         "food_name": food_name,
         "confidence": round(confidence, 4),
         "estimated_grams": round(estimated_grams, 1),
-        "size_category": size,
+        "size_category": SIZE_LABELS[int(size_index[0])],
         "normalized_area": round(normalized_area, 4)
     }
 
@@ -166,17 +159,18 @@ def process_food_image(image_path, model_path=None):
     
     print(f"Loading model from: {model_path}")
     
-    # Load YOLO model
-    model = YOLO(model_path)
+    # Shared YOLO model (loaded once per process)
+    model = model_registry.get_model(model_path)
+    if model is None:
+        raise RuntimeError(f"Failed to load YOLO model from: {model_path}")
     
     # Run detection
     print(f"Processing image: {image_path}")
     results = model.predict(source=image_path, conf=0.25, verbose=False)
     result = results[0]
     
-    # Get image dimensions
-    image = Image.open(image_path)
-    img_width, img_height = image.size
+    # Image dimensions come with the result, so the image is not opened a second time
+    img_height, img_width = result.orig_shape[:2]
     
     # Convert each detection to grams
     gram_results = []
@@ -238,21 +232,19 @@ def process_food_image(image_path, model_path=None):
 # ============================================================================
 
 if __name__ == "__main__":
-    # Example usage
+    # Example usage: python -m app.utils.portion_estimator [image ...]
+    # For whole folders or archives use the bulk CLI: python -m app.utils.bulk_process <dir> --output results.jsonl
+    import sys
     
     try:
         # Method 1: Auto-find model
-        result = process_food_image("test_images/dosa.jpg")
+        for image_path in sys.argv[1:] or ["test_images/dosa.jpg"]:
+            result = process_food_image(image_path)
+            print(json.dumps(result, indent=2))
         
         # Method 2: Specify model path (uncomment if auto-find fails)
         # result = process_food_image(test_image, model_path=r"C:\path\to\best.pt")
         
-        # Print results
-        print("\n" + "="*60)
-        print("PORTION ESTIMATION RESULTS")
-        print("="*60)
-        print(json.dumps(result, indent=2))
-        
     except FileNotFoundError as e:
         print(f"❌ Error: {e}")
     except Exception as e:
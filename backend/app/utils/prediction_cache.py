@@ -0,0 +1,202 @@
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.database.connection import get_database, report_db_error
+from app.utils.calorie_calculator import get_nutrition_version
+from app.utils.metrics import metrics
+from app.utils.model_registry import model_registry
+
+CACHE_HITS = metrics.counter(
+    "prediction_cache_hits_total", "Prediction cache hits", labelnames=("tier",)
+)
+CACHE_MISSES = metrics.counter(
+    "prediction_cache_misses_total", "Prediction cache misses"
+)
+CACHE_EVICTIONS = metrics.counter(
+    "prediction_cache_evictions_total", "Prediction cache evictions", labelnames=("reason",)
+)
+CACHE_ENTRIES = metrics.gauge(
+    "prediction_cache_entries", "Entries in the in-process prediction cache"
+)
+
+def current_versions() -> Tuple[str, str]:
+    """(model version, nutrition table version) that cached results depend on"""
+    return model_registry.model_version, get_nutrition_version()
+
+class PredictionCache:
+    """
+    Content-addressed cache of prediction responses
+    Keys are a hash of the uploaded bytes plus the model and nutrition-table versions.
+    An in-process LRU (size and TTL bounded) sits in front of an optional shared
+    tier stored in the MongoDB `prediction_cache` collection.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 use_mongo: Optional[bool] = None,
+                 version_fn: Callable[[], Tuple[str, str]] = current_versions,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("PREDICTION_CACHE_SIZE", 1024))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("PREDICTION_CACHE_TTL", 3600))
+        if use_mongo is None:
+            use_mongo = os.getenv("PREDICTION_CACHE_MONGO", "False").lower() == "true"
+        self.use_mongo = use_mongo
+        self.version_fn = version_fn
+        self.clock = clock
+        # key -> (expires_at, response)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions: Optional[Tuple[str, str]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def make_key(self, image_data: bytes, versions: Optional[Tuple[str, str]] = None) -> str:
+        """
+        Cache key for an upload; also drops local entries if the model or nutrition table changed
+        versions: the (model, nutrition) versions the result is computed with, when the caller
+        pinned them earlier; a reload since then must not put the old result under the new key
+        """
+        current = self.version_fn()
+        self._check_versions(current)
+        model_version, nutrition_version = versions or current
+        digest = hashlib.sha256(image_data).hexdigest()
+        return f"{digest}:{model_version}:{nutrition_version}"
+
+    def _check_versions(self, versions: Tuple[str, str]) -> None:
+        with self._lock:
+            if self._versions is not None and versions != self._versions and self._entries:
+                CACHE_EVICTIONS.inc(len(self._entries), reason="invalidated")
+                self._entries.clear()
+                CACHE_ENTRIES.set(0)
+            self._versions = versions
+
+    def get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                CACHE_EVICTIONS.inc(reason="ttl")
+                CACHE_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set_local(self, key: str, response: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(reason="size")
+            CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            CACHE_ENTRIES.set(0)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response (local tier first, then MongoDB); returns a copy
+        """
+        if not self.enabled:
+            return None
+
+        response = self.get_local(key)
+        if response is not None:
+            CACHE_HITS.inc(tier="memory")
+            return copy.deepcopy(response)
+
+        if self.use_mongo:
+            response = await self._get_shared(key)
+            if response is not None:
+                CACHE_HITS.inc(tier="mongo")
+                self.set_local(key, response)
+                return copy.deepcopy(response)
+
+        CACHE_MISSES.inc()
+        return None
+
+    async def set(self, key: str, response: Dict[str, Any], versions: Optional[Tuple[str, str]] = None) -> None:
+        """
+        Store a response under key; versions are the ones the key was made with (see make_key),
+        so the shared entry is tagged, and later invalidated, by what the result was computed with
+        """
+        if not self.enabled:
+            return
+        response = copy.deepcopy(response)
+        self.set_local(key, response)
+        if self.use_mongo:
+            await self._set_shared(key, response, versions)
+
+    async def _get_shared(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            db = await get_database()
+            if db is None:
+                return None
+            document = await db.prediction_cache.find_one({"_id": key}, {"response": 1})
+            return document["response"] if document else None
+        except Exception as e:
+            print(f"Prediction cache lookup failed: {e}")
+            report_db_error(e)
+            return None
+
+    async def _set_shared(self, key: str, response: Dict[str, Any],
+                          versions: Optional[Tuple[str, str]] = None) -> None:
+        try:
+            db = await get_database()
+            if db is None:
+                return
+            model_version, nutrition_version = versions or self.version_fn()
+            await db.prediction_cache.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "response": response,
+                    "model_version": model_version,
+                    "nutrition_version": nutrition_version,
+                    "created_at": datetime.utcnow(),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Prediction cache store failed: {e}")
+            report_db_error(e)
+
+    async def init_storage(self) -> None:
+        """
+        Create the TTL index for the shared tier and drop entries from older versions
+        """
+        if not (self.enabled and self.use_mongo):
+            return
+        try:
+            db = await get_database()
+            if db is None:
+                return
+            await db.prediction_cache.create_index("created_at", expireAfterSeconds=int(self.ttl_seconds))
+            model_version, nutrition_version = self.version_fn()
+            result = await db.prediction_cache.delete_many({
+                "$or": [
+                    {"model_version": {"$ne": model_version}},
+                    {"nutrition_version": {"$ne": nutrition_version}},
+                ]
+            })
+            if result.deleted_count:
+                CACHE_EVICTIONS.inc(result.deleted_count, reason="invalidated")
+        except Exception as e:
+            print(f"Failed to initialize prediction cache collection: {e}")
+            report_db_error(e)
+
+prediction_cache = PredictionCache()
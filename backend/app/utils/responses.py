@@ -0,0 +1,104 @@
+"""
+Response serialization: orjson for JSON, MessagePack for clients that ask for it
+
+Prediction bodies are plain dicts shaped like the schemas in app.models.schemas. They are
+encoded straight to bytes with orjson (about 8x faster than the standard json module used by
+JSONResponse). Clients that send `Accept: application/msgpack` get the same body as
+MessagePack instead, with floats packed as doubles so they decode to exactly the numbers
+JSON clients see.
+
+    RESPONSE_VALIDATION=1   validate prediction bodies against their schema before sending
+                            (catches drift between the pipeline and the schemas; off by default)
+
+Without orjson the standard json module is used; without msgpack every client gets JSON.
+"""
+import json
+import os
+from typing import Any, Dict, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+RESPONSE_VALIDATION = os.getenv("RESPONSE_VALIDATION", "0") == "1"
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ALIASES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+# Documents the alternative body for routes that negotiate it
+MSGPACK_RESPONSES = {200: {"content": {MSGPACK_MEDIA_TYPE: {}}}}
+
+def dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def packb(data: Any) -> bytes:
+    return msgpack.packb(data, default=str)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; the app's default response class"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+def preferred_media_type(accept: Optional[str]) -> str:
+    """
+    JSON or MessagePack for an Accept header: the supported type with the highest q wins,
+    JSON on ties and for wildcards
+    """
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    best, best_q = JSON_MEDIA_TYPE, -1.0
+    for entry in accept.split(","):
+        media_type, *params = [part.strip() for part in entry.split(";")]
+        media_type = media_type.lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        if media_type in MSGPACK_ALIASES:
+            candidate = MSGPACK_MEDIA_TYPE
+        elif media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            candidate = JSON_MEDIA_TYPE
+        else:
+            continue
+        if q > best_q or (q == best_q and candidate == JSON_MEDIA_TYPE):
+            best, best_q = candidate, q
+    return best
+
+def negotiated_response(request: Request, content: Any, schema: Optional[Type[BaseModel]] = None,
+                        headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Response in the format the client asked for (JSON unless it accepts MessagePack)
+    With RESPONSE_VALIDATION=1 the body is checked against schema first
+    """
+    if schema is not None and RESPONSE_VALIDATION:
+        schema.model_validate(content)
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if preferred_media_type(request.headers.get("accept")) == MSGPACK_MEDIA_TYPE:
+        return MsgPackResponse(content=content, headers=headers)
+    return FastJSONResponse(content=content, headers=headers)
@@ -0,0 +1,93 @@
+"""
+Cold-start tracking and background preloading
+
+Heavy runtime modules (cv2, PIL) are not imported when the app is imported; preload()
+pulls them in, together with the compiled nutrition tables, from the model registry's
+background startup, so neither the import of app.main nor the first request pays for them.
+
+StartupReport records when each startup phase finished, in seconds since the process
+was started, and prints one summary line once the server is both serving and ready.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.utils.metrics import metrics
+
+STARTUP_SECONDS = metrics.gauge(
+    "startup_seconds", "Seconds from process start until each startup phase finished",
+    labelnames=("phase",),
+)
+
+def process_start_time() -> float:
+    """Wall-clock start of this process (Linux /proc), or now when unavailable"""
+    try:
+        with open("/proc/self/stat", 'r') as file:
+            # Field 22 is the start time in clock ticks since boot; the command name
+            # (field 2) may contain spaces, so split after its closing parenthesis
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        running_for = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - running_for
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+class StartupReport:
+    # Phases that must all be done before the process counts as ready
+    READY_PHASES = ("serving", "model_ready")
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at or process_start_time()
+        self.phases: Dict[str, float] = {}
+        self.preload: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> None:
+        elapsed = round(time.time() - self.started_at, 3)
+        with self._lock:
+            if phase in self.phases:
+                return
+            self.phases[phase] = elapsed
+            STARTUP_SECONDS.set(elapsed, phase=phase)
+            became_ready = "ready" not in self.phases and all(p in self.phases for p in self.READY_PHASES)
+            if became_ready:
+                self.phases["ready"] = elapsed
+                STARTUP_SECONDS.set(elapsed, phase="ready")
+        if became_ready:
+            steps = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+            print(f"Startup report: {steps}")
+
+    def restart(self) -> None:
+        """A forked worker reports its own startup, measured from the fork"""
+        with self._lock:
+            self.started_at = time.time()
+            self.phases.clear()
+        self.mark("forked")
+
+    def info(self) -> Dict[str, Any]:
+        return {"phases": dict(self.phases), "preload": dict(self.preload)}
+
+startup_report = StartupReport()
+startup_report.mark("interpreter")
+
+def preload() -> None:
+    """
+    Import the modules the request path needs lazily and build the nutrition snapshot
+    Runs in the registry's startup thread (and in every inference worker process)
+    """
+    def timed(step: str, fn) -> None:
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"Preloading {step} failed: {e}")
+        startup_report.preload[step] = round(time.perf_counter() - started, 4)
+
+    timed("cv2", lambda: __import__("cv2"))
+    timed("PIL", lambda: __import__("PIL.Image"))
+
+    def nutrition() -> None:
+        from app.utils.calorie_calculator import nutrition_store
+        nutrition_store.current()
+    timed("nutrition", nutrition)
+    startup_report.mark("preloaded")
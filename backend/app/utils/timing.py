@@ -0,0 +1,86 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    "prediction_stage_seconds", "Time spent in each stage of a prediction request",
+    labelnames=("stage", "model_version", "image_size"),
+)
+
+# Megapixel buckets for the image_size label (keeps label cardinality fixed)
+IMAGE_SIZE_BUCKETS = ((0.5e6, "small"), (2e6, "medium"), (8e6, "large"))
+
+def image_size_label(width: Optional[int], height: Optional[int]) -> str:
+    if not width or not height:
+        return "unknown"
+    pixels = width * height
+    for limit, label in IMAGE_SIZE_BUCKETS:
+        if pixels <= limit:
+            return label
+    return "xlarge"
+
+class RequestTiming:
+    """
+    Stage durations of one request
+    Reported as a Server-Timing header and, once the request is done, as
+    prediction_stage_seconds observations.
+    """
+
+    __slots__ = ("stages", "labels")
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+        self.labels: Dict[str, str] = {"model_version": "unknown", "image_size": "unknown"}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+
+    def header(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages)
+
+    def observe(self) -> None:
+        for stage, seconds in self.stages:
+            STAGE_SECONDS.observe(seconds, stage=stage, **self.labels)
+
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current_timing.get()
+
+@contextmanager
+def request_timing() -> Iterator[RequestTiming]:
+    """Collect stage timings for the code in the block (and everything it awaits)"""
+    timing = RequestTiming()
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+        timing.observe()
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Time a stage of the current request; a no-op outside request_timing()"""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(stage, time.perf_counter() - started)
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add a stage measured elsewhere (e.g. inside an executor thread)"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(stage, seconds)
+
+def set_timing_labels(model_version: str, width: Optional[int], height: Optional[int]) -> None:
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.labels = {"model_version": model_version, "image_size": image_size_label(width, height)}
@@ -0,0 +1,273 @@
+"""
+Size-bounded upload ingestion with early rejection
+
+Uploads are read in chunks and their format and dimensions are sniffed from the header
+bytes before the rest is buffered, so oversized bodies, unsupported formats and
+decompression bombs (small files that decode to a huge bitmap) never reach a full decode:
+
+    UPLOAD_MAX_BYTES         bytes of one image (default 20 MB)
+    UPLOAD_MAX_PIXELS        width x height after decoding (default 50 MP)
+    UPLOAD_MAX_SIDE          longest side in pixels (default 12000)
+    UPLOAD_MIN_SIDE          shortest side in pixels (default 16)
+    UPLOAD_MAX_BATCH_BYTES   whole /api/predict/batch request, zip archives included (default 256 MB)
+    UPLOAD_MAX_VIDEO_BYTES   one video for /api/predict/clip (default 100 MB)
+
+UploadLimitMiddleware enforces the request-level limits while the body is still being
+received, before the multipart form is parsed. Every rejection is counted in
+upload_rejections_total{reason}.
+"""
+import json
+import os
+import struct
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 20 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", 50_000_000))
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", 12000))
+UPLOAD_MIN_SIDE = int(os.getenv("UPLOAD_MIN_SIDE", 16))
+UPLOAD_MAX_BATCH_BYTES = int(os.getenv("UPLOAD_MAX_BATCH_BYTES", 256 * 1024 * 1024))
+UPLOAD_MAX_VIDEO_BYTES = int(os.getenv("UPLOAD_MAX_VIDEO_BYTES", 100 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# JPEG metadata (EXIF thumbnails, ICC profiles) can push the size marker far into the file;
+# past this many bytes the dimensions are left to PIL's header parse in ingest_image
+SNIFF_MAX_BYTES = 512 * 1024
+# Multipart boundaries and part headers around the single file of /api/predict
+MULTIPART_OVERHEAD = 64 * 1024
+
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WEBP", "BMP")
+
+# HTTP status per rejection reason
+REJECTION_STATUS = {
+    "too_large": 413,
+    "too_many_pixels": 413,
+    "too_many_items": 413,
+    "unsupported_format": 415,
+    "bad_dimensions": 400,
+    "malformed": 400,
+}
+
+UPLOAD_REJECTIONS = metrics.counter(
+    "upload_rejections_total", "Uploads rejected before or during decoding", labelnames=("reason",)
+)
+
+class UploadRejected(ValueError):
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = REJECTION_STATUS[reason]
+
+def reject(reason: str, message: str) -> UploadRejected:
+    """Count a rejection and build the exception to raise"""
+    UPLOAD_REJECTIONS.inc(reason=reason)
+    return UploadRejected(reason, message)
+
+class ImageHeader(NamedTuple):
+    format: str
+    width: Optional[int]    # None when the header was too long to sniff
+    height: Optional[int]
+
+def _sniff_jpeg(data: bytes) -> Optional[Tuple[int, int]]:
+    # Walk the marker segments up to the first start-of-frame, which holds the size
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise reject("malformed", "Corrupt JPEG header")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without a length
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            raise reject("malformed", "JPEG has no frame header")
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+def _sniff_webp(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8X":
+        if len(data) < 30:
+            return None
+        return (int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1)
+    if chunk == b"VP8 ":
+        if len(data) < 30:
+            return None
+        if data[23:26] != b"\x9d\x01\x2a":
+            raise reject("malformed", "Corrupt WebP header")
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        if len(data) < 25:
+            return None
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    raise reject("malformed", "Corrupt WebP header")
+
+def sniff_image(data: bytes, complete: bool = True) -> Optional[ImageHeader]:
+    """
+    Format and dimensions from the first bytes of an image, without decoding it
+    Returns None while more bytes are needed (complete=False); raises UploadRejected
+    for formats outside SUPPORTED_FORMATS and for corrupt headers.
+    """
+    size = None
+    image_format = None
+    if data[:2] == b"\xff\xd8":
+        image_format = "JPEG"
+        size = _sniff_jpeg(data)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n":
+        image_format = "PNG"
+        if len(data) >= 24:
+            if data[12:16] != b"IHDR":
+                raise reject("malformed", "Corrupt PNG header")
+            size = struct.unpack(">II", data[16:24])
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        image_format = "WEBP"
+        if len(data) >= 16:
+            size = _sniff_webp(data)
+    elif data[:2] == b"BM":
+        image_format = "BMP"
+        if len(data) >= 26:
+            if struct.unpack("<I", data[14:18])[0] == 12:  # OS/2 core header
+                size = struct.unpack("<HH", data[18:22])
+            else:
+                width, height = struct.unpack("<ii", data[18:26])
+                size = (abs(width), abs(height))  # negative height means top-down rows
+    elif len(data) >= 12:
+        raise reject("unsupported_format", f"Unsupported image format; expected one of {', '.join(SUPPORTED_FORMATS)}")
+
+    if size is not None:
+        return ImageHeader(image_format, int(size[0]), int(size[1]))
+    if image_format is not None and len(data) >= SNIFF_MAX_BYTES:
+        return ImageHeader(image_format, None, None)
+    if complete:
+        raise reject("malformed", "Image is truncated or not an image")
+    return None
+
+def limit_violation(image_format: Optional[str], width: Optional[int], height: Optional[int]) -> Optional[Tuple[str, str]]:
+    """(reason, message) when an image breaks the upload limits, else None"""
+    if image_format not in SUPPORTED_FORMATS:
+        return "unsupported_format", f"Unsupported image format {image_format}"
+    if width is None or height is None:
+        return None
+    if width * height > UPLOAD_MAX_PIXELS:
+        return "too_many_pixels", (f"Image is {width}x{height}; at most {UPLOAD_MAX_PIXELS / 1e6:g} "
+                                   f"megapixels are accepted")
+    if max(width, height) > UPLOAD_MAX_SIDE or min(width, height) < UPLOAD_MIN_SIDE:
+        return "bad_dimensions", (f"Image is {width}x{height}; sides must be between "
+                                  f"{UPLOAD_MIN_SIDE} and {UPLOAD_MAX_SIDE} pixels")
+    return None
+
+def check_image(image_format: Optional[str], width: Optional[int], height: Optional[int]) -> None:
+    violation = limit_violation(image_format, width, height)
+    if violation is not None:
+        raise reject(*violation)
+
+def inspect_image(data: bytes) -> ImageHeader:
+    """Sniff and check an image that is already in memory (batch items, zip members)"""
+    if len(data) > UPLOAD_MAX_BYTES:
+        raise reject("too_large", f"Image is larger than {UPLOAD_MAX_BYTES} bytes")
+    header = sniff_image(data)
+    check_image(*header)
+    return header
+
+async def read_upload(upload: Any, max_bytes: Optional[int] = None, sniff: bool = True) -> bytes:
+    """
+    Read an UploadFile in chunks, up to max_bytes (UPLOAD_MAX_BYTES)
+    With sniff, the header is checked as soon as it has arrived, before the rest is read
+    """
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    # Starlette has already spooled the part and knows its size
+    size = getattr(upload, "size", None)
+    if size is not None and size > max_bytes:
+        raise reject("too_large", f"Upload is larger than {max_bytes} bytes")
+
+    chunks = []
+    received = 0
+    header = None
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        received += len(chunk)
+        if received > max_bytes:
+            raise reject("too_large", f"Upload is larger than {max_bytes} bytes")
+        chunks.append(chunk)
+        if sniff and header is None:
+            header = sniff_image(b"".join(chunks), complete=False)
+            if header is not None:
+                check_image(*header)
+
+    data = b"".join(chunks)
+    if sniff and header is None:
+        check_image(*sniff_image(data))
+    return data
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies per path while they are received
+    A Content-Length over the limit is answered with 413 before reading anything;
+    chunked bodies are counted and cut off as soon as they pass the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await self._reject(send, limit)
+                    # The form parser sees a disconnect and stops reading
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # Whatever the app answers after the 413 is dropped
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    async def _reject(self, send, limit: int) -> None:
+        UPLOAD_REJECTIONS.inc(reason="too_large")
+        body = json.dumps({"detail": f"Request body is larger than {limit} bytes"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
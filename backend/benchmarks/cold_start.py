@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long until a fresh server answers
+
+    python -m benchmarks.cold_start [--runs 5] [--importtime]
+
+Each run starts `uvicorn app.main:app` in a new process and measures, from the moment
+the process is spawned:
+
+    listening         first TCP connection accepted
+    ready             /health returns 200 (model loaded and warmed up, or mock)
+    first_prediction  first POST /api/predict answered
+
+The server's own startup report (/health "startup") is saved alongside. --importtime
+also lists the slowest imports of app.main (python -X importtime).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.images import encode_jpeg, synthetic_photo
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(check, deadline: float, interval: float = 0.01) -> Optional[float]:
+    while time.perf_counter() < deadline:
+        if check():
+            return time.perf_counter()
+        time.sleep(interval)
+    return None
+
+def cold_start_run(image: bytes, timeout: float) -> Dict[str, Any]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "NUTRITION_WATCH_INTERVAL": "0", "MONGODB_RECONNECT_INTERVAL": "0"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = started + timeout
+    result: Dict[str, Any] = {}
+    try:
+        def listening() -> bool:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                return True
+            except OSError:
+                return process.poll() is not None
+
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            def ready() -> bool:
+                try:
+                    return client.get("/health").status_code == 200
+                except httpx.HTTPError:
+                    return False
+
+            at = wait_for(listening, deadline)
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            result["listening"] = at and round(at - started, 3)
+            at = wait_for(ready, deadline)
+            result["ready"] = at and round(at - started, 3)
+            if at is not None:
+                response = client.post("/api/predict", files={"file": ("meal.jpg", image, "image/jpeg")})
+                response.raise_for_status()
+                result["first_prediction"] = round(time.perf_counter() - started, 3)
+                result["server_report"] = client.get("/health").json().get("startup")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+def slowest_imports(limit: int) -> List[Dict[str, Any]]:
+    """Self time of the slowest modules imported by app.main"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    ).stderr
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        entries.append({"module": module.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    total = next((entry["cumulative_ms"] for entry in entries if entry["module"] == "app.main"), None)
+    print(f"import app.main: {total} ms")
+    entries.sort(key=lambda entry: -entry["self_ms"])
+    for entry in entries[:limit]:
+        print(f"  {entry['self_ms']:>8.1f} ms  {entry['module']}")
+    return entries[:limit]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure server cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/cold-start-<time>.json)")
+    args = parser.parse_args(argv)
+
+    image = encode_jpeg(synthetic_photo(1280, 960))
+    runs = []
+    for i in range(args.runs):
+        runs.append(cold_start_run(image, args.timeout))
+        print(f"run {i + 1}: " + ", ".join(
+            f"{key} {value:.2f}s" for key, value in runs[-1].items() if isinstance(value, float)
+        ))
+
+    summary = {}
+    for key in ("listening", "ready", "first_prediction"):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if values:
+            summary[key] = {"median_s": round(float(np.median(values)), 3), "max_s": round(max(values), 3)}
+    print("median: " + ", ".join(f"{key} {value['median_s']:.2f}s" for key, value in summary.items()))
+
+    report = {
+        "meta": {"timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z", "runs": args.runs},
+        "summary": summary,
+        "runs": runs,
+    }
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(15)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"cold-start-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the full and compact prediction document formats
+
+    python -m benchmarks.compact_storage [--documents 5000] [--seed 0]
+
+Reports average BSON size and documents per second for BSON encode, BSON decode, and a
+full read (decode plus, for the compact format, rebuilding the response).
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime
+
+import bson
+
+from app.database.compact import compact_document, stored_prediction
+from app.utils.calorie_calculator import calculate_calories, get_nutrition_engine, get_nutrition_version
+
+def synthetic_response(rng: random.Random, class_names):
+    width, height = rng.choice([(640, 480), (1280, 960), (4032, 3024)])
+    detections = []
+    for _ in range(rng.randint(1, 8)):
+        x1, y1 = rng.randrange(width // 2), rng.randrange(height // 2)
+        detections.append({
+            "class_name": rng.choice(class_names),
+            "confidence": rng.uniform(0.25, 0.99),
+            "bbox": [x1, y1, x1 + rng.randrange(20, width // 2), y1 + rng.randrange(20, height // 2)],
+        })
+    results = calculate_calories(detections, width, height)
+    return {
+        "success": True,
+        "total_calories": results["total_calories"],
+        "total_macros": results["total_macros"],
+        "detected_foods": results["food_items"],
+        "image_info": {"width": width, "height": height, "format": "JPEG"},
+        "nutrition_version": get_nutrition_version(),
+    }
+
+def measure(label, documents, read):
+    encoded = [bson.encode(document) for document in documents]
+
+    started = time.perf_counter()
+    for document in documents:
+        bson.encode(document)
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in encoded:
+        bson.decode(raw)
+    decode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in encoded:
+        read(bson.decode(raw))
+    read_seconds = time.perf_counter() - started
+
+    count = len(documents)
+    average_size = sum(len(raw) for raw in encoded) / count
+    print(f"{label:<8} {average_size:>10.0f} {count / encode_seconds:>14.0f} "
+          f"{count / decode_seconds:>14.0f} {count / read_seconds:>12.0f}")
+    return average_size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    class_names = get_nutrition_engine().class_names
+    full = [
+        {
+            "prediction_id": str(uuid.uuid4()),
+            "timestamp": datetime.utcnow(),
+            "user_id": "anonymous",
+            "prediction_data": synthetic_response(rng, class_names),
+        }
+        for _ in range(args.documents)
+    ]
+    compact = [compact_document(document) for document in full]
+
+    print(f"{args.documents} documents")
+    print(f"{'format':<8} {'bytes/doc':>10} {'encode doc/s':>14} {'decode doc/s':>14} {'read doc/s':>12}")
+    full_size = measure("full", full, stored_prediction)
+    compact_size = measure("compact", compact, stored_prediction)
+    print(f"compact documents are {100 * (1 - compact_size / full_size):.0f}% smaller")
+
+if __name__ == "__main__":
+    main()
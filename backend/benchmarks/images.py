@@ -0,0 +1,22 @@
+"""Synthetic meal photos for the benchmarks (no image files needed)"""
+import io
+
+import numpy as np
+from PIL import Image
+
+def synthetic_photo(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Smooth gradients plus noise: compresses and decodes roughly like a real photo"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        128 + 100 * np.sin(x / (37 + seed)),
+        128 + 100 * np.cos(y / 53),
+        128 + 100 * np.sin((x + y) / 71),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+
+def encode_jpeg(image: Image.Image, quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
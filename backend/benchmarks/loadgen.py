@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Load generator for a running server (run.py / uvicorn)
+
+    python -m benchmarks.loadgen --concurrency 8 --duration 30
+    python -m benchmarks.loadgen --rate 20 --duration 30
+    python -m benchmarks.loadgen --sweep 1,2,4,8,16,32 --sizes 640x480,1280x960,4032x3024
+
+Sends synthetic meal photos to POST /api/predict and records the latency distribution,
+error rate and achieved throughput.
+
+--concurrency   closed loop: N clients, each sends its next request when the last one returns
+--rate          open loop: requests are started at a fixed rate whatever the response times;
+                latency counts from the scheduled start, so a backed-up server is not hidden
+--sweep         closed loop at each concurrency level, then reports the saturation point:
+                the level after which more clients stop buying throughput
+
+Every upload gets a few random trailing bytes so the prediction cache never short-circuits
+it (--cacheable turns that off). Results are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.images import encode_jpeg, synthetic_photo
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+class ImagePool:
+    """Pre-encoded JPEGs per size; picking one is free during the run"""
+
+    def __init__(self, sizes: List[Tuple[int, int]], variants: int, cacheable: bool):
+        self.images = [
+            (f"{width}x{height}", encode_jpeg(synthetic_photo(width, height, seed)))
+            for width, height in sizes for seed in range(variants)
+        ]
+        self.cacheable = cacheable
+
+    def pick(self) -> Tuple[str, bytes]:
+        size, data = random.choice(self.images)
+        if not self.cacheable:
+            # Decoders ignore data after the JPEG end marker, the cache key (sha256) does not
+            data += os.urandom(8)
+        return size, data
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.by_size: Dict[str, List[float]] = {}
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.server_stages: Dict[str, List[float]] = {}
+
+    def record(self, size: str, seconds: float, response: Optional[httpx.Response], error: Optional[Exception]) -> None:
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+            return
+        self.statuses[response.status_code] += 1
+        if response.status_code != 200:
+            return
+        self.latencies.append(seconds)
+        self.by_size.setdefault(size, []).append(seconds)
+        for stage, duration in parse_server_timing(response.headers.get("server-timing", "")):
+            self.server_stages.setdefault(stage, []).append(duration)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        total = sum(self.statuses.values()) + sum(self.errors.values())
+        failed = total - len(self.latencies)
+        return {
+            "requests": total,
+            "ok": len(self.latencies),
+            "error_rate": round(failed / total, 4) if total else 0.0,
+            "throughput_per_s": round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency": latency_stats(self.latencies),
+            "latency_by_size": {size: latency_stats(values) for size, values in sorted(self.by_size.items())},
+            "statuses": {str(code): count for code, count in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            # Server-Timing: where the server spent the time (mean ms per stage)
+            "server_stages_ms": {
+                stage: round(float(np.mean(values)), 2) for stage, values in self.server_stages.items()
+            },
+        }
+
+def parse_server_timing(header: str) -> List[Tuple[str, float]]:
+    stages = []
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        if params.startswith("dur="):
+            try:
+                stages.append((name, float(params[4:])))
+            except ValueError:
+                pass
+    return stages
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    samples = np.array(latencies) * 1000
+    return {
+        "mean_ms": round(float(samples.mean()), 2),
+        "p50_ms": round(float(np.percentile(samples, 50)), 2),
+        "p90_ms": round(float(np.percentile(samples, 90)), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+        "p99_ms": round(float(np.percentile(samples, 99)), 2),
+        "max_ms": round(float(samples.max()), 2),
+    }
+
+async def send(client: httpx.AsyncClient, url: str, images: ImagePool, recorder: Optional[Recorder],
+               started: Optional[float] = None) -> None:
+    size, data = images.pick()
+    started = started if started is not None else time.perf_counter()
+    response = error = None
+    try:
+        response = await client.post(url, files={"file": ("meal.jpg", data, "image/jpeg")})
+    except httpx.HTTPError as e:
+        error = e
+    if recorder is not None:
+        recorder.record(size, time.perf_counter() - started, response, error)
+
+async def closed_loop(client: httpx.AsyncClient, url: str, images: ImagePool, concurrency: int,
+                      duration: float, warmup: float) -> Dict[str, Any]:
+    recorder = Recorder()
+    warmup_until = time.perf_counter() + warmup
+    deadline = warmup_until + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            measuring = time.perf_counter() >= warmup_until
+            await send(client, url, images, recorder if measuring else None)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - warmup_until
+    return {"mode": "closed", "concurrency": concurrency, **recorder.summary(elapsed)}
+
+async def open_loop(client: httpx.AsyncClient, url: str, images: ImagePool, rate: float,
+                    duration: float, warmup: float, max_in_flight: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    in_flight = set()
+    skipped = 0
+
+    next_at = started
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        measuring = next_at >= warmup_until
+        if len(in_flight) >= max_in_flight:
+            # The server is not keeping up; count it instead of queueing without bound
+            skipped += measuring
+        else:
+            task = asyncio.create_task(send(client, url, images, recorder if measuring else None, next_at))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += interval
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    # Completed requests over the whole measured window, including the drain
+    elapsed = time.perf_counter() - warmup_until
+    summary = recorder.summary(elapsed)
+    summary["skipped"] = skipped
+    if skipped:
+        summary["requests"] += skipped
+        summary["error_rate"] = round((summary["requests"] - summary["ok"]) / summary["requests"], 4)
+    return {"mode": "open", "target_rate": rate, **summary}
+
+def find_saturation(levels: List[Dict[str, Any]], min_gain: float, max_error_rate: float) -> Optional[Dict[str, Any]]:
+    """
+    First concurrency level whose successor adds less than min_gain throughput (or errors out)
+    Past it, extra clients only queue: latency grows, throughput does not.
+    """
+    for current, following in zip(levels, levels[1:]):
+        if following["error_rate"] > max_error_rate:
+            return current
+        if following["throughput_per_s"] < current["throughput_per_s"] * (1 + min_gain):
+            return current
+    return None
+
+def print_level(result: Dict[str, Any]) -> None:
+    label = f"c={result['concurrency']}" if result["mode"] == "closed" else f"rate={result['target_rate']}/s"
+    latency = result["latency"]
+    print(f"{label:<12} {result['throughput_per_s']:>8.1f} req/s  "
+          f"p50 {latency.get('p50_ms', 0):>8.1f} ms  p95 {latency.get('p95_ms', 0):>8.1f} ms  "
+          f"p99 {latency.get('p99_ms', 0):>8.1f} ms  errors {result['error_rate']:.1%}")
+
+def parse_sizes(value: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in value.split(","):
+        width, _, height = item.lower().partition("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    url = args.url.rstrip("/") + "/api/predict"
+    images = ImagePool(parse_sizes(args.sizes), args.variants, args.cacheable)
+    connections = max([args.concurrency, args.max_in_flight if args.rate else 0, *args.sweep])
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        (await client.get(args.url.rstrip("/") + "/health")).raise_for_status()
+        report: Dict[str, Any] = {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "url": url,
+                "sizes": args.sizes,
+                "duration_s": args.duration,
+                "cacheable": args.cacheable,
+            },
+            "levels": [],
+        }
+
+        if args.rate:
+            levels = [await open_loop(client, url, images, args.rate, args.duration, args.warmup, args.max_in_flight)]
+        else:
+            levels = []
+            for concurrency in args.sweep or [args.concurrency]:
+                levels.append(await closed_loop(client, url, images, concurrency, args.duration, args.warmup))
+                print_level(levels[-1])
+        report["levels"] = levels
+
+    if args.rate:
+        print_level(levels[0])
+    if args.sweep:
+        saturation = find_saturation(levels, args.min_gain, args.max_error_rate)
+        report["saturation"] = saturation and {
+            "concurrency": saturation["concurrency"],
+            "throughput_per_s": saturation["throughput_per_s"],
+            "p95_ms": saturation["latency"].get("p95_ms"),
+        }
+        if saturation:
+            print(f"Saturation at concurrency {saturation['concurrency']} "
+                  f"({saturation['throughput_per_s']:.1f} req/s)")
+        else:
+            print("No saturation within the sweep; try higher concurrency levels")
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test POST /api/predict on a running server")
+    parser.add_argument("--url", default=os.getenv("LOADGEN_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--sizes", default="1280x960", help="comma separated WIDTHxHEIGHT list")
+    parser.add_argument("--variants", type=int, default=4, help="distinct images per size")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="requests per second (open loop) instead of --concurrency")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop: cap on outstanding requests")
+    parser.add_argument("--sweep", type=lambda value: [int(level) for level in value.split(",")], default=[],
+                        help="comma separated concurrency levels, e.g. 1,2,4,8,16")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--min-gain", type=float, default=0.05,
+                        help="sweep: throughput gain below which the next level counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--cacheable", action="store_true", help="send identical bytes (prediction cache hits)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/loadgen-<time>.json)")
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(run(args))
+    except httpx.HTTPError as e:
+        print(f"Server not reachable at {args.url}: {e}")
+        return 1
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadgen-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+In-memory stand-in for the motor database used by the route benchmark
+
+Implements only the collection methods the write and read paths call. Writes are
+kept in lists so the benchmark measures the API, not a database server. find supports
+the query subset the history read uses: equality, $lt/$gt/$exists and $or.
+"""
+import copy
+import itertools
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+_ids = itertools.count(1)
+
+COMPARISONS = {
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+}
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$exists":
+                    if (key in document) != bool(operand):
+                        return False
+                elif not COMPARISONS[op](document.get(key), operand):
+                    return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return document
+    fields = {key for key, include in projection.items() if include and key != "_id"}
+    projected = {key: value for key, value in document.items() if key in fields}
+    if projection.get("_id", 1) and "_id" in document:
+        projected["_id"] = document["_id"]
+    return projected
+
+class MemoryCursor:
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self._documents = documents
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        # Stable sorts from the last key to the first give the compound order
+        for field, order in reversed(keys):
+            self._documents = sorted(self._documents, key=lambda d: d.get(field), reverse=order < 0)
+        return self
+
+    def limit(self, count: int):
+        self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self._documents[:length] if length else self._documents
+
+    def __aiter__(self):
+        self._iterator = iter(self._documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class MemoryCollection:
+    def __init__(self):
+        self.documents: List[Dict[str, Any]] = []
+
+    async def insert_one(self, document):
+        document.setdefault("_id", next(_ids))
+        self.documents.append(copy.copy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            await self.insert_one(document)
+        return SimpleNamespace(inserted_ids=[document["_id"] for document in documents])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.documents.extend({"operation": operation} for operation in operations)
+
+    async def create_index(self, *args, **kwargs):
+        return kwargs.get("name", "index")
+
+    async def update_many(self, *args, **kwargs):
+        return SimpleNamespace(modified_count=0)
+
+    async def delete_many(self, *args, **kwargs):
+        return SimpleNamespace(deleted_count=0)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        for index, document in enumerate(self.documents):
+            if matches(document, query):
+                self.documents[index] = {"_id": document.get("_id"), **replacement}
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        if upsert:
+            await self.insert_one(dict(replacement))
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor([project(d, projection) for d in self.documents if matches(d, query or {})])
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._collections.setdefault(name, MemoryCollection())
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return getattr(self, name)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the prediction pipeline
+
+    python -m benchmarks.pipeline [--iterations 200] [--baseline benchmarks/baseline.json]
+    python -m benchmarks.pipeline --save-baseline
+
+Measures throughput and p50/p95/p99 latency of process_image, ingest_image, detect_food,
+calculate_calories, response encoding (stdlib json, orjson, MessagePack, schema validation)
+and the whole POST /api/predict route as JSON and MessagePack (in-process client, in-memory
+MongoDB stand-in). Uses the real weights on DETECTION_BACKEND when they can be loaded,
+otherwise a deterministic stub model. Runs offline and CPU-only.
+
+Results are written as JSON; when a baseline file exists each benchmark is compared
+against it and the run exits with status 1 if any of them regressed.
+"""
+import os
+
+# Must be set before the app modules create their singletons
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")        # every request does the full work
+os.environ.setdefault("NUTRITION_WATCH_INTERVAL", "0")
+os.environ.setdefault("MONGODB_RECONNECT_INTERVAL", "0")
+os.environ.setdefault("WRITE_BUFFER_OVERFLOW", "drop")
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.calorie_calculator import calculate_calories
+from app.utils.food_detection import detect_food
+from app.utils.image_processor import ingest_image, process_image, scale_detections_to_original
+from app.utils.model_registry import model_registry
+from app.models.schemas import PredictionResponse
+from app.utils import responses
+from benchmarks.images import encode_jpeg, synthetic_photo
+from benchmarks.memory_mongo import MemoryDatabase
+from benchmarks.stub_model import StubModel
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    samples = np.array(latencies) * 1000
+    return {
+        "iterations": len(latencies),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "throughput_per_s": round(len(latencies) / (samples.sum() / 1000), 2),
+    }
+
+def run_benchmark(name: str, fn: Callable[[int], Any], iterations: int, warmup: int) -> Dict[str, float]:
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    result = summarize(latencies)
+    print(f"{name:<20} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+          f"p99 {result['p99_ms']:>9.2f} ms  {result['throughput_per_s']:>9.1f}/s")
+    return result
+
+def prepare_model() -> str:
+    """Real weights if they load, otherwise the stub; returns which one is used"""
+    if os.path.exists(model_registry.weights_path):
+        model_registry.startup()
+        if model_registry.get_backend() is not None:
+            return f"{model_registry.backend_name}:{model_registry.model_version}"
+    model_registry.register_model(StubModel(), status="stub")
+    return "stub"
+
+def response_body(detections: List[Dict[str, Any]], width: int, height: int) -> Dict[str, Any]:
+    """An /api/predict body, as run_prediction_pipeline builds it"""
+    results = calculate_calories(detections, width, height)
+    return {
+        "success": True,
+        "total_calories": results["total_calories"],
+        "total_macros": results["total_macros"],
+        "detected_foods": results["food_items"],
+        "image_info": {"width": width, "height": height, "format": "JPEG"},
+        "nutrition_version": "benchmark",
+    }
+
+def encoding_benchmarks(bodies: List[Dict[str, Any]], iterations: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    """Response serialization alone, per encoder"""
+    encoders = {
+        "encode_json_stdlib": lambda body: json.dumps(body).encode("utf-8"),
+        "encode_json": responses.dumps_json,
+        "validate_schema": PredictionResponse.model_validate,
+    }
+    if responses.msgpack is not None:
+        encoders["encode_msgpack"] = responses.packb
+    return {
+        name: run_benchmark(name, lambda i, encode=encode: encode(bodies[i % len(bodies)]), iterations, warmup)
+        for name, encode in encoders.items()
+    }
+
+def payload_sizes(bodies: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Mean encoded body size in bytes per format"""
+    sizes = {"json": float(np.mean([len(responses.dumps_json(body)) for body in bodies]))}
+    if responses.msgpack is not None:
+        sizes["msgpack"] = float(np.mean([len(responses.packb(body)) for body in bodies]))
+    return sizes
+
+def route_benchmark(images: List[bytes], iterations: int, warmup: int) -> Dict[str, Dict[str, float]]:
+    """POST /api/predict through the ASGI app with the in-memory database, per response format"""
+    from fastapi.testclient import TestClient
+    import app.main as main
+    from app.database import connection
+
+    async def init_memory_db(check: bool = True):
+        connection.db.database = MemoryDatabase()
+        connection.db.connected = True
+        for hook in connection.on_connect:
+            await hook()
+
+    main.init_db = init_memory_db
+    formats = {"api_predict": responses.JSON_MEDIA_TYPE}
+    if responses.msgpack is not None:
+        formats["api_predict_msgpack"] = responses.MSGPACK_MEDIA_TYPE
+    results = {}
+    with TestClient(main.app) as client:
+        for name, media_type in formats.items():
+            def post(i: int) -> None:
+                response = client.post(
+                    "/api/predict", headers={"Accept": media_type},
+                    files={"file": (f"meal-{i}.jpg", images[i % len(images)], "image/jpeg")},
+                )
+                response.raise_for_status()
+            results[name] = run_benchmark(name, post, iterations, warmup)
+    return results
+
+def run_suite(iterations: int, warmup: int, width: int, height: int) -> Dict[str, Any]:
+    model = prepare_model()
+    photos = [synthetic_photo(width, height, seed) for seed in range(8)]
+    jpegs = [encode_jpeg(photo) for photo in photos]
+    ingested = [ingest_image(data) for data in jpegs]
+    detections = [scale_detections_to_original(detect_food(item.frame), item) for item in ingested]
+    bodies = [response_body(meal, width, height) for meal in detections]
+
+    print(f"model: {model}, image: {width}x{height}, iterations: {iterations}")
+    results = {
+        "process_image": run_benchmark(
+            "process_image", lambda i: process_image(photos[i % len(photos)]), iterations, warmup),
+        "ingest_image": run_benchmark(
+            "ingest_image", lambda i: ingest_image(jpegs[i % len(jpegs)]), iterations, warmup),
+        "detect_food": run_benchmark(
+            "detect_food", lambda i: detect_food(ingested[i % len(ingested)].frame), iterations, warmup),
+        "calculate_calories": run_benchmark(
+            "calculate_calories",
+            lambda i: calculate_calories(detections[i % len(detections)], width, height),
+            iterations, warmup),
+        **encoding_benchmarks(bodies, iterations, warmup),
+        **route_benchmark(jpegs, iterations, warmup),
+    }
+    sizes = payload_sizes(bodies)
+    print("payload bytes: " + ", ".join(f"{name} {size:.0f}" for name, size in sizes.items()))
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "model": model,
+            "image_size": [width, height],
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+        "payload_bytes": sizes,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Regressions of current vs baseline: p50/p95 latency up or throughput down by more than tolerance
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if result[key] > reference[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {reference[key]:.2f} -> {result[key]:.2f}")
+        if result["throughput_per_s"] < reference["throughput_per_s"] / (1 + tolerance):
+            regressions.append(
+                f"{name} throughput_per_s: {reference['throughput_per_s']:.1f} -> {result['throughput_per_s']:.1f}"
+            )
+    return regressions
+
+def write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    print(f"Wrote {path}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the prediction pipeline")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    current = run_suite(args.iterations, args.warmup, args.width, args.height)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    write_json(output, current)
+    if args.save_baseline:
+        write_json(args.baseline, current)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline to create one)")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline.get("meta", {}).get("model") != current["meta"]["model"]:
+        print(f"Note: baseline used model {baseline.get('meta', {}).get('model')}, this run {current['meta']['model']}")
+
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%} of baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions beyond {args.tolerance:.0%} of baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Deterministic stand-in for the YOLO model, used when no weights are available
+
+Mimics the parts of the ultralytics API that food_detection uses: predict() returns
+one result per frame with `boxes` (cls, conf, xyxy) and `names`. Detections are derived
+from the frame contents, so the same image always gives the same result, and each call
+reads the whole frame so the cost scales with the input like a real forward pass.
+"""
+from typing import List
+
+import numpy as np
+
+from app.utils.nutrition_engine import load_class_names
+
+class _Value:
+    def __init__(self, value):
+        self._value = value
+
+    def item(self):
+        return self._value
+
+class _Box:
+    def __init__(self, class_id: int, confidence: float, xyxy: List[float]):
+        self.cls = _Value(class_id)
+        self.conf = _Value(confidence)
+        self.xyxy = [np.array(xyxy, dtype=np.float32)]
+
+class _Result:
+    def __init__(self, boxes: List[_Box], names):
+        self.boxes = boxes
+        self.names = names
+
+class StubModel:
+    def __init__(self, max_detections: int = 3):
+        self.max_detections = max_detections
+        self.names = dict(enumerate(load_class_names()))
+
+    def _detect(self, frame: np.ndarray) -> _Result:
+        height, width = frame.shape[:2]
+        # Per-channel means give a stable, content-dependent seed
+        seed = int(frame.reshape(-1, 3).mean(axis=0).sum() * 1000)
+        rng = np.random.default_rng(seed)
+        boxes = []
+        for _ in range(1 + seed % self.max_detections):
+            x1, y1 = rng.uniform(0, width / 2), rng.uniform(0, height / 2)
+            x2, y2 = x1 + rng.uniform(20, width / 2), y1 + rng.uniform(20, height / 2)
+            boxes.append(_Box(int(rng.integers(len(self.names))), float(rng.uniform(0.25, 0.99)), [x1, y1, x2, y2]))
+        return _Result(boxes, self.names)
+
+    def predict(self, source, conf: float = 0.25, verbose: bool = False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        return [self._detect(np.asarray(frame)) for frame in frames]
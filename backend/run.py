@@ -14,6 +14,12 @@ if __name__ == "__main__":
     port = int(os.getenv("API_PORT", 8000))
     debug = os.getenv("DEBUG", "True").lower() == "true"
     
+    # SERVER_MODE=production: pre-forked workers sharing one preloaded model (app/server.py)
+    if os.getenv("SERVER_MODE", "development").lower() == "production":
+        from app.server import serve
+        serve(host, port)
+        raise SystemExit(0)
+    
     uvicorn.run(
         "app.main:app",
         host=host,
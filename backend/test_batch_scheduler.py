@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for the micro-batching inference scheduler
+"""
+import asyncio
+import numpy as np
+from app.utils.batch_scheduler import BatchScheduler
+from app.utils.executor import inference_executor
+
+def make_scheduler(batch_sizes, **kwargs):
+    """Scheduler whose 'model' tags each frame with its batch size"""
+    def fake_infer(frames):
+        batch_sizes.append(len(frames))
+        return [[{"class_name": "dosa", "frame_id": int(frame[0, 0, 0])}] for frame in frames]
+    return BatchScheduler(infer_fn=fake_infer, **kwargs)
+
+def run_concurrently(scheduler, count):
+    async def main():
+        frames = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(count)]
+        results = await asyncio.gather(*(scheduler.submit(frame) for frame in frames))
+        await scheduler.stop()
+        return results
+    return asyncio.run(main())
+
+def test_concurrent_frames_share_one_batch():
+    batch_sizes = []
+    scheduler = make_scheduler(batch_sizes, max_batch_size=8, max_wait_ms=50)
+    results = run_concurrently(scheduler, 5)
+
+    assert batch_sizes == [5]
+    # Every caller gets its own detections back
+    assert [r[0]["frame_id"] for r in results] == [0, 1, 2, 3, 4]
+
+def test_max_batch_size_splits_batches():
+    batch_sizes = []
+    scheduler = make_scheduler(batch_sizes, max_batch_size=2, max_wait_ms=50)
+    results = run_concurrently(scheduler, 5)
+
+    assert batch_sizes == [2, 2, 1]
+    assert [r[0]["frame_id"] for r in results] == [0, 1, 2, 3, 4]
+
+def test_inference_error_reaches_every_caller():
+    def failing_infer(frames):
+        raise ValueError("boom")
+    scheduler = BatchScheduler(infer_fn=failing_infer, max_batch_size=4, max_wait_ms=10)
+
+    async def main():
+        frames = [np.zeros((4, 4, 3), dtype=np.uint8) for _ in range(3)]
+        results = await asyncio.gather(*(scheduler.submit(f) for f in frames), return_exceptions=True)
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+def test_batches_run_concurrently_up_to_max_in_flight(monkeypatch):
+    running, peak, batch_sizes = [0], [0], []
+
+    async def slow_detect(frames):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        batch_sizes.append(len(frames))
+        await asyncio.sleep(0.05)
+        running[0] -= 1
+        return [[{"frame_id": int(frame[0, 0, 0])}] for frame in frames]
+
+    monkeypatch.setattr(inference_executor, "detect", slow_detect)
+    scheduler = BatchScheduler(max_batch_size=2, max_wait_ms=1, max_in_flight=2)
+
+    async def main():
+        # Two batches start at once; frames arriving meanwhile wait for a free slot and go out together
+        first = [scheduler.submit(np.full((4, 4, 3), i, dtype=np.uint8)) for i in range(4)]
+        tasks = [asyncio.ensure_future(c) for c in first]
+        await asyncio.sleep(0.01)
+        tasks += [asyncio.ensure_future(scheduler.submit(np.full((4, 4, 3), i, dtype=np.uint8)))
+                  for i in range(4, 6)]
+        results = await asyncio.gather(*tasks)
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(main())
+    assert peak[0] == 2
+    assert batch_sizes == [2, 2, 2]
+    assert [r[0]["frame_id"] for r in results] == [0, 1, 2, 3, 4, 5]
+
+def test_stop_fails_batches_in_flight(monkeypatch):
+    async def hanging_detect(frames):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(inference_executor, "detect", hanging_detect)
+    scheduler = BatchScheduler(max_batch_size=2, max_wait_ms=1, max_in_flight=2)
+
+    async def main():
+        task = asyncio.ensure_future(scheduler.submit(np.zeros((4, 4, 3), dtype=np.uint8)))
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return await asyncio.gather(task, return_exceptions=True)
+
+    [result] = asyncio.run(main())
+    assert isinstance(result, RuntimeError)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline bulk-processing CLI
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.utils import bulk_process as bulk
+
+def _photos(folder, count):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        subfolder = os.path.join(folder, "day1" if i % 2 else "day0")
+        os.makedirs(subfolder, exist_ok=True)
+        Image.fromarray(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)).save(os.path.join(subfolder, f"{i:03d}.jpg"))
+    with open(os.path.join(folder, "day0", "broken.jpg"), 'wb') as file:
+        file.write(b"\xff\xd8 not really a jpeg")
+    return bulk.list_inputs(str(folder))
+
+def test_manifest_paths_are_relative_to_the_manifest(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('{"path": "a.jpg"}\n# comment\n\n{"path": "/data/b.jpg"}\n')
+    assert bulk.list_inputs(str(manifest)) == [str(tmp_path / "a.jpg"), "/data/b.jpg"]
+
+def test_resume_after_interrupt_writes_every_image_once(tmp_path, monkeypatch):
+    paths = _photos(tmp_path / "photos", 20)
+    output = str(tmp_path / "results.jsonl")
+    process_batch = bulk.process_batch
+    calls = []
+
+    def interrupted(*args):
+        calls.append(1)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return process_batch(*args)
+
+    monkeypatch.setattr(bulk, "process_batch", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        bulk.bulk_process(str(tmp_path / "photos"), output, workers=0, batch_size=4, checkpoint_every=8)
+    assert json.load(open(output + ".checkpoint.json"))["done"] == 12
+
+    monkeypatch.setattr(bulk, "process_batch", process_batch)
+    summary = bulk.bulk_process(str(tmp_path / "photos"), output, workers=0, batch_size=4, resume=True)
+    rows = [json.loads(line) for line in open(output)]
+    assert summary["images"] == len(paths) - 12
+    assert [row["path"] for row in rows] == paths
+    assert [row["success"] for row in rows].count(False) == 1
+
+class TornFile:
+    """Writes half of what it is given, then is interrupted"""
+    def __init__(self, file):
+        self.file = file
+    def write(self, data):
+        self.file.write(data[:len(data) // 2])
+        self.file.flush()
+        raise KeyboardInterrupt
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+def test_interrupt_mid_write_leaves_only_whole_rows(tmp_path, monkeypatch):
+    paths = _photos(tmp_path / "photos", 12)
+    output = str(tmp_path / "results.jsonl")
+    restore = bulk.JsonlWriter.restore
+    writes = []
+
+    def restore_then_tear(writer, state, done):
+        restore(writer, state, done)
+        write = writer.write
+        def write_then_tear(rows):
+            writes.append(1)
+            if len(writes) == 3:
+                writer._file = TornFile(writer._file)
+            write(rows)
+        writer.write = write_then_tear
+
+    monkeypatch.setattr(bulk.JsonlWriter, "restore", restore_then_tear)
+    with pytest.raises(KeyboardInterrupt):
+        bulk.bulk_process(str(tmp_path / "photos"), output, workers=0, batch_size=4, checkpoint_every=100)
+    assert json.load(open(output + ".checkpoint.json"))["done"] == 8
+    assert len([json.loads(line) for line in open(output)]) == 8
+
+    monkeypatch.setattr(bulk.JsonlWriter, "restore", restore)
+    bulk.bulk_process(str(tmp_path / "photos"), output, workers=0, batch_size=4, resume=True)
+    assert [json.loads(line)["path"] for line in open(output)] == paths
+
+def test_resume_without_checkpoint_keeps_existing_output(tmp_path):
+    _photos(tmp_path / "photos", 2)
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"path": "earlier run"}\n')
+    with pytest.raises(SystemExit):
+        bulk.bulk_process(str(tmp_path / "photos"), str(output), workers=0, resume=True)
+    assert output.read_text() == '{"path": "earlier run"}\n'
+
+def test_parquet_parts_share_one_schema(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    paths = _photos(tmp_path / "photos", 6)
+    output = str(tmp_path / "results")
+    bulk.bulk_process(str(tmp_path / "photos"), output, "parquet", workers=0, batch_size=2, checkpoint_every=2)
+    table = pq.read_table(output)
+    assert sorted(table.column("path").to_pylist()) == sorted(paths)
+    assert len(os.listdir(output)) == 4
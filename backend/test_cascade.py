@@ -0,0 +1,52 @@
+from app.utils.cascade import Cascade, CASCADE_ESCALATIONS
+from app.utils.detection_backends import DetectionBackend
+
+def _detection(confidence, bbox=(0, 0, 10, 10)):
+    return {"class_id": 0, "class_name": "idli", "confidence": confidence, "bbox": list(bbox), "area_pixels": 100.0}
+
+class _FakeBackend(DetectionBackend):
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def detect(self, frames, conf=0.25, imgsz=None):
+        self.calls.append((len(frames), imgsz))
+        return [list(self.results[frame]) for frame in frames]
+
+def _cascade():
+    return Cascade(enabled=True, imgsz=320, model_path="", min_confidence=0.5,
+                   max_overlap=0.5, max_items=3, escalate_empty=True)
+
+def test_escalation_reasons():
+    cascade = _cascade()
+    assert cascade.escalation_reason([_detection(0.9)]) is None
+    assert cascade.escalation_reason([]) == "empty"
+    assert cascade.escalation_reason([_detection(0.9), _detection(0.3, (50, 50, 60, 60))]) == "low_confidence"
+    assert cascade.escalation_reason([_detection(0.9, (0, 0, 10, 10 + i)) for i in range(2)]) == "overlap"
+    assert cascade.escalation_reason([_detection(0.9, (20 * i, 0, 20 * i + 10, 10)) for i in range(4)]) == "crowded"
+
+def test_only_unsure_frames_reach_the_full_model():
+    # The fake backend answers by frame id; the full model sees only the escalated frame
+    cascade = _cascade()
+    before = CASCADE_ESCALATIONS.value(reason="low_confidence")
+    full = _FakeBackend({"plate": [_detection(0.9)], "thali": [_detection(0.3)]})
+    results = cascade.detect(["plate", "thali"], full)
+    assert full.calls == [(2, 320), (1, None)]
+    assert [len(result) for result in results] == [1, 1]
+    assert CASCADE_ESCALATIONS.value(reason="low_confidence") == before + 1
+    info = cascade.info()
+    assert info["frames"] >= 2 and info["escalation_rate"] is not None
+
+class _StaticBackend(_FakeBackend):
+    # An exported graph with a fixed input size: imgsz is ignored
+    name = "onnx"
+    input_size = 640
+    dynamic_size = False
+
+def test_static_graph_without_cascade_model_runs_a_single_pass():
+    cascade = _cascade()
+    full = _StaticBackend({"plate": [_detection(0.9)], "thali": [_detection(0.3)]})
+    results = cascade.detect(["plate", "thali"], full)
+    assert full.calls == [(2, None)]
+    assert [len(result) for result in results] == [1, 1]
+    assert cascade.enabled is False
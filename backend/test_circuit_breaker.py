@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the MongoDB circuit breaker
+"""
+import asyncio
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+from app.database import connection
+from app.database.connection import CircuitBreaker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_opens_after_threshold_and_half_opens_after_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure("timeout")
+    assert breaker.allow_request()
+    breaker.record_failure("timeout")
+    assert not breaker.allow_request()
+
+    clock.now = 10
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+
+    # One failure while half-open opens it again
+    breaker.record_failure("timeout")
+    assert not breaker.allow_request()
+
+    clock.now = 20
+    breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_get_database_fails_fast_while_open(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=FakeClock())
+    monkeypatch.setattr(connection.db, "breaker", breaker)
+    monkeypatch.setattr(connection.db, "database", object())
+
+    assert asyncio.run(connection.get_database()) is not None
+
+    # Errors that say nothing about the server leave the breaker alone
+    connection.report_db_error(DuplicateKeyError("duplicate"))
+    assert asyncio.run(connection.get_database()) is not None
+
+    connection.report_db_error(ServerSelectionTimeoutError("no servers"))
+    assert asyncio.run(connection.get_database()) is None
+
+def test_url_options_override_only_the_options_they_set():
+    # Option names elsewhere in the URL (here the host) don't count
+    options = connection.url_client_options("mongodb://minpoolsize.example/db?MAXPOOLSIZE=5")
+    assert "maxPoolSize" not in options
+    assert options["minPoolSize"] == connection.client_options()["minPoolSize"]
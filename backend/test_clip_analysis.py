@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for video / burst meal analysis: frame sampling and track-based dedup
+"""
+import cv2
+import numpy as np
+
+from app.utils import clip_analysis
+from app.utils.clip_analysis import FrameSampler, IoUTracker, sample_video, thumbnail
+
+FRAME_WIDTH, FRAME_HEIGHT = 640, 480
+# Dishes on a wide table: (class, x1, y1, x2, y2) in table coordinates
+DISHES = [("dosa", 100, 150, 400, 330), ("idli", 700, 200, 860, 340), ("sambar", 1150, 120, 1400, 360)]
+
+def _table(width: int = 1600) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    table = cv2.GaussianBlur(rng.integers(0, 256, (FRAME_HEIGHT, width, 3), dtype=np.uint8), (9, 9), 0)
+    for index, (_, x1, y1, x2, y2) in enumerate(DISHES):
+        cv2.rectangle(table, (x1, y1), (x2, y2), (60 * index, 200, 255 - 60 * index), -1)
+    return table
+
+def _pan(frames: int, still: int = 0):
+    # Camera holds still, then pans right across the whole table; yields (camera x, frame)
+    table = _table()
+    travel = table.shape[1] - FRAME_WIDTH
+    for i in range(still + frames):
+        x = 0 if i < still else round((i - still) * travel / (frames - 1))
+        yield x, np.ascontiguousarray(table[:, x:x + FRAME_WIDTH])
+
+def _sample(frames):
+    sampler = FrameSampler(max_frames=100)
+    kept = []
+    for x, frame in frames:
+        shift = sampler.consider(thumbnail(frame))
+        if shift is not None:
+            kept.append((x, shift))
+    return sampler, kept
+
+def test_kept_frames_follow_scene_change_not_frame_count():
+    _, still = _sample(_pan(2, still=60))
+    assert len(still) <= 2
+
+    _, slow = _sample(_pan(240))
+    _, fast = _sample(_pan(60))
+    assert 3 <= len(fast) <= 8
+    assert abs(len(slow) - len(fast)) <= 1
+
+    # The estimated shift matches the real camera motion (content moves left)
+    for (x0, _), (x1, shift) in zip(slow, slow[1:]):
+        assert abs(shift[0] * FRAME_WIDTH + (x1 - x0)) < 8
+
+def _visible_detections(x: int):
+    detections = []
+    for name, x1, y1, x2, y2 in DISHES:
+        left, right = max(x1 - x, 0), min(x2 - x, FRAME_WIDTH)
+        if right - left > 40:
+            detections.append({"class_name": name, "confidence": 0.8, "bbox": [left, y1, right, y2]})
+    return detections
+
+def test_tracker_counts_each_dish_once():
+    _, kept = _sample(_pan(120))
+    tracker = IoUTracker()
+    for index, (x, shift) in enumerate(kept):
+        tracker.update(index, _visible_detections(x), (FRAME_WIDTH, FRAME_HEIGHT), shift)
+    tracks = tracker.tracks()
+    assert sorted(track.class_name for track in tracks) == ["dosa", "idli", "sambar"]
+
+def test_sample_video_skips_static_frames(tmp_path):
+    path = str(tmp_path / "pan.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (FRAME_WIDTH, FRAME_HEIGHT))
+    for _, frame in _pan(45, still=45):
+        writer.write(frame)
+    writer.release()
+
+    clip = sample_video(path)
+    assert clip.frames_received == 90
+    assert 3 <= len(clip.frames) <= 8
+    assert clip.frames[0].ingested.frame.shape == (640, 640, 3)
+    assert (clip.frames[0].ingested.width, clip.frames[0].ingested.height) == (FRAME_WIDTH, FRAME_HEIGHT)
+
+def test_video_past_the_input_cap_is_truncated(tmp_path, monkeypatch):
+    path = str(tmp_path / "pan.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (FRAME_WIDTH, FRAME_HEIGHT))
+    for _, frame in _pan(45, still=45):
+        writer.write(frame)
+    writer.release()
+
+    monkeypatch.setattr(clip_analysis, "CLIP_MAX_INPUT_FRAMES", 60)
+    clip = sample_video(path)
+    assert clip.frames_received == 60
+    assert clip.truncated and clip.input_frame_limit == 60
+
+    # Exactly at the cap nothing was left unread
+    monkeypatch.setattr(clip_analysis, "CLIP_MAX_INPUT_FRAMES", 90)
+    clip = sample_video(path)
+    assert not clip.truncated and clip.input_frame_limit is None
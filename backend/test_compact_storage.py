@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact prediction document format
+"""
+import bson
+from app.database.compact import compact_document, compact_prediction, expand_prediction, stored_prediction
+from app.database.storage import build_prediction_document
+from app.models.schemas import ClipResponse, PredictionResponse
+from app.utils.calorie_calculator import calculate_calories, get_nutrition_version
+
+def make_response():
+    detections = [
+        {"class_name": "dosa", "confidence": 0.853, "bbox": [125, 25, 375, 150]},
+        {"class_name": "idly", "confidence": 0.92, "bbox": [400, 50, 475, 125]},
+        {"class_name": "Masala Omelette", "confidence": 0.41, "bbox": [0, 0, 640, 480]},
+    ]
+    results = calculate_calories(detections, 800, 600)
+    return {
+        "success": True,
+        "total_calories": results["total_calories"],
+        "total_macros": results["total_macros"],
+        "detected_foods": results["food_items"],
+        "image_info": {"width": 800, "height": 600, "format": "JPEG"},
+        "nutrition_version": get_nutrition_version(),
+    }
+
+def test_round_trip_rebuilds_the_response():
+    response = make_response()
+    compact = compact_prediction(response)
+
+    # Model classes are stored as ids, anything else by name
+    assert compact["xn"] == ["Masala Omelette"]
+    assert all(isinstance(value, int) for value in compact["k"] + compact["g"] + compact["cf"])
+
+    assert expand_prediction(compact) == response
+    PredictionResponse(**expand_prediction(compact))
+
+def test_migrated_document_is_smaller_and_equivalent():
+    response = make_response()
+    full = {"prediction_id": "abc", "user_id": "anonymous", "prediction_data": response}
+    migrated = compact_document(full)
+
+    assert "prediction_data" not in migrated
+    assert migrated["food_count"] == 3
+    assert stored_prediction(migrated) == stored_prediction(full) == response
+    assert len(bson.encode(migrated)) < len(bson.encode(full)) * 0.7
+
+def test_clip_results_keep_tracks_and_clip_info():
+    response = make_response()
+    for track_id, item in enumerate(response["detected_foods"]):
+        item.update(track_id=track_id, frames=[0, 2, 3], best_frame=2)
+    response["clip_info"] = {
+        "source": "video", "frames_received": 90, "frames_analyzed": 4,
+        "analyzed_frames": [0, 30, 60, 89], "truncated": False, "unique_dishes": 3,
+    }
+    ClipResponse(**response)
+
+    document = build_prediction_document(response)
+    restored = stored_prediction(bson.decode(bson.encode(document)))
+    assert restored == response
+    ClipResponse(**restored)
+
@@ -0,0 +1,120 @@
+import glob
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from app.utils.detection_backends import RawOutputBackend, backend_weights_path, load_backend, postprocess_yolo
+from app.utils.export_model import export_model
+from app.utils.image_processor import ingest_image
+from app.utils.model_registry import DEFAULT_MODEL_PATH
+
+NAMES = ["idli", "dosa"]
+
+def _raw_output(boxes):
+    # boxes: (cx, cy, w, h, class_id, score) -> (1, 4 + classes, anchors) like a YOLOv8 head
+    output = np.zeros((1, 4 + len(NAMES), len(boxes)), dtype=np.float32)
+    for anchor, (cx, cy, w, h, class_id, score) in enumerate(boxes):
+        output[0, :4, anchor] = (cx, cy, w, h)
+        output[0, 4 + class_id, anchor] = score
+    return output
+
+def test_postprocess_nms_is_per_class():
+    output = _raw_output([
+        (100, 100, 50, 50, 0, 0.9),
+        (102, 101, 50, 50, 0, 0.8),   # duplicate of the first box
+        (101, 100, 50, 50, 1, 0.7),   # same place, other class: kept
+        (300, 300, 40, 40, 1, 0.1),   # below conf
+        (630, 20, 40, 40, 0, 0.6),    # clipped to the frame
+    ])
+    detections = postprocess_yolo(output, NAMES, conf=0.25, image_size=640)[0]
+    assert [(d["class_name"], round(d["confidence"], 1)) for d in detections] == [
+        ("idli", 0.9), ("dosa", 0.7), ("idli", 0.6)
+    ]
+    assert detections[0]["bbox"] == [75, 75, 125, 125]
+    assert detections[2]["bbox"] == [610, 0, 640, 40]
+
+class _FakeRuntime(RawOutputBackend):
+    # Static batch of 2, one box in the middle of every 64x64 input
+    input_size = 64
+    batch_size = 2
+    names = NAMES
+
+    def __init__(self):
+        self.calls = []
+
+    def infer(self, batch):
+        self.calls.append(batch.shape)
+        assert batch.dtype == np.float32 and batch.max() <= 1.0
+        return np.repeat(_raw_output([(32, 32, 16, 16, 1, 0.9)]), len(batch), axis=0)
+
+def test_raw_backend_chunks_static_batches_and_maps_boxes_back():
+    backend = _FakeRuntime()
+    frames = [np.zeros((64, 64, 3), np.uint8), np.zeros((64, 64, 3), np.uint8), np.zeros((32, 128, 3), np.uint8)]
+    results = backend.detect(frames)
+    assert backend.calls == [(2, 3, 64, 64), (2, 3, 64, 64)]
+    assert [len(detections) for detections in results] == [1, 1, 1]
+    assert results[0][0]["bbox"] == [24, 24, 40, 40]
+    # 128x32 frame was letterboxed at scale 0.5 with 24 px of padding on top
+    assert results[2][0]["bbox"] == [48, 0, 80, 32]
+
+def _equivalence_frames():
+    paths = sorted(glob.glob(os.path.join(os.getenv("BACKEND_TEST_IMAGES", ""), "*.jpg")))
+    if paths:
+        return [ingest_image(open(path, 'rb').read()).frame for path in paths[:20]]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size=(640, 640, 3), dtype=np.uint8) for _ in range(4)]
+
+def _match(reference, candidate):
+    assert len(candidate) == len(reference)
+    for expected, actual in zip(reference, candidate):
+        assert actual["class_id"] == expected["class_id"]
+        assert abs(actual["confidence"] - expected["confidence"]) < 0.02
+        assert np.abs(np.array(actual["bbox"]) - np.array(expected["bbox"])).max() <= 3
+
+@pytest.mark.parametrize("backend", ["onnx", "openvino"])
+def test_backend_matches_pytorch(backend):
+    # Runs only where the weights, ultralytics and the runtime are installed and the
+    # model has been exported (python -m app.utils.export_model --format <backend>)
+    pytest.importorskip("ultralytics")
+    pytest.importorskip("onnxruntime" if backend == "onnx" else "openvino")
+    path = backend_weights_path(backend, DEFAULT_MODEL_PATH)
+    if not os.path.exists(DEFAULT_MODEL_PATH) or not os.path.exists(path):
+        pytest.skip(f"{backend} model not exported")
+
+    from ultralytics import YOLO
+    from app.utils.detection_backends import UltralyticsBackend
+
+    reference = UltralyticsBackend(YOLO(DEFAULT_MODEL_PATH))
+    candidate = load_backend(backend, path, threads=2)
+    for frame in _equivalence_frames():
+        expected = sorted(reference.detect([frame])[0], key=lambda d: -d["confidence"])
+        actual = sorted(candidate.detect([frame])[0], key=lambda d: -d["confidence"])
+        _match(expected, actual)
+
+def test_export_target_ignores_detection_model_path(monkeypatch, tmp_path):
+    # ultralytics stand-in that exports to a scratch directory, like a run from another cwd
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    class FakeYOLO:
+        def __init__(self, weights):
+            self.weights = weights
+
+        def export(self, format, **kwargs):
+            path = scratch / "exported.onnx"
+            path.write_bytes(b"onnx")
+            return str(path)
+
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=FakeYOLO))
+    override = tmp_path / "deployed" / "model.onnx"
+    monkeypatch.setenv("DETECTION_MODEL_PATH", str(override))
+    weights = tmp_path / "candidate.pt"
+    weights.write_bytes(b"weights")
+
+    target = export_model("onnx", str(weights))
+    assert target == str(tmp_path / "candidate.onnx")
+    assert os.path.exists(target)
+    assert not os.path.exists(override)
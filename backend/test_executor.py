@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference executor's shared-memory handoff to detection workers
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import app.utils.executor as executor
+from app.utils.executor import InferenceExecutor
+from app.utils.food_detection import detect_food_batch
+
+def frames():
+    # Mixed shapes and dtypes, so every frame's offset in the block matters
+    return [
+        np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3),
+        np.linspace(0, 1, 2 * 3 * 3, dtype=np.float32).reshape(2, 3, 3),
+        np.full((7, 1, 3), 200, dtype=np.uint8),
+        np.arange(6 * 6 * 3, dtype=np.uint8).reshape(6, 6, 3)[::2],   # non-contiguous
+    ]
+
+def in_process_executor(monkeypatch):
+    """Process-mode executor whose 'worker pool' is a thread, so detect_food_batch can be patched"""
+    inference = InferenceExecutor(mode="process", threads=1, processes=1)
+    inference._thread_pool = ThreadPoolExecutor(max_workers=1)
+    inference._process_pool = ThreadPoolExecutor(max_workers=1)
+    created = []
+    real_shared_memory = shared_memory.SharedMemory
+
+    def recording_shared_memory(*args, **kwargs):
+        shm = real_shared_memory(*args, **kwargs)
+        if kwargs.get("create"):
+            created.append(shm.name)
+        return shm
+
+    monkeypatch.setattr(shared_memory, "SharedMemory", recording_shared_memory)
+    return inference, created
+
+def assert_unlinked(names):
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+def test_frames_round_trip_through_shared_memory(monkeypatch):
+    inference, created = in_process_executor(monkeypatch)
+    monkeypatch.setattr(executor, "detect_food_batch", lambda batch: [[{"frame": frame.copy()}] for frame in batch])
+
+    results = asyncio.run(inference.detect(frames()))
+    inference.shutdown()
+
+    for result, frame in zip(results, frames()):
+        received = result[0]["frame"]
+        assert received.dtype == frame.dtype
+        assert np.array_equal(received, frame)
+    assert_unlinked(created)
+
+def test_shared_memory_is_released_when_detection_fails(monkeypatch):
+    inference, created = in_process_executor(monkeypatch)
+
+    def failing_detect(batch):
+        raise RuntimeError("worker crashed")
+
+    monkeypatch.setattr(executor, "detect_food_batch", failing_detect)
+    with pytest.raises(RuntimeError, match="worker crashed"):
+        asyncio.run(inference.detect(frames()))
+    inference.shutdown()
+
+    assert len(created) == 1
+    assert_unlinked(created)
+
+def test_process_pool_matches_in_process_detection():
+    inference = InferenceExecutor(mode="process", threads=1, processes=1)
+    try:
+        results = asyncio.run(inference.detect(frames()))
+    finally:
+        inference.shutdown()
+
+    assert results == detect_food_batch(frames())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset-paginated prediction history
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.database import connection, storage
+from benchmarks.memory_mongo import MemoryDatabase
+
+def use_memory_database(monkeypatch):
+    database = MemoryDatabase()
+    monkeypatch.setattr(connection.db, "database", database)
+    monkeypatch.setattr(connection.db, "breaker", connection.CircuitBreaker())
+    return database
+
+def add_predictions(database, timestamps):
+    # prediction_id p0, p1, ... in insertion order
+    for i, timestamp in enumerate(timestamps):
+        document = storage.build_prediction_document({}, prediction_id=f"p{i}")
+        document["timestamp"] = timestamp
+        asyncio.run(database.predictions.insert_one(document))
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    cursor = storage.encode_history_cursor(timestamp, "abc")
+    assert storage.decode_history_cursor(cursor) == (timestamp, "abc")
+
+def test_pages_do_not_skip_or_repeat_equal_timestamps(monkeypatch):
+    database = use_memory_database(monkeypatch)
+    now = datetime(2024, 5, 1, 12)
+    # Four predictions share one timestamp, so paging relies on the prediction_id tie-break
+    add_predictions(database, [now] * 4 + [now - timedelta(seconds=1)] * 2 + [now + timedelta(seconds=1)])
+
+    pages, cursor = [], None
+    while True:
+        page = asyncio.run(storage.get_user_history("anonymous", limit=2, cursor=cursor))
+        pages.append([item["prediction_id"] for item in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == [["p6", "p3"], ["p2", "p1"], ["p0", "p5"], ["p4"]]
+    assert set(page["items"][0]) == {"prediction_id", "timestamp", "total_calories", "food_count"}
+
+def test_invalid_cursor_is_a_400(monkeypatch):
+    use_memory_database(monkeypatch)
+    client = TestClient(main.app)
+
+    response = client.get("/api/history", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid history cursor"
+
+def test_summary_backfill_runs_once(monkeypatch):
+    database = use_memory_database(monkeypatch)
+    scans = []
+
+    async def update_many(query, update):
+        scans.append(query)
+        return type("Result", (), {"modified_count": 0})()
+
+    monkeypatch.setattr(database.predictions, "update_many", update_many)
+    asyncio.run(storage.init_prediction_indexes())
+    asyncio.run(storage.init_prediction_indexes())
+
+    assert scans == [{"food_count": {"$exists": False}}]
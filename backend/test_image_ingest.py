@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the letterbox ingest path: model-frame boxes map back to original pixels
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.utils.image_processor import ingest_image, scale_detections_to_original
+
+# (x1, y1, x2, y2) of a red dish on a wide photo, in original pixels, as a fraction of the size
+BOX = (0.3, 0.25, 0.7, 0.8)
+
+def _photo(width: int, height: int, image_format: str) -> bytes:
+    rgb = np.full((height, width, 3), 200, dtype=np.uint8)
+    x1, y1, x2, y2 = (round(v * s) for v, s in zip(BOX, (width, height, width, height)))
+    rgb[y1:y2, x1:x2] = (255, 0, 0)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb).save(buffer, format=image_format, quality=95)
+    return buffer.getvalue()
+
+def _red_box(frame: np.ndarray):
+    # The box a perfect detector would report in the (BGR) model frame
+    ys, xs = np.nonzero((frame[..., 2] > 200) & (frame[..., 1] < 80) & (frame[..., 0] < 80))
+    return [int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1]
+
+@pytest.mark.parametrize("width,height,image_format", [
+    (1000, 600, "PNG"),      # plain letterbox
+    (4000, 2400, "JPEG"),    # large JPEG, decoded at reduced scale with draft
+])
+def test_boxes_map_back_through_padding_and_scale(width, height, image_format):
+    ingested = ingest_image(_photo(width, height, image_format))
+    assert (ingested.width, ingested.height) == (width, height)
+    assert ingested.pad_x == 0 and ingested.pad_y > 0
+
+    # The padding rows are grey, the box sits inside the resized content
+    assert (ingested.frame[0] == 114).all()
+    detection = {"class_name": "dosa", "confidence": 0.9, "bbox": _red_box(ingested.frame)}
+    mapped = scale_detections_to_original([detection], ingested)[0]["bbox"]
+
+    expected = [v * s for v, s in zip(BOX, (width, height, width, height))]
+    # Within two model-frame pixels of the original box
+    tolerance = 2 / ingested.gain_x
+    assert np.allclose(mapped, expected, atol=tolerance)
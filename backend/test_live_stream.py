@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the live camera WebSocket
+"""
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.utils import live_stream
+from app.utils.live_stream import LiveSession
+
+def _jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (90, 140, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def test_newer_frame_replaces_the_waiting_one():
+    session = LiveSession(websocket=None)
+    for data in (b"a", b"b", b"c"):
+        session.offer(data)
+    frame = session.take()
+    assert (frame.frame_id, frame.data, session.dropped) == (2, b"c", 2)
+    assert session.take() is None and not session.ready.is_set()
+
+def test_stream_returns_results_for_the_latest_frames():
+    frames = 6
+    with TestClient(app).websocket_connect("/api/live") as websocket:
+        for _ in range(frames - 1):
+            websocket.send_bytes(_jpeg())
+        websocket.send_bytes(b"not an image" * 10)
+        results = [websocket.receive_json()]
+        while results[-1]["frame_id"] != frames - 1:
+            results.append(websocket.receive_json())
+
+    # Every frame was either answered or counted as dropped, in order
+    assert sum(result["dropped"] for result in results) + len(results) == frames
+    assert [result["frame_id"] for result in results] == sorted(result["frame_id"] for result in results)
+    assert results[0]["success"] and results[0]["timings"]["total_ms"] > 0
+    assert not results[-1]["success"] and "decode" in results[-1]["error"]
+
+def test_streams_over_the_limit_are_refused(monkeypatch):
+    monkeypatch.setattr(live_stream, "LIVE_MAX_STREAMS", 0)
+    with TestClient(app).websocket_connect("/api/live") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == live_stream.CLOSE_OVERLOADED
@@ -0,0 +1,15 @@
+from benchmarks.loadgen import find_saturation, parse_server_timing
+
+def _level(concurrency, throughput, error_rate=0.0):
+    return {"concurrency": concurrency, "throughput_per_s": throughput, "error_rate": error_rate}
+
+def test_parse_server_timing():
+    header = "upload;dur=0.50, decode;dur=12.25, bogus, inference;dur=x"
+    assert parse_server_timing(header) == [("upload", 0.5), ("decode", 12.25)]
+
+def test_saturation_is_last_level_that_still_scaled():
+    levels = [_level(1, 30), _level(2, 58), _level(4, 90), _level(8, 92), _level(16, 91)]
+    assert find_saturation(levels, 0.05, 0.01)["concurrency"] == 4
+    assert find_saturation(levels[:3], 0.05, 0.01) is None
+    errors = [_level(1, 30), _level(2, 58, error_rate=0.2)]
+    assert find_saturation(errors, 0.05, 0.01)["concurrency"] == 1
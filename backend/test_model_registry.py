@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide model registry and /health readiness
+"""
+import sys
+import threading
+import time
+import types
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.utils.model_registry import ModelRegistry
+
+class FakeYOLO:
+    """Stands in for ultralytics.YOLO: counts loads, optionally fails or blocks in predict"""
+    loads = 0
+    fail = False
+    predict_gate = None
+
+    def __init__(self, path):
+        type(self).loads += 1
+        time.sleep(0.05)   # a slow load, so concurrent callers overlap
+        if self.fail:
+            raise RuntimeError("corrupt weights")
+
+    def predict(self, **kwargs):
+        if self.predict_gate is not None:
+            self.predict_gate.wait(5)
+        return []
+
+def use_fake_yolo(monkeypatch, **attributes):
+    yolo = type("YOLO", (FakeYOLO,), {"loads": 0, **attributes})
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=yolo))
+    return yolo
+
+def weights(tmp_path):
+    path = tmp_path / "food_detection.pt"
+    path.write_bytes(b"weights")
+    return str(path)
+
+def test_concurrent_callers_share_one_load(monkeypatch, tmp_path):
+    yolo = use_fake_yolo(monkeypatch)
+    registry = ModelRegistry(weights(tmp_path), backend="ultralytics")
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get_model())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert yolo.loads == 1
+    assert len(models) == 8 and all(model is models[0] for model in models)
+
+def test_failed_load_is_cached(monkeypatch, tmp_path):
+    yolo = use_fake_yolo(monkeypatch, fail=True)
+    registry = ModelRegistry(weights(tmp_path), backend="ultralytics")
+
+    assert registry.get_model() is None
+    assert registry.get_model() is None
+    assert yolo.loads == 1
+    assert registry.error == "corrupt weights"
+
+def test_health_is_503_until_warmup_finishes(monkeypatch, tmp_path):
+    gate = threading.Event()
+    use_fake_yolo(monkeypatch, predict_gate=gate)
+    registry = ModelRegistry(weights(tmp_path), backend="ultralytics")
+    monkeypatch.setattr(main, "model_registry", registry)
+    client = TestClient(main.app)
+
+    startup = threading.Thread(target=registry.startup)
+    startup.start()
+    try:
+        deadline = time.monotonic() + 5
+        while registry.status != "warming_up" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get("/health")
+        assert response.status_code == 503
+        assert response.json()["model"]["status"] == "warming_up"
+    finally:
+        gate.set()
+        startup.join()
+
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["model"]["status"] == "ready"
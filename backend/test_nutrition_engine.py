@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Tests for the vectorized nutrition and portion engine
+"""
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.utils.calorie_calculator import (
+    CSV_PATH,
+    NutritionStore,
+    calculate_calories,
+    calculate_calories_many,
+    get_nutrition_engine,
+    get_nutrition_for_food,
+)
+from app.utils.portion_estimator import FOOD_DATABASE
+
+meal_detections = [
+    {"class_id": 7, "class_name": "dosa", "confidence": 0.85, "bbox": [100, 100, 300, 200]},
+    {"class_name": "idly", "confidence": 0.92, "bbox": [320, 120, 380, 180]},
+    {"class_name": "paneer briyani", "confidence": 0.88, "bbox": [0, 0, 400, 450]},
+    {"class_name": "unknown curry", "confidence": 0.5, "bbox": [10, 10, 50, 50]},
+]
+
+def reference_grams(name, confidence, bbox, img_width, img_height):
+    """Team Member 2's scalar portion formula"""
+    x1, y1, x2, y2 = bbox
+    normalized_area = (x2 - x1) * (y2 - y1) / (img_width * img_height)
+    if normalized_area < 0.10:
+        multiplier = 0.6
+    elif normalized_area < 0.30:
+        multiplier = 1.0
+    else:
+        multiplier = 1.4
+    return FOOD_DATABASE.get(name, 100) * multiplier * (0.8 + confidence * 0.4)
+
+def test_class_ids_follow_model_class_list():
+    engine = get_nutrition_engine()
+    assert engine.class_names[0] == "appalam"
+    assert engine.class_names[7] == "dosa"
+    assert engine.lookup_id("Dosa ") == 7
+    assert engine.lookup_id("unknown curry") == engine.unknown_id
+
+def test_vectorized_matches_scalar_path():
+    # The scalar calculate_calories estimated every portion at a fixed confidence of 0.8
+    results = calculate_calories(meal_detections, 640, 480)
+
+    for detection, item in zip(meal_detections, results["food_items"]):
+        grams = reference_grams(detection["class_name"], 0.8, detection["bbox"], 640, 480)
+        nutrition = get_nutrition_for_food(detection["class_name"])
+        assert item["portion_grams"] == round(grams, 1)
+        assert abs(item["calories"] - nutrition["calories"] * grams / 100) <= 0.05
+        assert item["confidence"] == round(detection["confidence"], 2)
+
+def test_portions_do_not_depend_on_detector_confidence():
+    unsure = [{**detection, "confidence": 0.3} for detection in meal_detections]
+    assert [item["portion_grams"] for item in calculate_calories(unsure, 640, 480)["food_items"]] == \
+        [item["portion_grams"] for item in calculate_calories(meal_detections, 640, 480)["food_items"]]
+
+def test_many_meals_match_single_meals():
+    meals = [
+        (meal_detections, 640, 480),
+        ([], 640, 640),
+        (meal_detections[:2], 1280, 960),
+    ]
+    batched = calculate_calories_many(meals)
+
+    assert batched == [calculate_calories(d, w, h) for d, w, h in meals]
+    assert batched[1]["total_calories"] == 0
+    assert batched[1]["food_items"] == []
+
+def test_snapshot_swap_leaves_pinned_snapshot_untouched():
+    store = NutritionStore(CSV_PATH)
+    pinned = store.current()
+    dosa = [{"class_name": "dosa", "confidence": 0.9, "bbox": [0, 0, 100, 100]}]
+    before = calculate_calories(dosa, snapshot=pinned)
+
+    store.update({"dosa": {"calories": 266, "protein": 9, "carbs": 36, "fat": 9}})
+    latest = store.current()
+
+    assert latest is not pinned
+    assert latest.version != pinned.version
+    assert latest.sequence == pinned.sequence + 1
+    assert calculate_calories(dosa, snapshot=pinned) == before
+    assert calculate_calories(dosa, snapshot=latest)["total_calories"] > before["total_calories"]
+
+def _write_table(path, dosa_calories):
+    path.write_text(
+        "food_name,calories_per_100g,protein_per_100g,carbs_per_100g,fat_per_100g\n"
+        f"dosa,{dosa_calories},4,25,4\n"
+        "idly,58,2,12,0.4\n"
+    )
+
+def test_reload_swaps_whole_snapshots_under_concurrent_readers(tmp_path):
+    path = tmp_path / "nutrition.csv"
+    _write_table(path, 168)
+    store = NutritionStore(str(path))
+    dosa = [{"class_name": "dosa", "confidence": 0.9, "bbox": [0, 0, 100, 100]}]
+    expected = {}
+    for calories in (168, 250):
+        _write_table(path, calories)
+        snapshot = store.reload()
+        expected[snapshot.version] = calculate_calories(dosa, snapshot=snapshot)
+
+    seen, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            snapshot = store.current()
+            # Table, compiled engine and version always belong to the same snapshot
+            assert snapshot.engine.version == snapshot.version
+            seen.append((snapshot.version, calculate_calories(dosa, snapshot=snapshot)))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(20):
+        _write_table(path, (168, 250)[i % 2])
+        store.reload()
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert seen and {version for version, _ in seen} <= expected.keys()
+    assert all(result == expected[version] for version, result in seen)
+
+def test_invalid_file_keeps_the_current_snapshot(tmp_path):
+    path = tmp_path / "nutrition.csv"
+    _write_table(path, 168)
+    store = NutritionStore(str(path))
+    good = store.current()
+
+    path.write_text("food_name,calories_per_100g\ndosa,lots\n")
+    with pytest.raises(ValueError):
+        store.reload()
+    assert store.current() is good
+
+    # The watcher logs the failure, keeps serving the old table and doesn't retry until the next edit
+    async def watch_briefly():
+        watcher = asyncio.create_task(store.watch(0.01))
+        await asyncio.sleep(0.1)
+        watcher.cancel()
+
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    asyncio.run(watch_briefly())
+    assert store.current() is good
+    assert not store.file_changed()
@@ -0,0 +1,17 @@
+from benchmarks.pipeline import compare, summarize
+
+def _run(p50, p95, throughput):
+    return {"results": {"detect_food": {"p50_ms": p50, "p95_ms": p95, "throughput_per_s": throughput}}}
+
+def test_summarize_percentiles():
+    result = summarize([0.001 * i for i in range(1, 101)])
+    assert result["iterations"] == 100
+    assert 50 <= result["p50_ms"] <= 51
+    assert 99 <= result["p99_ms"] <= 100
+
+def test_compare_flags_only_changes_beyond_tolerance():
+    baseline = _run(10.0, 20.0, 100.0)
+    assert compare(_run(11.0, 21.0, 95.0), baseline, 0.2) == []
+    regressions = compare(_run(13.0, 20.0, 70.0), baseline, 0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("detect_food p50_ms")
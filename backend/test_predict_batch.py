@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for POST /api/predict/batch
+"""
+import io
+import json
+import zipfile
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api import predict
+from app.main import app
+from app.utils import image_processor
+
+def _jpeg(size=(320, 240)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (90, 140, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def _zip(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_batch_streams_per_item_results_and_a_summary(monkeypatch):
+    # Members over the per-image limit are reported per item, not decompressed
+    monkeypatch.setattr(image_processor, "UPLOAD_MAX_BYTES", 100_000)
+    archive = _zip([("a.jpg", _jpeg()), ("big.png", b"\x89PNG" + b"\0" * 200_000), ("notes.txt", b"skip")])
+    response = TestClient(app).post("/api/predict/batch", files=[
+        ("files", ("meal.jpg", _jpeg(), "image/jpeg")),
+        ("files", ("menu.pdf", b"%PDF-1.4", "application/pdf")),
+        ("files", ("meals.zip", archive, "application/zip")),
+    ])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    *items, summary = [json.loads(line) for line in response.text.splitlines()]
+    by_name = {item["filename"]: item for item in items}
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    assert by_name["meal.jpg"]["success"] and by_name["a.jpg"]["success"]
+    assert "total_calories" in by_name["meal.jpg"]["result"]
+    assert not by_name["menu.pdf"]["success"] and "must be an image" in by_name["menu.pdf"]["error"]
+    assert not by_name["big.png"]["success"] and "larger than" in by_name["big.png"]["error"]
+    assert summary == {"done": True, "total": 4, "succeeded": 2, "failed": 2, "saved": summary["saved"]}
+
+def test_oversized_archive_gets_413_like_predict(monkeypatch):
+    monkeypatch.setattr(predict, "UPLOAD_MAX_BATCH_BYTES", 1000)
+    archive = _zip([(f"{i}.jpg", _jpeg()) for i in range(3)])
+    response = TestClient(app).post(
+        "/api/predict/batch", files=[("files", ("meals.zip", archive, "application/zip"))]
+    )
+    assert response.status_code == 413
+    assert "meals.zip" in response.json()["detail"]
+
+def test_archive_over_item_limit_gets_413_like_multipart(monkeypatch):
+    monkeypatch.setattr(predict, "BATCH_MAX_ITEMS", 2)
+    archive = _zip([(f"{i}.jpg", _jpeg()) for i in range(3)])
+    response = TestClient(app).post(
+        "/api/predict/batch", files=[("files", ("meals.zip", archive, "application/zip"))]
+    )
+    assert response.status_code == 413
+    assert "meals.zip" in response.json()["detail"]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed prediction cache
+"""
+import asyncio
+from app.database import connection
+from app.utils.prediction_cache import PredictionCache
+from benchmarks.memory_mongo import MemoryDatabase
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def make_cache(versions, clock, max_entries=2, ttl_seconds=60):
+    return PredictionCache(
+        max_entries=max_entries,
+        ttl_seconds=ttl_seconds,
+        use_mongo=False,
+        version_fn=lambda: versions[0],
+        clock=clock,
+    )
+
+def test_same_bytes_hit_and_returned_copy_is_independent():
+    cache = make_cache([("m1", "n1")], FakeClock())
+    key = cache.make_key(b"photo")
+    assert key == cache.make_key(b"photo")
+    assert key != cache.make_key(b"other photo")
+
+    asyncio.run(cache.set(key, {"total_calories": 100.0}))
+    hit = asyncio.run(cache.get(key))
+    assert hit == {"total_calories": 100.0}
+
+    hit["total_calories"] = 0
+    assert asyncio.run(cache.get(key)) == {"total_calories": 100.0}
+
+def test_lru_size_and_ttl_bounds():
+    clock = FakeClock()
+    cache = make_cache([("m1", "n1")], clock, max_entries=2, ttl_seconds=10)
+    keys = [cache.make_key(bytes([i])) for i in range(3)]
+
+    cache.set_local(keys[0], {"id": 0})
+    cache.set_local(keys[1], {"id": 1})
+    cache.get_local(keys[0])            # keys[1] becomes least recently used
+    cache.set_local(keys[2], {"id": 2})
+
+    assert cache.get_local(keys[1]) is None
+    assert cache.get_local(keys[0]) == {"id": 0}
+
+    clock.now = 11
+    assert cache.get_local(keys[0]) is None
+
+def test_version_change_invalidates_entries():
+    versions = [("m1", "n1")]
+    cache = make_cache(versions, FakeClock())
+    old_key = cache.make_key(b"photo")
+    cache.set_local(old_key, {"id": 0})
+
+    # New nutrition table: different key and the old entries are dropped
+    versions[0] = ("m1", "n2")
+    new_key = cache.make_key(b"photo")
+    assert new_key != old_key
+    assert cache.get_local(old_key) is None
+
+def test_pinned_versions_key_the_result():
+    # A reload after the request pinned its snapshot doesn't move its result to the new key
+    versions = [("m1", "n2")]
+    cache = make_cache(versions, FakeClock())
+    pinned_key = cache.make_key(b"photo", ("m1", "n1"))
+    assert pinned_key.endswith(":m1:n1")
+    assert pinned_key != cache.make_key(b"photo")
+
+def test_shared_entry_is_tagged_with_pinned_versions(monkeypatch):
+    database = MemoryDatabase()
+    monkeypatch.setattr(connection.db, "database", database)
+    monkeypatch.setattr(connection.db, "breaker", connection.CircuitBreaker())
+    # The nutrition table reloaded after the request pinned ("m1", "n1")
+    cache = PredictionCache(max_entries=2, ttl_seconds=60, use_mongo=True,
+                            version_fn=lambda: ("m1", "n2"), clock=FakeClock())
+    pinned = ("m1", "n1")
+    key = cache.make_key(b"photo", pinned)
+
+    asyncio.run(cache.set(key, {"total_calories": 100.0}, pinned))
+    [document] = database.prediction_cache.documents
+    assert document["_id"] == key
+    assert (document["model_version"], document["nutrition_version"]) == pinned
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for response encoding and Accept negotiation
+"""
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.models.schemas import PredictionResponse
+from app.utils import responses
+from app.utils.responses import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, preferred_media_type
+
+def _post(accept=None):
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (90, 140, 30)).save(buffer, format="JPEG")
+    headers = {"Accept": accept} if accept else {}
+    return TestClient(app).post(
+        "/api/predict", files={"file": ("meal.jpg", buffer.getvalue(), "image/jpeg")}, headers=headers
+    )
+
+def test_accept_header_negotiation(monkeypatch):
+    pytest.importorskip("msgpack")
+    assert preferred_media_type(None) == JSON_MEDIA_TYPE
+    assert preferred_media_type("*/*") == JSON_MEDIA_TYPE
+    assert preferred_media_type("application/x-msgpack") == MSGPACK_MEDIA_TYPE
+    assert preferred_media_type("application/json;q=0.5, application/msgpack") == MSGPACK_MEDIA_TYPE
+    assert preferred_media_type("application/msgpack;q=0, */*") == JSON_MEDIA_TYPE
+    assert preferred_media_type("application/msgpack, application/json") == JSON_MEDIA_TYPE
+    monkeypatch.setattr(responses, "msgpack", None)
+    assert preferred_media_type("application/msgpack") == JSON_MEDIA_TYPE
+
+def test_json_response_matches_the_schema():
+    response = _post()
+    assert response.headers["content-type"] == JSON_MEDIA_TYPE
+    assert response.headers["vary"] == "Accept"
+    body = PredictionResponse.model_validate(response.json())
+    assert body.success and body.nutrition_version
+
+def test_msgpack_response_carries_the_same_body():
+    msgpack = pytest.importorskip("msgpack")
+    as_json = _post().json()
+    response = _post(MSGPACK_MEDIA_TYPE)
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    body = msgpack.unpackb(response.content)
+    assert body == as_json
+    assert len(response.content) < len(responses.dumps_json(as_json))
+
+def test_msgpack_and_json_decode_to_equal_floats():
+    msgpack = pytest.importorskip("msgpack")
+    # 1234.3 has no exact float32 (or binary) representation
+    body = {"total_calories": 1234.3, "total_macros": {"protein": 0.1, "carbs": 98765.4, "fat": 3.3}}
+    assert msgpack.unpackb(responses.packb(body)) == json.loads(responses.dumps_json(body)) == body
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the daily nutrition rollups
+"""
+from datetime import date, datetime
+from app.database.rollups import rollup_increments, weekly_rollups
+from app.database.storage import build_prediction_document
+
+def meal(calories, protein, foods, timestamp, user_id="anonymous"):
+    document = build_prediction_document({
+        "total_calories": calories,
+        "total_macros": {"protein": protein, "carbs": 10, "fat": 1},
+        "detected_foods": [{
+            "food_name": "dosa", "portion_grams": 100.0, "calories": 168.0, "protein": 3.9,
+            "carbs": 28.0, "fat": 3.7, "confidence": 0.9, "bbox": [0, 0, 10, 10]
+        }] * foods,
+    })
+    document["timestamp"] = timestamp
+    document["user_id"] = user_id
+    return document
+
+def test_increments_are_summed_per_user_and_day():
+    documents = [
+        meal(300, 10, 2, datetime(2026, 3, 2, 8, 0)),
+        meal(500, 20, 3, datetime(2026, 3, 2, 13, 30)),
+        meal(200, 5, 1, datetime(2026, 3, 3, 9, 0)),
+        meal(100, 1, 1, datetime(2026, 3, 2, 9, 0), user_id="other"),
+    ]
+    increments = rollup_increments(documents)
+
+    monday = increments[("anonymous", datetime(2026, 3, 2))]
+    assert monday["calories"] == 800
+    assert monday["protein"] == 30
+    assert monday["meals"] == 2
+    assert monday["foods"] == 5
+    assert monday["last_prediction_at"] == datetime(2026, 3, 2, 13, 30)
+    assert len(increments) == 3
+
+def test_weekly_rollups_start_on_monday():
+    days = [
+        {"day": date(2026, 3, 1), "calories": 100, "protein": 1, "carbs": 1, "fat": 1, "meals": 1, "foods": 1},
+        {"day": date(2026, 3, 2), "calories": 200, "protein": 2, "carbs": 2, "fat": 2, "meals": 1, "foods": 2},
+        {"day": date(2026, 3, 8), "calories": 300, "protein": 3, "carbs": 3, "fat": 3, "meals": 2, "foods": 3},
+    ]
+    weeks = weekly_rollups(days)
+
+    assert [week["week_start"] for week in weeks] == [date(2026, 2, 23), date(2026, 3, 2)]
+    assert weeks[1]["calories"] == 500
+    assert weeks[1]["meals"] == 3
+
+def test_admin_routes_need_a_configured_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/rollups/rebuild").status_code == 404
+    assert client.post("/api/admin/nutrition/reload", headers={"X-Admin-Token": ""}).status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/admin/rollups/rebuild").status_code == 403
+    assert client.get("/api/admin/nutrition", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/admin/nutrition", headers={"X-Admin-Token": "s3cret"}).status_code == 200
@@ -0,0 +1,24 @@
+import os
+
+from app.server import PreforkServer, memory_info, worker_cpus, worker_info
+
+def test_worker_cpus_split_available_cores():
+    cpus = sorted(os.sched_getaffinity(0))
+    assert worker_cpus(0, 1) == cpus[:1]
+    assert len(worker_cpus(3, len(cpus) + 2)) == len(cpus)
+    assert set(worker_cpus(1, 2)) <= set(cpus)
+
+def test_memory_info_reads_proc():
+    info = memory_info()
+    assert info["rss_mb"] > 0 and info["peak_rss_mb"] >= info["rss_mb"]
+
+def test_worker_info_only_under_production_server(monkeypatch):
+    monkeypatch.delenv("SERVER_WORKER_INDEX", raising=False)
+    assert worker_info() is None
+    monkeypatch.setenv("SERVER_WORKER_INDEX", "2")
+    assert worker_info()["index"] == 2
+
+def test_threads_are_split_between_workers():
+    server = PreforkServer("127.0.0.1", 0, workers=2, max_requests=100)
+    assert server.threads_per_worker == max(1, len(os.sched_getaffinity(0)) // 2)
+    assert server.max_requests_jitter == 10
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Tests for per-stage request timing
+"""
+import asyncio
+from app.utils.timing import STAGE_SECONDS, image_size_label, record_stage, request_timing, set_timing_labels, timed_stage
+
+def test_stages_feed_header_and_histogram():
+    labels = {"stage": "decode", "model_version": "test-model", "image_size": "medium"}
+    before = STAGE_SECONDS.count(**labels)
+
+    async def handler():
+        with request_timing() as timing:
+            with timed_stage("upload"):
+                await asyncio.sleep(0)
+            record_stage("decode", 0.0125)
+            set_timing_labels("test-model", 1600, 1200)
+        return timing
+
+    timing = asyncio.run(handler())
+    assert [stage for stage, _ in timing.stages] == ["upload", "decode"]
+    assert "decode;dur=12.50" in timing.header()
+    assert STAGE_SECONDS.count(**labels) == before + 1
+
+def test_stages_outside_a_request_are_ignored():
+    with timed_stage("upload"):
+        pass
+    record_stage("decode", 1.0)
+    assert image_size_label(640, 480) == "small"
+    assert image_size_label(4032, 3024) == "xlarge"
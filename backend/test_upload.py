@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for bounded upload ingestion
+"""
+import asyncio
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from app.utils.image_processor import ingest_image
+from app.utils.upload import (
+    UPLOAD_CHUNK_SIZE, UPLOAD_REJECTIONS, UploadRejected, read_upload, sniff_image,
+)
+
+def _encode(image_format: str, size=(320, 240)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def _png_header(width: int, height: int) -> bytes:
+    # Signature plus an IHDR chunk claiming the given size; no pixel data follows
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr
+            + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr)))
+
+class _Upload:
+    """Just enough of UploadFile: chunked reads, counting how much was read"""
+
+    def __init__(self, data: bytes):
+        self.file = io.BytesIO(data)
+        self.size = None
+        self.bytes_read = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG", "WEBP", "BMP"])
+def test_sniff_reads_size_from_header(image_format):
+    data = _encode(image_format)
+    header = sniff_image(data[:64] if image_format != "JPEG" else data[:1024], complete=False)
+    assert tuple(header) == (image_format, 320, 240)
+
+def test_unsupported_and_truncated_uploads_are_rejected():
+    with pytest.raises(UploadRejected) as error:
+        sniff_image(_encode("GIF"))
+    assert error.value.status_code == 415
+    with pytest.raises(UploadRejected) as error:
+        sniff_image(b"\xff\xd8\xff")
+    assert error.value.reason == "malformed"
+
+def test_decompression_bomb_is_rejected_after_the_first_chunk():
+    before = UPLOAD_REJECTIONS.value(reason="too_many_pixels")
+    upload = _Upload(_png_header(40000, 40000) + b"\0" * (4 * UPLOAD_CHUNK_SIZE))
+    with pytest.raises(UploadRejected) as error:
+        asyncio.run(read_upload(upload))
+    assert error.value.status_code == 413
+    assert upload.bytes_read == UPLOAD_CHUNK_SIZE
+    assert UPLOAD_REJECTIONS.value(reason="too_many_pixels") == before + 1
+
+def test_byte_limit_and_decode_errors():
+    with pytest.raises(UploadRejected) as error:
+        asyncio.run(read_upload(_Upload(_encode("BMP", (400, 400))), max_bytes=100_000))
+    assert error.value.reason == "too_large"
+
+    data = _encode("JPEG")
+    assert asyncio.run(read_upload(_Upload(data))) == data
+    with pytest.raises(UploadRejected) as error:
+        ingest_image(_png_header(320, 240))
+    assert error.value.reason == "malformed"
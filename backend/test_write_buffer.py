@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind prediction buffer
+"""
+import asyncio
+import os
+from bson import json_util
+from app.database import connection, storage
+from app.database.connection import CircuitBreaker
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.documents = []
+        self.calls = 0
+        self.fail = fail
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        self.calls += 1
+        self.documents.extend(documents)
+
+class FakeDatabase:
+    def __init__(self, fail=False):
+        self.predictions = FakeCollection(fail)
+
+def use_database(monkeypatch, database):
+    async def fake_get_database():
+        return database
+    monkeypatch.setattr(storage, "get_database", fake_get_database)
+
+def test_flushes_in_batches_and_on_shutdown(monkeypatch, tmp_path):
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    buffer = storage.WriteBehindBuffer(
+        max_size=100, batch_size=4, flush_interval=10, overflow_policy="drop",
+        spill_path=str(tmp_path / "spill.jsonl"),
+    )
+
+    async def main():
+        await buffer.start()
+        for i in range(10):
+            await buffer.enqueue(storage.build_prediction_document({}, prediction_id=str(i)))
+        # Long flush interval: the last partial batch is only written by stop()
+        await buffer.stop()
+
+    asyncio.run(main())
+    assert sorted(int(d["prediction_id"]) for d in database.predictions.documents) == list(range(10))
+    assert database.predictions.calls == 3
+
+def test_failed_flush_spills_and_replays(monkeypatch, tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    use_database(monkeypatch, FakeDatabase(fail=True))
+    buffer = storage.WriteBehindBuffer(batch_size=2, flush_interval=0.01, overflow_policy="spill", spill_path=spill_path)
+
+    async def write_then_stop(buffer):
+        await buffer.start()
+        for i in range(3):
+            await buffer.enqueue(storage.build_prediction_document({}))
+        await buffer.stop()
+
+    asyncio.run(write_then_stop(buffer))
+    assert os.path.exists(spill_path)
+
+    # Database is back: the next start replays the spill file
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    asyncio.run(write_then_stop(storage.WriteBehindBuffer(batch_size=2, flush_interval=0.01, spill_path=spill_path)))
+    assert len(database.predictions.documents) == 6
+    assert not os.path.exists(spill_path)
+
+def test_replay_left_by_a_crash_is_replayed_before_new_spills(monkeypatch, tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    # The previous run died mid-replay (".replay" left behind) after spilling again
+    crashed = [storage.build_prediction_document({}) for _ in range(2)]
+    spilled = [storage.build_prediction_document({})]
+    for path, documents in ((spill_path + ".replay", crashed), (spill_path, spilled)):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json_util.dumps(document) + "\n" for document in documents)
+
+    database = FakeDatabase()
+    use_database(monkeypatch, database)
+    buffer = storage.WriteBehindBuffer(batch_size=2, flush_interval=0.01, spill_path=spill_path)
+
+    async def start_then_stop():
+        await buffer.start()
+        await buffer.stop()
+
+    asyncio.run(start_then_stop())
+
+    replayed = [document["prediction_id"] for document in database.predictions.documents]
+    assert replayed == [document["prediction_id"] for document in crashed + spilled]
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + ".replay")
+
+def test_open_breaker_spills_then_replays_once_closed(monkeypatch, tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    database = FakeDatabase()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(connection.db, "database", database)
+    monkeypatch.setattr(connection.db, "breaker", breaker)
+    buffer = storage.WriteBehindBuffer(batch_size=2, flush_interval=0.01, overflow_policy="spill", spill_path=spill_path)
+    held = [storage.build_prediction_document({}) for _ in range(3)]
+
+    async def main():
+        await buffer.start()
+        breaker.trip("mongo down")
+        for document in held:
+            await buffer.enqueue(document)
+        await asyncio.sleep(0.1)
+        with open(spill_path, encoding="utf-8") as file:
+            spilled = [json_util.loads(line)["prediction_id"] for line in file]
+
+        # Breaker closes: the next successful flush writes the spilled documents too
+        breaker.record_success()
+        await buffer.enqueue(storage.build_prediction_document({}, prediction_id="after"))
+        await buffer.stop()
+        return spilled
+
+    spilled = asyncio.run(main())
+    assert spilled == [document["prediction_id"] for document in held]
+    written = [document["prediction_id"] for document in database.predictions.documents]
+    assert sorted(written) == sorted(spilled + ["after"])
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + ".replay")